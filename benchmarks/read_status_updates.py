@@ -0,0 +1,89 @@
+"""
+Times SQLAlchemyDao.read_status_updates() with team/department/project filters while the number of filter values and
+the number of teams per status update grow. Runs against a throwaway SQLite database:
+
+    python -m benchmarks.read_status_updates [--status-updates 2000] [--repeat 20]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from random import Random
+
+TEAMS = 32
+PROJECTS = 8
+FEED_PAGE_SIZE = 20
+
+
+def _seed(dao, status_updates: int, teams_per_update: int, rnd: Random):
+    from updateme.core.model import Company, Department, Team, Project, StatusUpdate, StatusUpdateSource
+
+    company = Company(f"Benchmark {teams_per_update}", f"benchmark_{teams_per_update}")
+    dao.insert_company(company)
+    departments = [Department(f"Department {i}", company) for i in range(4)]
+    for department in departments:
+        dao.insert_department(department)
+    teams = [Team(f"Team {i}", departments[i % len(departments)]) for i in range(TEAMS)]
+    for team in teams:
+        dao.insert_team(team)
+    projects = [Project(f"Project {i}", company) for i in range(PROJECTS)]
+    for project in projects:
+        dao.insert_project(project)
+
+    now = datetime.utcnow()
+    with dao.session_scope():
+        for i in range(status_updates):
+            dao.insert_status_update(StatusUpdate(
+                source=StatusUpdateSource.SLACK_DIALOG, text=f"Status update {i}", published=True, company=company,
+                created_at=now - timedelta(minutes=i), teams=rnd.sample(teams, teams_per_update),
+                projects=rnd.sample(projects, 2)
+            ))
+    return company, departments, teams, projects
+
+
+def _time(dao, repeat: int, **kwargs) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        dao.read_status_updates(last_n=FEED_PAGE_SIZE, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status-updates", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ["UPDATE_ME_DAO"] = "sqlite"
+        os.environ["UPDATE_ME_SQLITE_DB_FILE"] = os.path.join(tmp_dir, "benchmark.db")
+        from updateme.core.dao import dao
+
+        rnd = Random(42)
+        print(f"{args.status_updates} status updates per company, median of {args.repeat} runs, "
+              f"last {FEED_PAGE_SIZE} updates, ms")
+        print(f"{'teams/update':>12} {'filter values':>13} {'teams':>8} {'departments':>11} {'projects':>8} "
+              f"{'combined':>8}")
+        for teams_per_update in (1, 4, 16):
+            company, departments, teams, projects = _seed(dao, args.status_updates, teams_per_update, rnd)
+            for values in (1, 4, 8, 32):
+                team_uuids = [team.uuid for team in rnd.sample(teams, values)]
+                department_uuids = [department.uuid for department in departments[:min(values, len(departments))]]
+                project_uuids = [project.uuid for project in projects[:min(values, len(projects))]]
+                row = [
+                    _time(dao, args.repeat, company_uuid=company.uuid, from_teams=team_uuids),
+                    _time(dao, args.repeat, company_uuid=company.uuid, from_departments=department_uuids),
+                    _time(dao, args.repeat, company_uuid=company.uuid, from_projects=project_uuids),
+                    _time(dao, args.repeat, company_uuid=company.uuid, from_teams=team_uuids,
+                          from_departments=department_uuids, from_projects=project_uuids),
+                ]
+                print(f"{teams_per_update:>12} {values:>13} " + " ".join(
+                    f"{value:>{width}.2f}" for value, width in zip(row, (8, 11, 8, 8))))
+
+
+if __name__ == "__main__":
+    main()
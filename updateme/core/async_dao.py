@@ -0,0 +1,312 @@
+import functools
+import sys
+from threading import Lock
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Generator, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Insert, Table
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from updateme.core.cache import TaxonomyCache, ResolutionCache, Generations, get_cache_backend
+from updateme.core.config import get_db_pool_config, get_postgres_conn_string, get_active_dao_type, DaoType
+from updateme.core.dao import SQLAlchemyDao, SQLiteFileMixin, PostgresDao, LoadProfile, StatusUpdateCursor, \
+    STATUS_UPDATE_FEED_LOAD_PROFILE, get_sqlalchemy_schema
+from updateme.core.model import Company, Project, StatusUpdate, StatusUpdateType, Team, SlackUserPreferences, \
+    StatusUpdateSource, StatusUpdateReaction, Department
+
+
+class _AfterCommit:
+    """
+    Stands in for a cache of AsyncDao: reads go to the cache, invalidations and generation bumps wait until AsyncDao has
+    committed. Made any earlier, a concurrent read could cache the data being replaced under the new generation
+    """
+
+    _DEFERRED = {"invalidate", "bump"}
+
+    def __init__(self, cache, pending: List[Callable]):
+        self._cache = cache
+        self._pending = pending
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._cache, name)
+        if name in self._DEFERRED:
+            return functools.partial(self._defer, attribute)
+        return attribute
+
+    def _defer(self, method: Callable, *args, **kwargs):
+        self._pending.append(functools.partial(method, *args, **kwargs))
+
+
+class _SessionBoundDao(SQLAlchemyDao):
+    """
+    SQLAlchemyDao working on the Session it is given instead of its own engine. AsyncDao gives it the sync facade of an
+    AsyncSession inside AsyncSession.run_sync(), where the sync queries (lazy loads included) run on the async driver
+    """
+
+    # noinspection PyMissingConstructor
+    def __init__(self, session: Session, async_dao: "AsyncDao", after_commit: List[Callable]):
+        self._schema = get_sqlalchemy_schema()
+        self._session = session
+        self._async_dao = async_dao
+        self._engine = self._create_engine()
+        self._taxonomy_cache = _AfterCommit(async_dao._taxonomy_cache, after_commit)
+        self._company_cache = _AfterCommit(async_dao._company_cache, after_commit)
+        self._feed_generations = _AfterCommit(async_dao._feed_generations, after_commit)
+
+    def _create_engine(self) -> Engine:
+        # No engine of its own: the sync facade of the AsyncEngine, e.g. for pool_status()
+        return self._async_dao._engine.sync_engine
+
+    def _dialect_insert(self, table: Table) -> Insert:
+        return self._async_dao._dialect_insert(table)
+
+    @contextmanager
+    def _get_session(self) -> Generator[Session, None, None]:
+        # AsyncDao commits, or rolls back, once the whole DAO call is over
+        yield self._session
+
+    @contextmanager
+    def _detached_session(self) -> Generator[Session, None, None]:
+        # Like SQLAlchemyDao, a Session of its own, which lets go of the cached objects as soon as they're loaded. It
+        # shares the connection, and so the transaction, of the AsyncSession, writes of the same call included
+        with Session(bind=self._session.connection()) as session:
+            yield session
+
+
+class AsyncDao(ABC):
+    """
+    asyncio counterpart of SQLAlchemyDao: the same methods, to be awaited. Every call runs the SQLAlchemyDao
+    implementation in its own AsyncSession and transaction, so both share queries and mappings. Objects are returned
+    detached: what the call loaded (see the load profiles) is there, anything else can't be lazy loaded afterwards
+    """
+
+    @abstractmethod
+    def _create_engine(self) -> AsyncEngine: ...
+
+    @abstractmethod
+    def _dialect_insert(self, table: Table) -> Insert: ...
+
+    def __init__(self):
+        self._schema = get_sqlalchemy_schema()
+        self._engine = self._create_engine()
+        self._session_maker = async_sessionmaker(bind=self._engine, expire_on_commit=False)
+        self._taxonomy_cache = TaxonomyCache(backend=get_cache_backend())
+        self._company_cache = ResolutionCache("company", backend=get_cache_backend())
+        self._feed_generations = Generations("feed", backend=get_cache_backend())
+
+    async def create_all(self):
+        """
+        Creates missing tables. Indexes of existing tables are maintained by SQLAlchemyDao.ensure_indexes()
+        """
+        async with self._engine.begin() as connection:
+            await connection.run_sync(self._schema.metadata.create_all, checkfirst=True)
+
+    async def dispose(self):
+        await self._engine.dispose()
+
+    async def _run(self, method: Callable, *args, **kwargs):
+        after_commit: List[Callable] = []
+
+        def run(sync_session: Session):
+            return method(_SessionBoundDao(sync_session, self, after_commit), *args, **kwargs)
+
+        async with self._session_maker() as session:
+            async with session.begin():
+                result = await session.run_sync(run)
+        for invalidation in after_commit:
+            invalidation()
+        return result
+
+    async def insert_many(self, objs: Iterable):
+        await self._run(SQLAlchemyDao.insert_many, list(objs))
+
+    async def soft_delete_many(self, cls: type, company_uuid: str, uuids: Iterable[str]):
+        await self._run(SQLAlchemyDao.soft_delete_many, cls, company_uuid, list(uuids))
+
+    async def insert_status_update(self, status_update: StatusUpdate):
+        await self._run(SQLAlchemyDao.insert_status_update, status_update)
+
+    async def publish_status_update(self, company_uuid: str, uuid: str) -> bool:
+        return await self._run(SQLAlchemyDao.publish_status_update, company_uuid, uuid)
+
+    async def update_status_update(self, company_uuid: str, uuid: str, **values) -> bool:
+        return await self._run(SQLAlchemyDao.update_status_update, company_uuid, uuid, **values)
+
+    async def replace_status_update_teams(self, company_uuid: str, uuid: str, team_uuids: Iterable[str]):
+        await self._run(SQLAlchemyDao.replace_status_update_teams, company_uuid, uuid, list(team_uuids))
+
+    async def replace_status_update_projects(self, company_uuid: str, uuid: str, project_uuids: Iterable[str]):
+        await self._run(SQLAlchemyDao.replace_status_update_projects, company_uuid, uuid, list(project_uuids))
+
+    def read_feed_generation(self, company_uuid: str) -> int:
+        # In memory only, nothing to await
+        return self._feed_generations.get(company_uuid) + self._taxonomy_cache.generation(company_uuid)
+
+    async def read_last_unpublished_status_update(self, company_uuid: str, author_slack_user_id: str,
+                                                  no_older_than: timedelta = timedelta(days=2),
+                                                  source: StatusUpdateSource = None) -> Optional[StatusUpdate]:
+        return await self._run(SQLAlchemyDao.read_last_unpublished_status_update, company_uuid, author_slack_user_id,
+                               no_older_than=no_older_than, source=source)
+
+    async def read_status_update(self, company_uuid: str, uuid: str,
+                                 load: LoadProfile = STATUS_UPDATE_FEED_LOAD_PROFILE) -> Optional[StatusUpdate]:
+        return await self._run(SQLAlchemyDao.read_status_update, company_uuid, uuid, load=load)
+
+    async def read_status_updates(self, company_uuid: str, created_after: datetime = None,
+                                  created_before: datetime = None, from_teams: List[str] = None,
+                                  from_departments: List[str] = None, from_projects: List[str] = None,
+                                  with_types: List[str] = None, published: Optional[bool] = True,
+                                  deleted: Optional[bool] = False, author_slack_user_id: str = None,
+                                  last_n: int = None, source: StatusUpdateSource = None,
+                                  older_than: StatusUpdateCursor = None,
+                                  load: LoadProfile = STATUS_UPDATE_FEED_LOAD_PROFILE) -> List[StatusUpdate]:
+        return await self._run(
+            SQLAlchemyDao.read_status_updates, company_uuid, created_after=created_after,
+            created_before=created_before, from_teams=from_teams, from_departments=from_departments,
+            from_projects=from_projects, with_types=with_types, published=published, deleted=deleted,
+            author_slack_user_id=author_slack_user_id, last_n=last_n, source=source, older_than=older_than, load=load
+        )
+
+    async def read_status_updates_page(self, company_uuid: str, page_size: int, older_than: StatusUpdateCursor = None,
+                                       **kwargs) -> Tuple[List[StatusUpdate], Optional[StatusUpdateCursor]]:
+        return await self._run(SQLAlchemyDao.read_status_updates_page, company_uuid, page_size,
+                               older_than=older_than, **kwargs)
+
+    async def delete_status_update(self, company_uuid: str, uuid: str):
+        await self._run(SQLAlchemyDao.delete_status_update, company_uuid, uuid)
+
+    async def delete_team_status_updates(self, company_uuid: str, team_uuid: str):
+        await self._run(SQLAlchemyDao.delete_team_status_updates, company_uuid, team_uuid)
+
+    async def insert_team(self, team: Team):
+        await self._run(SQLAlchemyDao.insert_team, team)
+
+    async def read_team(self, company_uuid: str, uuid: str) -> Optional[Team]:
+        return await self._run(SQLAlchemyDao.read_team, company_uuid, uuid)
+
+    async def read_teams(self, company_uuid: str, team_name: str = None, department_uuid: str = None) -> List[Team]:
+        return await self._run(SQLAlchemyDao.read_teams, company_uuid, team_name=team_name,
+                               department_uuid=department_uuid)
+
+    async def read_teams_by_uuids(self, company_uuid: str, uuids: Iterable[str]) -> List[Team]:
+        return await self._run(SQLAlchemyDao.read_teams_by_uuids, company_uuid, list(uuids))
+
+    async def delete_team(self, company_uuid: str, uuid: str):
+        await self._run(SQLAlchemyDao.delete_team, company_uuid, uuid)
+
+    async def insert_company(self, company: Company):
+        await self._run(SQLAlchemyDao.insert_company, company)
+
+    async def read_company(self, uuid: str) -> Optional[Company]:
+        return await self._run(SQLAlchemyDao.read_company, uuid)
+
+    async def read_companies(self, company_name: str = None, slack_team_id: str = None) -> List[Company]:
+        return await self._run(SQLAlchemyDao.read_companies, company_name=company_name, slack_team_id=slack_team_id)
+
+    async def read_company_by_slack_team_id(self, slack_team_id: str) -> Optional[Company]:
+        return await self._run(SQLAlchemyDao.read_company_by_slack_team_id, slack_team_id)
+
+    async def insert_department(self, department: Department):
+        await self._run(SQLAlchemyDao.insert_department, department)
+
+    async def read_department(self, company_uuid: str, uuid: str) -> Optional[Department]:
+        return await self._run(SQLAlchemyDao.read_department, company_uuid, uuid)
+
+    async def read_departments(self, company_uuid: str, department_name: str = None) -> List[Department]:
+        return await self._run(SQLAlchemyDao.read_departments, company_uuid, department_name=department_name)
+
+    async def delete_department(self, company_uuid: str, uuid: str):
+        await self._run(SQLAlchemyDao.delete_department, company_uuid, uuid)
+
+    async def insert_project(self, project: Project):
+        await self._run(SQLAlchemyDao.insert_project, project)
+
+    async def read_project(self, company_uuid: str, uuid: str) -> Optional[Project]:
+        return await self._run(SQLAlchemyDao.read_project, company_uuid, uuid)
+
+    async def read_projects(self, company_uuid: str, project_name: str = None) -> List[Project]:
+        return await self._run(SQLAlchemyDao.read_projects, company_uuid, project_name=project_name)
+
+    async def read_projects_by_uuids(self, company_uuid: str, uuids: Iterable[str]) -> List[Project]:
+        return await self._run(SQLAlchemyDao.read_projects_by_uuids, company_uuid, list(uuids))
+
+    async def delete_project(self, company_uuid: str, uuid: str):
+        await self._run(SQLAlchemyDao.delete_project, company_uuid, uuid)
+
+    async def insert_status_update_type(self, status_update_type: StatusUpdateType):
+        await self._run(SQLAlchemyDao.insert_status_update_type, status_update_type)
+
+    async def read_status_update_type(self, company_uuid: str, uuid: str) -> Optional[StatusUpdateType]:
+        return await self._run(SQLAlchemyDao.read_status_update_type, company_uuid, uuid)
+
+    async def read_status_update_types(self, company_uuid: str, name: str = None) -> List[StatusUpdateType]:
+        return await self._run(SQLAlchemyDao.read_status_update_types, company_uuid, name=name)
+
+    async def delete_status_update_type(self, company_uuid: str, uuid: str):
+        await self._run(SQLAlchemyDao.delete_status_update_type, company_uuid, uuid)
+
+    async def read_slack_user_preferences(self, user_id: str) -> Optional[SlackUserPreferences]:
+        return await self._run(SQLAlchemyDao.read_slack_user_preferences, user_id)
+
+    async def insert_slack_user_preferences(self, slack_user_preferences: SlackUserPreferences):
+        await self._run(SQLAlchemyDao.insert_slack_user_preferences, slack_user_preferences)
+
+    async def insert_many_slack_user_preferences(self, slack_user_preferences: Iterable[SlackUserPreferences]):
+        await self._run(SQLAlchemyDao.insert_many_slack_user_preferences, list(slack_user_preferences))
+
+    async def insert_status_update_reaction(self, status_update_reaction: StatusUpdateReaction):
+        await self._run(SQLAlchemyDao.insert_status_update_reaction, status_update_reaction)
+
+    async def read_status_update_reactions(self, company_uuid: str) -> List[StatusUpdateReaction]:
+        return await self._run(SQLAlchemyDao.read_status_update_reactions, company_uuid)
+
+
+class AsyncSQLiteDao(SQLiteFileMixin, AsyncDao):
+    def _dialect_insert(self, table: Table) -> Insert:
+        return sqlite.insert(table)
+
+    def _create_engine(self) -> AsyncEngine:
+        return create_async_engine(f"sqlite+aiosqlite:///{self._db_file}", echo=False)
+
+
+class AsyncPostgresDao(AsyncDao):
+    def _dialect_insert(self, table: Table) -> Insert:
+        return postgresql.insert(table)
+
+    def _create_engine(self) -> AsyncEngine:
+        conn_string = get_postgres_conn_string(
+            default=PostgresDao.CONN_STRING if "pytest" not in sys.modules else PostgresDao.CONN_PYTEST_STRING)
+        pool_config = get_db_pool_config()
+        return create_async_engine(
+            make_url(conn_string).set(drivername="postgresql+asyncpg"),
+            pool_size=pool_config.size,
+            max_overflow=pool_config.max_overflow,
+            pool_timeout=pool_config.timeout,
+            pool_pre_ping=pool_config.pre_ping,
+            pool_recycle=pool_config.recycle,
+        )
+
+
+_async_dao: Optional[AsyncDao] = None
+_async_dao_lock = Lock()
+
+
+def get_async_dao() -> AsyncDao:
+    """
+    AsyncDao of the active DAO type, on the same database as updateme.core.dao
+    """
+    global _async_dao
+    with _async_dao_lock:
+        if _async_dao is None:
+            if get_active_dao_type() == DaoType.POSTGRES:
+                _async_dao = AsyncPostgresDao()
+            elif get_active_dao_type() == DaoType.SQLITE:
+                _async_dao = AsyncSQLiteDao()
+            else:
+                raise TypeError(f"DAO {get_active_dao_type().name} is not supported")
+        return _async_dao
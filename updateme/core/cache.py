@@ -0,0 +1,500 @@
+import atexit
+import copy
+import logging
+import pickle
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from cachetools import LRUCache, TTLCache
+
+from updateme.core.config import get_cache_backend_type, CacheBackendType, get_redis_url
+from updateme.core.metrics import metrics
+
+
+class CacheBackend(ABC):
+    """
+    Second cache level, under the process-local caches below. Values are shared by every cache on the same backend (e.g.
+    every replica of the bot, with RedisCacheBackend), and so are invalidations: a cache publishes the keys it drops,
+    and all caches subscribed to the channel drop their local copies too
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]: ...
+
+    @abstractmethod
+    def set_many(self, values: Dict[str, Any], ttl: int): ...
+
+    def set(self, key: str, value: Any, ttl: int):
+        self.set_many({key: value}, ttl)
+
+    @abstractmethod
+    def delete(self, *keys: str): ...
+
+    @abstractmethod
+    def publish(self, channel: str, message: str):
+        """
+        Delivers the message to every subscriber of the channel, the publishing cache included
+        """
+
+    @abstractmethod
+    def subscribe(self, channel: str, callback: Callable[[str], None]): ...
+
+
+class InProcessCacheBackend(CacheBackend):
+    """
+    CacheBackend of a single process: caches created on it (e.g. by the sync and the asyncio DAO) share values and
+    invalidations, other processes see neither
+    """
+
+    def __init__(self, maxsize: int = 16 * 1024, ttl: int = 10 * 60):
+        self._lock = Lock()
+        self._values: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._subscribers: Dict[str, List[Callable[[str], None]]] = defaultdict(list)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            return self._values.get(key)
+
+    def set_many(self, values: Dict[str, Any], ttl: int):
+        # The TTL of the backend applies, TTLCache has no per-item TTL
+        with self._lock:
+            self._values.update(values)
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+
+    def publish(self, channel: str, message: str):
+        with self._lock:
+            callbacks = list(self._subscribers[channel])
+        for callback in callbacks:
+            callback(message)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]):
+        with self._lock:
+            self._subscribers[channel].append(callback)
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    CacheBackend on Redis, or anything speaking its protocol (Valkey, KeyDB, ...). Values are pickled. Redis being down
+    is not an error for the caches: reads miss and writes are skipped, so everything is loaded from the database.
+    Subscriptions are kept by a background thread, which reconnects (backing off up to max_reconnect_interval seconds)
+    whenever the connection is lost. Invalidations published while it's down are missed, the TTLs of the caches bound
+    for how long
+    """
+
+    KEY_PREFIX = "updateme:"
+
+    def __init__(self, url: str = None, client=None, reconnect_interval: float = 1, max_reconnect_interval: float = 30):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImportError("The redis cache backend needs the redis package: pip install redis") from None
+            # Connects on the first command, the first subscription included: don't hang on an unreachable host
+            client = redis.Redis.from_url(url or get_redis_url(), socket_connect_timeout=5)
+        self._client = client
+        # Tags published messages: local subscribers get them right away, not once more from Redis
+        self._id = uuid.uuid4().hex
+        self._callbacks: Dict[str, List[Callable[[str], None]]] = defaultdict(list)
+        self._pubsub = None
+        self._pubsub_lock = Lock()
+        self._listener: Optional[Thread] = None
+        self._reconnect_interval = reconnect_interval
+        self._max_reconnect_interval = max_reconnect_interval
+        self._errors = metrics.counter("cache.redis.errors")
+
+    def _key(self, key: str) -> str:
+        return self.KEY_PREFIX + key
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            value = self._client.get(self._key(key))
+        except Exception as e:
+            self._error("get", e)
+            return None
+        return pickle.loads(value) if value is not None else None
+
+    def set_many(self, values: Dict[str, Any], ttl: int):
+        try:
+            pipeline = self._client.pipeline(transaction=False)
+            for key, value in values.items():
+                pipeline.set(self._key(key), pickle.dumps(value), ex=ttl)
+            pipeline.execute()
+        except Exception as e:
+            self._error("set", e)
+
+    def delete(self, *keys: str):
+        try:
+            self._client.delete(*(self._key(key) for key in keys))
+        except Exception as e:
+            self._error("delete", e)
+
+    def publish(self, channel: str, message: str):
+        self._deliver(channel, message)
+        try:
+            self._client.publish(self._key(channel), f"{self._id} {message}")
+        except Exception as e:
+            self._error("publish", e)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]):
+        with self._pubsub_lock:
+            self._callbacks[channel].append(callback)
+            if self._pubsub is None:
+                self._connect()
+            elif len(self._callbacks[channel]) == 1:
+                try:
+                    self._pubsub.subscribe(**{self._key(channel): self._on_message})
+                except Exception as e:
+                    # The listener reconnects and subscribes to every channel again
+                    self._error("subscribe", e)
+            if self._listener is None:
+                self._listener = Thread(target=self._listen, name="redis-cache-subscriber", daemon=True)
+                self._listener.start()
+
+    def _connect(self) -> bool:
+        """
+        Subscribes to every channel on a new connection. Called with _pubsub_lock held
+        """
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(**{self._key(channel): self._on_message for channel in self._callbacks})
+        except Exception as e:
+            self._error("subscribe", e)
+            self._close(pubsub)
+            return False
+        self._pubsub = pubsub
+        return True
+
+    def _listen(self):
+        delay = self._reconnect_interval
+        while True:
+            with self._pubsub_lock:
+                pubsub = self._pubsub
+                if pubsub is None and self._connect():
+                    pubsub = self._pubsub
+            if pubsub is None:
+                time.sleep(delay)
+                delay = min(delay * 2, self._max_reconnect_interval)
+                continue
+            delay = self._reconnect_interval
+            try:
+                # Handlers of the subscriptions (_on_message) run in here
+                pubsub.get_message(timeout=1)
+            except Exception as e:
+                self._error("receive", e)
+                with self._pubsub_lock:
+                    if self._pubsub is pubsub:
+                        self._pubsub = None
+                self._close(pubsub)
+
+    @staticmethod
+    def _close(pubsub):
+        try:
+            pubsub.close()
+        except Exception:
+            pass
+
+    def _on_message(self, message: dict):
+        channel = message["channel"]
+        channel = (channel.decode() if isinstance(channel, bytes) else channel)[len(self.KEY_PREFIX):]
+        data = message["data"]
+        sender, _, text = (data.decode() if isinstance(data, bytes) else data).partition(" ")
+        if sender != self._id:
+            self._deliver(channel, text)
+
+    def _deliver(self, channel: str, message: str):
+        with self._pubsub_lock:
+            callbacks = list(self._callbacks.get(channel, ()))
+        for callback in callbacks:
+            try:
+                callback(message)
+            except Exception as e:
+                logging.error(f"Can not handle {channel} message {message}: {e}")
+
+    def _error(self, operation: str, e: Exception):
+        self._errors.inc()
+        logging.warning(f"Redis cache {operation} failed: {e}")
+
+
+_backend: Optional[CacheBackend] = None
+_backend_lock = Lock()
+
+
+def get_cache_backend() -> CacheBackend:
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if get_cache_backend_type() == CacheBackendType.REDIS:
+                _backend = RedisCacheBackend()
+            else:
+                _backend = InProcessCacheBackend()
+        return _backend
+
+
+class TaxonomyCache:
+    """
+    Per-company snapshots of the taxonomy (departments, teams, projects, status update types and reactions), which
+    changes rarely and is read by nearly every handler. Snapshots are tuples of detached objects shared between threads:
+    read them, don't modify them. Any taxonomy write of a company drops all of its snapshots, here and, through the
+    backend, in every other cache on it. The TTL bounds how long other writes (e.g. straight to the database) stay
+    unnoticed
+    """
+
+    KINDS = ("departments", "teams", "projects", "status_update_types", "status_update_reactions")
+
+    def __init__(self, name: str = "taxonomy", maxsize: int = 1024, ttl: int = 5 * 60,
+                 backend: CacheBackend = None):
+        self._name = name
+        self._ttl = ttl
+        self._backend = backend or InProcessCacheBackend()
+        self._backend.subscribe(f"{name}.invalidations", self._invalidate_locally)
+        self._lock = Lock()
+        self._snapshots: TTLCache = TTLCache(maxsize=maxsize * len(self.KINDS), ttl=ttl)
+        # Bumped by every invalidation, so a snapshot loaded while a write was committed is not stored
+        self._generations: Dict[str, int] = dict()
+        self._hits = metrics.counter(f"cache.{name}.hits")
+        self._misses = metrics.counter(f"cache.{name}.misses")
+        self._invalidations = metrics.counter(f"cache.{name}.invalidations")
+
+    def get(self, company_uuid: str, kind: str, load: Callable[[], Iterable]) -> Tuple:
+        key = (company_uuid, kind)
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            generation = self._generations.get(company_uuid, 0)
+        if snapshot is not None:
+            self._hits.inc()
+            return snapshot
+
+        self._misses.inc()
+        backend_key = self._backend_key(company_uuid, kind)
+        snapshot = self._backend.get(backend_key)
+        loaded = snapshot is None
+        if loaded:
+            snapshot = tuple(load())
+        with self._lock:
+            current = self._generations.get(company_uuid, 0) == generation
+            if current:
+                self._snapshots[key] = snapshot
+        if loaded and current:
+            self._backend.set(backend_key, snapshot, self._ttl)
+        return snapshot
+
+    def _backend_key(self, company_uuid: str, kind: str) -> str:
+        return f"{self._name}:{company_uuid}:{kind}"
+
+    def generation(self, company_uuid: str) -> int:
+        with self._lock:
+            return self._generations.get(company_uuid, 0)
+
+    def invalidate(self, company_uuid: str):
+        self._backend.delete(*(self._backend_key(company_uuid, kind) for kind in self.KINDS))
+        # Delivered to this instance as well
+        self._backend.publish(f"{self._name}.invalidations", company_uuid)
+
+    def _invalidate_locally(self, company_uuid: str):
+        with self._lock:
+            self._generations[company_uuid] = self._generations.get(company_uuid, 0) + 1
+            for kind in self.KINDS:
+                self._snapshots.pop((company_uuid, kind), None)
+        self._invalidations.inc()
+
+    def clear(self):
+        with self._lock:
+            for company_uuid in {company_uuid for company_uuid, _ in self._snapshots.keys()}:
+                self._generations[company_uuid] = self._generations.get(company_uuid, 0) + 1
+            self._snapshots.clear()
+
+
+class Generations:
+    """
+    Per-key counters bumped by writes. Made part of a cache key, they make entries built before a write unreachable.
+    Bumps are published through the backend, so they reach the counters of other caches (and replicas) too
+    """
+
+    def __init__(self, name: str, backend: CacheBackend = None):
+        self._channel = f"{name}.generations"
+        self._backend = backend or InProcessCacheBackend()
+        self._backend.subscribe(self._channel, self._bump_locally)
+        self._lock = Lock()
+        self._generations: Dict[str, int] = dict()
+
+    def get(self, key: str) -> int:
+        with self._lock:
+            return self._generations.get(key, 0)
+
+    def bump(self, key: str):
+        # Delivered to this instance as well
+        self._backend.publish(self._channel, key)
+
+    def _bump_locally(self, key: str):
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+
+class ResolutionCache:
+    """
+    Bounded LRU cache of key -> object lookups, e.g. a Slack team id to its Company. "Not found" is cached too, for a
+    short time only and never in the backend, since the object may be created by another process. Objects are shared
+    between threads: read them, don't modify them
+    """
+
+    _NOT_FOUND = object()
+
+    def __init__(self, name: str, maxsize: int = 4096, negative_ttl: int = 30, backend_ttl: int = 10 * 60,
+                 backend: CacheBackend = None):
+        self._name = name
+        self._backend_ttl = backend_ttl
+        self._backend = backend or InProcessCacheBackend()
+        self._backend.subscribe(f"{name}.invalidations", self._invalidate_locally)
+        self._lock = Lock()
+        self._found: LRUCache = LRUCache(maxsize=maxsize)
+        self._not_found: TTLCache = TTLCache(maxsize=maxsize, ttl=negative_ttl)
+        self._generation = 0
+        self._hits = metrics.counter(f"cache.{name}.hits")
+        self._negative_hits = metrics.counter(f"cache.{name}.negative_hits")
+        self._misses = metrics.counter(f"cache.{name}.misses")
+
+    def get(self, key: str, load: Callable[[], Optional[Any]]) -> Optional[Any]:
+        with self._lock:
+            value = self._found.get(key, self._NOT_FOUND)
+            if value is self._NOT_FOUND and key in self._not_found:
+                value = None
+            generation = self._generation
+        if value is None:
+            self._negative_hits.inc()
+            return None
+        if value is not self._NOT_FOUND:
+            self._hits.inc()
+            return value
+
+        self._misses.inc()
+        value = self._backend.get(f"{self._name}:{key}")
+        loaded = value is None
+        if loaded:
+            value = load()
+        with self._lock:
+            current = self._generation == generation
+            if current:
+                if value is None:
+                    self._not_found[key] = True
+                else:
+                    self._found[key] = value
+        if loaded and current and value is not None:
+            self._backend.set(f"{self._name}:{key}", value, self._backend_ttl)
+        return value
+
+    def invalidate(self, key: str):
+        self._backend.delete(f"{self._name}:{key}")
+        # Delivered to this instance as well
+        self._backend.publish(f"{self._name}.invalidations", key)
+
+    def _invalidate_locally(self, key: str):
+        with self._lock:
+            self._generation += 1
+            self._found.pop(key, None)
+            self._not_found.pop(key, None)
+
+
+class WriteBehindCache:
+    """
+    Serves key -> object reads from memory and writes changed objects back in batches from a background thread, at
+    most flush_interval seconds after they were put, and once more at interpreter exit (which a plain SIGTERM skips, so
+    the bot's entry points flush from a signal handler of their own too). Meant for state owned by this process, e.g.
+    per-user preferences: changes made by other processes are only noticed once the TTL expires. Cached objects are
+    shared with the flushing thread: put() keeps a copy of the object and get() hands out one, so that callers can change
+    what they get and put it back
+    """
+
+    def __init__(self, name: str, key: Callable[[Any], Hashable], load: Callable[[Hashable], Optional[Any]],
+                 store: Callable[[List[Any]], None], copy: Callable[[Any], Any] = copy.copy, flush_interval: float = 5,
+                 max_pending: int = 256, maxsize: int = 4096, ttl: int = 10 * 60):
+        self._name = name
+        self._key = key
+        self._copy = copy
+        self._load = load
+        self._store = store
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._lock = Lock()
+        self._objects: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Put but not stored yet. Kept apart from _objects, so they are neither evicted nor expired before the flush
+        self._pending: Dict[Hashable, Any] = dict()
+        self._flush_lock = Lock()
+        self._wakeup = Event()
+        self._thread: Optional[Thread] = None
+        self._hits = metrics.counter(f"cache.{name}.hits")
+        self._misses = metrics.counter(f"cache.{name}.misses")
+        self._writes = metrics.counter(f"cache.{name}.writes")
+        self._flushed = metrics.counter(f"cache.{name}.flushed")
+        self._flush_errors = metrics.counter(f"cache.{name}.flush_errors")
+        self._flush_timer = metrics.timer(f"cache.{name}.flush")
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            obj = self._pending.get(key) or self._objects.get(key)
+        if obj is not None:
+            self._hits.inc()
+            return self._copy(obj)
+
+        self._misses.inc()
+        obj = self._load(key)
+        if obj is None:
+            return None
+        with self._lock:
+            # An object put meanwhile is newer than the loaded one
+            obj = self._pending.get(key) or self._objects.setdefault(key, obj)
+        return self._copy(obj)
+
+    def put(self, obj: Any):
+        obj = self._copy(obj)
+        key = self._key(obj)
+        with self._lock:
+            self._objects[key] = obj
+            self._pending[key] = obj
+            pending = len(self._pending)
+        self._writes.inc()
+        self._start()
+        if pending >= self._max_pending:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, dict()
+            if not pending:
+                return
+            try:
+                with self._flush_timer.time():
+                    self._store(list(pending.values()))
+            except Exception:
+                with self._lock:
+                    for key, obj in pending.items():
+                        self._pending.setdefault(key, obj)
+                self._flush_errors.inc()
+                raise
+            self._flushed.inc(len(pending))
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name=f"{self._name}-write-behind", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self._flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Can not write back {self._name}: {e}")
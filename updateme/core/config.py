@@ -1,5 +1,7 @@
 import os
+from dataclasses import dataclass
 from enum import Enum
+from typing import Optional
 
 
 def _demand_env_variable(name: str) -> str:
@@ -9,6 +11,27 @@ def _demand_env_variable(name: str) -> str:
     return result
 
 
+def _int_env_variable(name: str, default: int) -> int:
+    value = os.getenv(name, "").strip()
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise EnvironmentError(f"{name} env variable must be an integer, got \"{value}\"") from None
+
+
+def _bool_env_variable(name: str, default: bool) -> bool:
+    value = os.getenv(name, "").strip().lower()
+    if not value:
+        return default
+    if value in ("1", "true", "yes", "on"):
+        return True
+    if value in ("0", "false", "no", "off"):
+        return False
+    raise EnvironmentError(f"{name} env variable must be a boolean, got \"{value}\"")
+
+
 def slack_bot_token() -> str:
     return _demand_env_variable("SLACK_BOT_TOKEN")
 
@@ -41,6 +64,149 @@ def get_active_dao_type(default=DaoType.POSTGRES) -> DaoType:
         return default
 
 
+def get_postgres_conn_string(default: Optional[str] = None) -> Optional[str]:
+    return os.getenv("UPDATE_ME_POSTGRES_URL", "").strip() or default
+
+
+@dataclass(frozen=True)
+class DbPoolConfig:
+    size: int
+    max_overflow: int
+    timeout: int
+    pre_ping: bool
+    recycle: int
+
+
+def get_db_pool_config() -> DbPoolConfig:
+    # By default every Bolt listener and lazy listener thread (see get_listener_executor_config) can hold a connection
+    return DbPoolConfig(
+        size=_int_env_variable("UPDATE_ME_DB_POOL_SIZE", 5),
+        max_overflow=_int_env_variable("UPDATE_ME_DB_POOL_MAX_OVERFLOW", 10),
+        timeout=_int_env_variable("UPDATE_ME_DB_POOL_TIMEOUT", 30),
+        pre_ping=_bool_env_variable("UPDATE_ME_DB_POOL_PRE_PING", True),
+        recycle=_int_env_variable("UPDATE_ME_DB_POOL_RECYCLE", 30 * 60),
+    )
+
+
+class RejectionPolicy(Enum):
+    # The submitting thread waits for a free slot
+    BLOCK = 1
+    # The task is dropped and counted
+    SHED = 2
+    # The submitting thread runs the task itself
+    CALLER_RUNS = 3
+
+
+@dataclass(frozen=True)
+class ListenerExecutorConfig:
+    workers: int
+    lazy_workers: int
+    max_queue_size: int
+    rejection_policy: RejectionPolicy
+    lazy_rejection_policy: RejectionPolicy
+
+
+def _rejection_policy_env_variable(name: str, default: RejectionPolicy) -> RejectionPolicy:
+    try:
+        return RejectionPolicy[os.getenv(name, "").upper().strip()]
+    except KeyError:
+        return default
+
+
+def get_listener_executor_config() -> ListenerExecutorConfig:
+    # Lazy listeners do the DB work, so there should be no more of them than the DB pool has connections (with overflow)
+    return ListenerExecutorConfig(
+        workers=_int_env_variable("UPDATE_ME_LISTENER_WORKERS", 5),
+        lazy_workers=_int_env_variable("UPDATE_ME_LAZY_LISTENER_WORKERS", 10),
+        max_queue_size=_int_env_variable("UPDATE_ME_LISTENER_MAX_QUEUE_SIZE", 200),
+        # A shed request is never acked, so Slack shows the user an error
+        rejection_policy=_rejection_policy_env_variable("UPDATE_ME_LISTENER_REJECTION_POLICY", RejectionPolicy.SHED),
+        # Lazy listeners run after the ack: shedding one would make a click or a submission silently do nothing, so
+        # the listener thread handing it over waits instead
+        lazy_rejection_policy=_rejection_policy_env_variable("UPDATE_ME_LAZY_LISTENER_REJECTION_POLICY",
+                                                             RejectionPolicy.BLOCK),
+    )
+
+
+@dataclass(frozen=True)
+class SlackApiDispatcherConfig:
+    max_concurrent_calls: int
+    max_retries: int
+
+
+def get_slack_api_dispatcher_config() -> SlackApiDispatcherConfig:
+    return SlackApiDispatcherConfig(
+        # Per workspace, across all methods. Calls above it wait in priority order
+        max_concurrent_calls=_int_env_variable("UPDATE_ME_SLACK_MAX_CONCURRENT_CALLS", 8),
+        # Times a call rejected with HTTP 429 is retried, each time once its Retry-After has passed
+        max_retries=_int_env_variable("UPDATE_ME_SLACK_MAX_RETRIES", 3),
+    )
+
+
+class SQLiteProfile(Enum):
+    DEFAULT = 1
+    PERFORMANCE = 2
+
+
+def get_sqlite_profile(default=SQLiteProfile.DEFAULT) -> SQLiteProfile:
+    try:
+        return SQLiteProfile[os.getenv("UPDATE_ME_SQLITE_PROFILE", "").upper().strip()]
+    except KeyError:
+        return default
+
+
+def get_sqlite_db_file(default: Optional[str] = None) -> Optional[str]:
+    return os.getenv("UPDATE_ME_SQLITE_DB_FILE", "").strip() or default
+
+
+class CacheBackendType(Enum):
+    MEMORY = 1
+    REDIS = 2
+
+
+def get_cache_backend_type(default=CacheBackendType.MEMORY) -> CacheBackendType:
+    try:
+        return CacheBackendType[os.getenv("UPDATE_ME_CACHE_BACKEND", "").upper().strip()]
+    except KeyError:
+        return default
+
+
+def get_redis_url(default: str = "redis://localhost:6379/0") -> str:
+    return os.getenv("UPDATE_ME_REDIS_URL", "").strip() or default
+
+
+def get_preferences_flush_interval(default: int = 5) -> int:
+    # Seconds a changed SlackUserPreferences may stay in memory only before it's written to the database
+    return _int_env_variable("UPDATE_ME_PREFERENCES_FLUSH_INTERVAL", default)
+
+
+def get_metrics_log_interval(default: int = 60) -> int:
+    # Seconds between two snapshots of the metrics written to the log, 0 turns them off
+    return _int_env_variable("UPDATE_ME_METRICS_LOG_INTERVAL", default)
+
+
+def get_slack_user_directory_file(default: Optional[str] = None) -> Optional[str]:
+    return os.getenv("UPDATE_ME_SLACK_USER_DIRECTORY_FILE", "").strip() or default
+
+
+@dataclass(frozen=True)
+class SQLiteTuningConfig:
+    mmap_size: int
+    cache_size: int
+    busy_timeout: int
+
+
+def get_sqlite_tuning_config() -> SQLiteTuningConfig:
+    return SQLiteTuningConfig(
+        # Bytes of the database file SQLite may memory-map
+        mmap_size=_int_env_variable("UPDATE_ME_SQLITE_MMAP_SIZE", 256 * 1024 * 1024),
+        # Page cache size, SQLite semantic: negative values are KiB, positive ones are pages
+        cache_size=_int_env_variable("UPDATE_ME_SQLITE_CACHE_SIZE", -64 * 1024),
+        # Milliseconds a connection waits for a lock held by another connection before failing with "database is locked"
+        busy_timeout=_int_env_variable("UPDATE_ME_SQLITE_BUSY_TIMEOUT", 5000),
+    )
+
+
 INITIAL_TEAM_NAMES = {
     "R&D": [
         "Mobile",
@@ -1,38 +1,147 @@
+import dataclasses
+import enum
+import functools
+import logging
 import os
 import sys
+import threading
+import time
 from abc import ABC, abstractmethod
 from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 
-from sqlalchemy import create_engine, and_, or_, false, true, desc, Enum
+from sqlalchemy import create_engine, and_, false, true, desc, Enum, event, tuple_, inspect, text, exists, insert, \
+    select, update, literal, Insert, Select
 from sqlalchemy import Boolean
 from sqlalchemy import Column
 from sqlalchemy import DateTime
 from sqlalchemy import ForeignKey
+from sqlalchemy import Index
 from sqlalchemy import MetaData
 from sqlalchemy import String
 from sqlalchemy import Text
 from sqlalchemy import Table
 from sqlalchemy.engine import Engine
-from sqlalchemy.orm import registry, sessionmaker, Session
-from sqlalchemy.orm import relationship
-from typing import List, Optional, Generator
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import registry, sessionmaker, Session, scoped_session
+from sqlalchemy.orm import relationship, defaultload, joinedload, lazyload, selectinload, contains_eager
+from sqlalchemy.orm.interfaces import MANYTOONE, ONETOMANY
+from typing import List, Optional, Generator, Dict, Mapping, Tuple, Iterable, Union, Set
 
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import NullPool, QueuePool
 
 from updateme.core.model import Company, Project, StatusUpdate, StatusUpdateType, Team, SlackUserPreferences, \
     StatusUpdateImage, StatusUpdateSource, StatusUpdateReaction, Department
 from updateme.core.config import INITIAL_TEAM_NAMES, INITIAL_PROJECT_NAMES, INITIAL_STATUS_UPDATE_TYPES, INITIAL_REACTIONS, get_active_dao_type, \
-    DaoType
+    DaoType, get_db_pool_config, get_postgres_conn_string, get_sqlite_profile, SQLiteProfile, get_sqlite_tuning_config, \
+    get_sqlite_db_file
+from updateme.core.cache import TaxonomyCache, ResolutionCache, Generations, get_cache_backend
+from updateme.core.metrics import metrics
+
+
+class Loading(enum.Enum):
+    LAZY = "select"
+    SELECTIN = "selectin"
+    JOINED = "joined"
+
+
+# Relationship path (e.g. "teams" or "teams.department") -> how to load it
+LoadProfile = Mapping[str, Loading]
+
+# Everything status_update_blocks / status_update_list_blocks and the email composer touch: a feed or a digest costs
+# a fixed number of queries no matter how many status updates are rendered
+STATUS_UPDATE_FEED_LOAD_PROFILE: LoadProfile = {
+    "company": Loading.JOINED,
+    "type": Loading.JOINED,
+    "teams": Loading.SELECTIN,
+    "projects": Loading.SELECTIN,
+    "images": Loading.SELECTIN,
+}
+
+STATUS_UPDATE_LAZY_LOAD_PROFILE: LoadProfile = {}
+
+TEAM_LOAD_PROFILE: LoadProfile = {
+    "department": Loading.JOINED,
+    "department.company": Loading.JOINED,
+}
+
+# Read through TaxonomyCache
+TAXONOMY_CLASSES = (Department, Team, Project, StatusUpdateType, StatusUpdateReaction)
+
+SLACK_USER_PREFERENCES_LOAD_PROFILE: LoadProfile = {
+    "active_team_filter": Loading.JOINED,
+    "active_team_filter.department": Loading.JOINED,
+    "active_department_filter": Loading.JOINED,
+    "active_project_filter": Loading.JOINED,
+}
+
+
+@dataclass(frozen=True)
+class StatusUpdateCursor:
+    """
+    Position in a status update feed, which is ordered by (created_at, uuid) descending. A page "older than" a cursor
+    starts right after the status update the cursor was taken from
+    """
+    created_at: datetime
+    uuid: str
+
+    def __str__(self):
+        return self.as_str()
+
+    def as_str(self) -> str:
+        return f"{self.created_at.isoformat()}|{self.uuid}"
+
+    @classmethod
+    def from_str(cls, s: str) -> "StatusUpdateCursor":
+        created_at, uuid = s.split("|", 1)
+        return StatusUpdateCursor(created_at=datetime.fromisoformat(created_at), uuid=uuid)
+
+    @classmethod
+    def of(cls, status_update: StatusUpdate) -> "StatusUpdateCursor":
+        return StatusUpdateCursor(created_at=status_update.created_at, uuid=status_update.uuid)
 
 
 class Dao(ABC):
+    @contextmanager
+    def session_scope(self) -> Generator[None, None, None]:
+        yield
+
+    @abstractmethod
+    def insert_many(self, objs: Iterable): ...
+
+    @abstractmethod
+    def soft_delete_many(self, cls: type, company_uuid: str, uuids: Iterable[str]): ...
+
     @abstractmethod
     def insert_status_update(self, status_update: StatusUpdate): ...
 
     @abstractmethod
     def publish_status_update(self, company_uuid: str, uuid: str) -> bool: ...
 
+    @abstractmethod
+    def update_status_update(self, company_uuid: str, uuid: str, **values) -> bool:
+        """
+        Sets the given columns (e.g. published=True or status_update_type_uuid=...) of a status update without loading it.
+        Returns False if the company has no such status update
+        """
+
+    @abstractmethod
+    def replace_status_update_teams(self, company_uuid: str, uuid: str, team_uuids: Iterable[str]): ...
+
+    @abstractmethod
+    def read_feed_generation(self, company_uuid: str) -> int:
+        """
+        A number that grows whenever anything a feed of the company shows may have changed (status updates, their teams
+        and projects, the taxonomy). Writes of other DAO instances count as far as the cache backend reaches: with the
+        in-process one, those of this process only; with Redis, those of every replica as well (a bump can arrive a
+        moment after the write it's for)
+        """
+
+    @abstractmethod
+    def replace_status_update_projects(self, company_uuid: str, uuid: str, project_uuids: Iterable[str]): ...
+
     def read_last_unpublished_status_update(self, company_uuid: str, author_slack_user_id: str,
                                             no_older_than: timedelta = timedelta(days=2),
                                             source: StatusUpdateSource = None) -> Optional[StatusUpdate]:
@@ -41,20 +150,37 @@ class Dao(ABC):
             created_after=datetime.utcnow() - no_older_than,
             author_slack_user_id=author_slack_user_id,
             published=False,
-            source=source
+            source=source,
+            last_n=1
         )
         if updates:
-            return max(updates, key=lambda update: update.created_at)
+            return updates[0]
 
     @abstractmethod
-    def read_status_update(self, company_uuid: str, uuid: str) -> Optional[StatusUpdate]: ...
+    def read_status_update(self, company_uuid: str, uuid: str,
+                           load: LoadProfile = STATUS_UPDATE_FEED_LOAD_PROFILE) -> Optional[StatusUpdate]: ...
 
     @abstractmethod
     def read_status_updates(self, company_uuid: str, created_after: datetime = None, created_before: datetime = None,
-                            from_teams: List[str] = None, from_projects: List[str] = None,
-                            with_types: List[str] = None, published: Optional[bool] = True,
-                            deleted: Optional[bool] = False, author_slack_user_id: str = None,
-                            last_n: int = None, source: StatusUpdateSource = None) -> List[StatusUpdate]: ...
+                            from_teams: List[str] = None, from_departments: List[str] = None,
+                            from_projects: List[str] = None, with_types: List[str] = None,
+                            published: Optional[bool] = True, deleted: Optional[bool] = False,
+                            author_slack_user_id: str = None, last_n: int = None, source: StatusUpdateSource = None,
+                            older_than: StatusUpdateCursor = None,
+                            load: LoadProfile = STATUS_UPDATE_FEED_LOAD_PROFILE) -> List[StatusUpdate]: ...
+
+    def read_status_updates_page(self, company_uuid: str, page_size: int, older_than: StatusUpdateCursor = None,
+                                 **kwargs) -> Tuple[List[StatusUpdate], Optional[StatusUpdateCursor]]:
+        """
+        Returns up to page_size status updates older than the given cursor (the newest ones if there is no cursor), and
+        a cursor of the next page, or None if this is the last one
+        """
+        status_updates = self.read_status_updates(company_uuid=company_uuid, last_n=page_size + 1,
+                                                  older_than=older_than, **kwargs)
+        if len(status_updates) > page_size:
+            status_updates = status_updates[:page_size]
+            return status_updates, StatusUpdateCursor.of(status_updates[-1])
+        return status_updates, None
 
     @abstractmethod
     def delete_status_update(self, company_uuid: str, uuid: str): ...
@@ -71,6 +197,13 @@ class Dao(ABC):
     @abstractmethod
     def read_teams(self, company_uuid: str, team_name: str = None, department_uuid: str = None) -> List[Team]: ...
 
+    @abstractmethod
+    def read_teams_by_uuids(self, company_uuid: str, uuids: Iterable[str]) -> List[Team]:
+        """
+        Teams of the company among the given ones, in the given order. Unknown uuids and teams of other companies are
+        left out
+        """
+
     @abstractmethod
     def delete_team(self, company_uuid: str, uuid: str): ...
 
@@ -83,6 +216,9 @@ class Dao(ABC):
     @abstractmethod
     def read_companies(self, company_name: str = None, slack_team_id: str = None) -> List[Company]: ...
 
+    @abstractmethod
+    def read_company_by_slack_team_id(self, slack_team_id: str) -> Optional[Company]: ...
+
     @abstractmethod
     def insert_department(self, department: Department): ...
 
@@ -104,6 +240,13 @@ class Dao(ABC):
     @abstractmethod
     def read_projects(self, company_uuid: str, project_name: str = None) -> List[Project]: ...
 
+    @abstractmethod
+    def read_projects_by_uuids(self, company_uuid: str, uuids: Iterable[str]) -> List[Project]:
+        """
+        Projects of the company among the given ones, in the given order. Unknown uuids and projects of other companies
+        are left out
+        """
+
     @abstractmethod
     def delete_project(self, company_uuid: str, uuid: str): ...
 
@@ -125,6 +268,9 @@ class Dao(ABC):
     @abstractmethod
     def insert_slack_user_preferences(self, slack_user_preferences: SlackUserPreferences): ...
 
+    @abstractmethod
+    def insert_many_slack_user_preferences(self, slack_user_preferences: Iterable[SlackUserPreferences]): ...
+
     @abstractmethod
     def insert_status_update_reaction(self, status_update_reaction: StatusUpdateReaction): ...
 
@@ -132,84 +278,86 @@ class Dao(ABC):
     def read_status_update_reactions(self, company_uuid: str) -> List[StatusUpdateReaction]: ...
 
 
-class SQLAlchemyDao(Dao, ABC):
-    _COMPANIES_TABLE = "companies"
-    _TEAMS_TABLE = "teams"
-    _DEPARTMENTS_TABLE = "departments"
-    _STATUS_UPDATES_TABLE = "status_updates"
-    _PROJECTS_TABLE = "projects"
-    _STATUS_UPDATE_TYPES_TABLE = "status_update_types"
-    _STATUS_UPDATE_REACTIONS_TABLE = "status_update_reactions"
-    _STATUS_UPDATE_IMAGES_TABLE = "status_update_images"
-    _SLACK_USER_PREFERENCES_TABLE = "slack_user_preferences"
-
-    @abstractmethod
-    def _create_engine(self) -> Engine: ...
+class SQLAlchemySchema:
+    """
+    Tables and imperative mappings of the model classes. A class can be mapped only once, so every SQLAlchemy based DAO
+    (sync or async) shares the one returned by get_sqlalchemy_schema()
+    """
+    COMPANIES_TABLE = "companies"
+    TEAMS_TABLE = "teams"
+    DEPARTMENTS_TABLE = "departments"
+    STATUS_UPDATES_TABLE = "status_updates"
+    PROJECTS_TABLE = "projects"
+    STATUS_UPDATE_TYPES_TABLE = "status_update_types"
+    STATUS_UPDATE_REACTIONS_TABLE = "status_update_reactions"
+    STATUS_UPDATE_IMAGES_TABLE = "status_update_images"
+    SLACK_USER_PREFERENCES_TABLE = "slack_user_preferences"
+    SLACK_USER_DRAFTS_TABLE = "slack_user_drafts"
 
     def __init__(self):
-        self._mapper_registry = registry()
-        self._metadata_obj = MetaData()
+        self.registry = registry()
+        self.metadata = MetaData()
 
-        self._companies_table = Table(
-            self._COMPANIES_TABLE,
-            self._metadata_obj,
+        self.companies_table = Table(
+            self.COMPANIES_TABLE,
+            self.metadata,
             Column("uuid", String(256), primary_key=True, nullable=False),
             Column("slack_team_id", String(256), nullable=False, unique=True, index=True),
             Column("name", String(256), nullable=False),
         )
 
-        self._departments_table = Table(
-            self._DEPARTMENTS_TABLE,
-            self._metadata_obj,
+        self.departments_table = Table(
+            self.DEPARTMENTS_TABLE,
+            self.metadata,
             Column("uuid", String(256), primary_key=True, nullable=False),
             Column("name", String(256), nullable=False),
-            Column("company_uuid", String(256), ForeignKey(f"{self._COMPANIES_TABLE}.uuid"), nullable=False,
+            Column("company_uuid", String(256), ForeignKey(f"{self.COMPANIES_TABLE}.uuid"), nullable=False,
                    index=True),
             Column("deleted", Boolean, nullable=False),
         )
 
-        self._teams_table = Table(
-            self._TEAMS_TABLE,
-            self._metadata_obj,
+        self.teams_table = Table(
+            self.TEAMS_TABLE,
+            self.metadata,
             Column("uuid", String(256), primary_key=True, nullable=False),
             Column("name", String(256), nullable=False),
-            Column("department_uuid", String(256), ForeignKey(f"{self._DEPARTMENTS_TABLE}.uuid"), nullable=False),
+            Column("department_uuid", String(256), ForeignKey(f"{self.DEPARTMENTS_TABLE}.uuid"), nullable=False),
             Column("deleted", Boolean, nullable=False),
         )
 
-        self._projects_table = Table(
-            self._PROJECTS_TABLE,
-            self._metadata_obj,
+        self.projects_table = Table(
+            self.PROJECTS_TABLE,
+            self.metadata,
             Column("uuid", String(256), primary_key=True, nullable=False),
-            Column("company_uuid", String(256), ForeignKey(f"{self._COMPANIES_TABLE}.uuid"), nullable=False),
+            Column("company_uuid", String(256), ForeignKey(f"{self.COMPANIES_TABLE}.uuid"), nullable=False),
             Column("name", String(256), nullable=False),
             Column("deleted", Boolean, nullable=False),
         )
 
-        self._status_update_types_table = Table(
-            self._STATUS_UPDATE_TYPES_TABLE,
-            self._metadata_obj,
+        self.status_update_types_table = Table(
+            self.STATUS_UPDATE_TYPES_TABLE,
+            self.metadata,
             Column("uuid", String(256), primary_key=True, nullable=False),
             Column("name", String(256), nullable=False),
-            Column("company_uuid", String(256), ForeignKey(f"{self._COMPANIES_TABLE}.uuid"), nullable=False),
+            Column("company_uuid", String(256), ForeignKey(f"{self.COMPANIES_TABLE}.uuid"), nullable=False),
             Column("deleted", Boolean, nullable=False),
         )
 
-        self._status_update_reactions_table = Table(
-            self._STATUS_UPDATE_REACTIONS_TABLE,
-            self._metadata_obj,
+        self.status_update_reactions_table = Table(
+            self.STATUS_UPDATE_REACTIONS_TABLE,
+            self.metadata,
             Column("uuid", String(256), primary_key=True, nullable=False),
-            Column("company_uuid", String(256), ForeignKey(f"{self._COMPANIES_TABLE}.uuid"), nullable=False),
+            Column("company_uuid", String(256), ForeignKey(f"{self.COMPANIES_TABLE}.uuid"), nullable=False),
             Column("emoji", String(256), nullable=False),
             Column("name", String(256), nullable=False),
             Column("deleted", Boolean, nullable=False),
         )
 
-        self._status_update_table = Table(
-            self._STATUS_UPDATES_TABLE,
-            self._metadata_obj,
+        self.status_update_table = Table(
+            self.STATUS_UPDATES_TABLE,
+            self.metadata,
             Column("uuid", String(256), primary_key=True, nullable=False),
-            Column("company_uuid", String(256), ForeignKey(f"{self._COMPANIES_TABLE}.uuid"), nullable=False),
+            Column("company_uuid", String(256), ForeignKey(f"{self.COMPANIES_TABLE}.uuid"), nullable=False),
             Column("source", Enum(StatusUpdateSource), nullable=False),
             Column("link", String(1024), nullable=True),
             Column("published", Boolean, nullable=False),
@@ -219,87 +367,111 @@ class SQLAlchemyDao(Dao, ABC):
             Column("author_slack_user_id", String(256), nullable=True),
             Column("author_slack_user_name", String(256), nullable=True),
             Column("created_at", DateTime, nullable=False),
-            Column("status_update_type_uuid", String(256), ForeignKey(f"{self._STATUS_UPDATE_TYPES_TABLE}.uuid")),
+            Column("status_update_type_uuid", String(256), ForeignKey(f"{self.STATUS_UPDATE_TYPES_TABLE}.uuid")),
+            # Company feed: WHERE company_uuid, published, deleted ORDER BY created_at DESC, uuid DESC
+            Index(f"ix_{self.STATUS_UPDATES_TABLE}_feed", "company_uuid", "published", "deleted", "created_at",
+                  "uuid"),
+            # "My updates" feed
+            Index(f"ix_{self.STATUS_UPDATES_TABLE}_author_feed", "company_uuid", "author_slack_user_id", "published",
+                  "deleted", "created_at", "uuid"),
+            # The author's latest drafts of a given source
+            Index(f"ix_{self.STATUS_UPDATES_TABLE}_author_source", "company_uuid", "author_slack_user_id", "source",
+                  "published", "deleted", "created_at"),
         )
 
-        self._status_update_projects_association_table = Table(
+        self.status_update_projects_association_table = Table(
             "status_update_projects_association",
-            self._metadata_obj,
-            Column("status_update_uuid", ForeignKey(f"{self._STATUS_UPDATES_TABLE}.uuid")),
-            Column("project_uuid", ForeignKey(f"{self._PROJECTS_TABLE}.uuid")),
+            self.metadata,
+            Column("status_update_uuid", ForeignKey(f"{self.STATUS_UPDATES_TABLE}.uuid"), primary_key=True),
+            Column("project_uuid", ForeignKey(f"{self.PROJECTS_TABLE}.uuid"), primary_key=True),
+            Index("ix_status_update_projects_association_project", "project_uuid", "status_update_uuid"),
         )
 
-        self._status_update_teams_association_table = Table(
+        self.status_update_teams_association_table = Table(
             "status_update_teams_association",
-            self._metadata_obj,
-            Column("status_update_uuid", ForeignKey(f"{self._STATUS_UPDATES_TABLE}.uuid")),
-            Column("team_uuid", ForeignKey(f"{self._TEAMS_TABLE}.uuid")),
+            self.metadata,
+            Column("status_update_uuid", ForeignKey(f"{self.STATUS_UPDATES_TABLE}.uuid"), primary_key=True),
+            Column("team_uuid", ForeignKey(f"{self.TEAMS_TABLE}.uuid"), primary_key=True),
+            Index("ix_status_update_teams_association_team", "team_uuid", "status_update_uuid"),
         )
 
-        self._slack_user_preferences_table = Table(
-            self._SLACK_USER_PREFERENCES_TABLE,
-            self._metadata_obj,
+        self.slack_user_preferences_table = Table(
+            self.SLACK_USER_PREFERENCES_TABLE,
+            self.metadata,
             Column("user_id", String(256), primary_key=True, nullable=False),
             Column("active_tab", String(256), nullable=True),
             Column("active_configuration_tab", String(256), nullable=True),
-            Column("active_team_filter__team_uuid", String(256), ForeignKey(f"{self._TEAMS_TABLE}.uuid"),
+            Column("active_team_filter__team_uuid", String(256), ForeignKey(f"{self.TEAMS_TABLE}.uuid"),
                    nullable=True),
             Column("active_department_filter__department_uuid", String(256),
-                   ForeignKey(f"{self._DEPARTMENTS_TABLE}.uuid"), nullable=True),
-            Column("active_project_filter__project_uuid", String(256), ForeignKey(f"{self._PROJECTS_TABLE}.uuid"),
+                   ForeignKey(f"{self.DEPARTMENTS_TABLE}.uuid"), nullable=True),
+            Column("active_project_filter__project_uuid", String(256), ForeignKey(f"{self.PROJECTS_TABLE}.uuid"),
                    nullable=True),
         )
 
-        self._status_update_images_table = Table(
-            self._STATUS_UPDATE_IMAGES_TABLE,
-            self._metadata_obj,
+        self.status_update_images_table = Table(
+            self.STATUS_UPDATE_IMAGES_TABLE,
+            self.metadata,
             Column("uuid", String(256), primary_key=True, nullable=False),
-            Column("status_update_uuid", String(256), ForeignKey(f"{self._STATUS_UPDATES_TABLE}.uuid"), nullable=False),
+            Column("status_update_uuid", String(256), ForeignKey(f"{self.STATUS_UPDATES_TABLE}.uuid"), nullable=False,
+                   index=True),
             Column("url", String(1024), nullable=False),
             Column("filename", String(1024), nullable=False),
             Column("title", String(1024), nullable=True),
             Column("description", String(1024), nullable=True),
         )
 
-        self._mapper_registry.map_imperatively(Company, self._companies_table)
-        self._mapper_registry.map_imperatively(Department, self._departments_table, properties={
+        # The latest draft of every author and source, so opening the status update dialog is a primary key lookup
+        self.slack_user_drafts_table = Table(
+            self.SLACK_USER_DRAFTS_TABLE,
+            self.metadata,
+            Column("company_uuid", String(256), ForeignKey(f"{self.COMPANIES_TABLE}.uuid"), primary_key=True),
+            Column("author_slack_user_id", String(256), primary_key=True),
+            Column("source", Enum(StatusUpdateSource), primary_key=True),
+            Column("status_update_uuid", String(256), ForeignKey(f"{self.STATUS_UPDATES_TABLE}.uuid"), nullable=False,
+                   index=True),
+            Column("created_at", DateTime, nullable=False),
+        )
+
+        self.registry.map_imperatively(Company, self.companies_table)
+        self.registry.map_imperatively(Department, self.departments_table, properties={
             "company": relationship(Company)
         })
-        self._mapper_registry.map_imperatively(Team, self._teams_table, properties={
+        self.registry.map_imperatively(Team, self.teams_table, properties={
             "department": relationship(Department),
-            "company": relationship(Company, secondary=self._departments_table)
+            "company": relationship(Company, secondary=self.departments_table)
         })
-        self._mapper_registry.map_imperatively(Project, self._projects_table, properties={
+        self.registry.map_imperatively(Project, self.projects_table, properties={
             "company": relationship(Company)
         })
-        self._mapper_registry.map_imperatively(StatusUpdateType, self._status_update_types_table, properties={
+        self.registry.map_imperatively(StatusUpdateType, self.status_update_types_table, properties={
             "company": relationship(Company)
         })
-        self._mapper_registry.map_imperatively(StatusUpdateReaction, self._status_update_reactions_table, properties={
+        self.registry.map_imperatively(StatusUpdateReaction, self.status_update_reactions_table, properties={
             "company": relationship(Company)
         })
 
-        self._mapper_registry.map_imperatively(
+        self.registry.map_imperatively(
             StatusUpdate,
-            self._status_update_table,
+            self.status_update_table,
             properties={
                 "company": relationship(Company),
                 "type": relationship(StatusUpdateType),
-                "projects": relationship(Project, secondary=self._status_update_projects_association_table,
-                                         order_by=self._projects_table.c.name),
-                "teams": relationship(Team, secondary=self._status_update_teams_association_table,
-                                      order_by=self._teams_table.c.name),
+                "projects": relationship(Project, secondary=self.status_update_projects_association_table,
+                                         order_by=self.projects_table.c.name),
+                "teams": relationship(Team, secondary=self.status_update_teams_association_table,
+                                      order_by=self.teams_table.c.name),
                 "images": relationship(StatusUpdateImage)
             }
         )
 
-        self._mapper_registry.map_imperatively(StatusUpdateImage, self._status_update_images_table, properties={
-            "company": relationship(Company, secondary=self._status_update_table)
+        self.registry.map_imperatively(StatusUpdateImage, self.status_update_images_table, properties={
+            "company": relationship(Company, secondary=self.status_update_table)
         })
 
-        self._mapper_registry.map_imperatively(
+        self.registry.map_imperatively(
             SlackUserPreferences,
-            self._slack_user_preferences_table,
+            self.slack_user_preferences_table,
             properties={
                 "active_team_filter": relationship(Team),
                 "active_department_filter": relationship(Department),
@@ -307,55 +479,474 @@ class SQLAlchemyDao(Dao, ABC):
             }
         )
 
+
+_schema: Optional[SQLAlchemySchema] = None
+_schema_lock = threading.Lock()
+
+
+def get_sqlalchemy_schema() -> SQLAlchemySchema:
+    global _schema
+    with _schema_lock:
+        if _schema is None:
+            _schema = SQLAlchemySchema()
+        return _schema
+
+
+def _memo_key(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_memo_key(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_memo_key(v) for v in value)
+    if isinstance(value, Mapping):
+        return frozenset((k, _memo_key(v)) for k, v in value.items())
+    return value
+
+
+def _memo_copy(result):
+    # Callers are free to mutate the lists they get back
+    if isinstance(result, list):
+        return list(result)
+    if isinstance(result, tuple):
+        return tuple(_memo_copy(r) for r in result)
+    return result
+
+
+_request_memo_hits = metrics.counter("dao.request_memo.hits")
+_request_memo_misses = metrics.counter("dao.request_memo.misses")
+
+
+def request_memoized(method):
+    """
+    Inside session_scope() the same read with the same arguments hits the database once. The memo lives as long as the
+    scope and is dropped by any write made through the DAO
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        memo = self._request_memo()
+        if memo is None:
+            return method(self, *args, **kwargs)
+        try:
+            key = (method.__name__, _memo_key(args), _memo_key(sorted(kwargs.items())))
+            hash(key)
+        except TypeError:
+            return method(self, *args, **kwargs)
+        if key in memo:
+            _request_memo_hits.inc()
+        else:
+            _request_memo_misses.inc()
+            memo[key] = method(self, *args, **kwargs)
+        return _memo_copy(memo[key])
+
+    return wrapper
+
+
+def copy_slack_user_preferences(preferences: SlackUserPreferences) -> SlackUserPreferences:
+    """
+    Copy of the preferences to be kept between requests (see WriteBehindCache), with their filters detached from the
+    Session of the request, so that other threads can read them
+    """
+    for obj in (preferences.active_team_filter, preferences.active_department_filter, preferences.active_project_filter):
+        _detach(obj)
+    return dataclasses.replace(preferences)
+
+
+def _detach(obj):
+    if obj is None:
+        return
+    state = inspect(obj)
+    if state.session is not None:
+        state.session.expunge(obj)
+    # Along with what it refers to, e.g. the department and the company of a team
+    for rel in state.mapper.relationships:
+        if rel.direction is MANYTOONE and rel.key not in state.unloaded:
+            _detach(getattr(obj, rel.key))
+
+
+class SQLAlchemyDao(Dao, ABC):
+    @abstractmethod
+    def _create_engine(self) -> Engine: ...
+
+    @abstractmethod
+    def _dialect_insert(self, table: Table) -> Insert:
+        """
+        INSERT statement of the database dialect, the one which supports ON CONFLICT
+        """
+
+    def __init__(self):
+        self._schema = get_sqlalchemy_schema()
         self._engine = self._create_engine()
-        self._metadata_obj.create_all(bind=self._engine, checkfirst=True)
-        self._session_maker = sessionmaker(bind=self._engine)
-        self._session = self._session_maker()
+        self._schema.metadata.create_all(bind=self._engine, checkfirst=True)
+        self.ensure_indexes()
+        # Sessions live no longer than a request, so objects handed out by the DAO keep their loaded state after commit
+        # instead of being expired and refreshed (or failing to refresh once their Session is gone)
+        self._session_maker = sessionmaker(bind=self._engine, expire_on_commit=False)
+        self._scoped_session = scoped_session(self._session_maker)
+        self._taxonomy_cache = TaxonomyCache(backend=get_cache_backend())
+        self._company_cache = ResolutionCache("company", backend=get_cache_backend())
+        self._feed_generations = Generations("feed", backend=get_cache_backend())
+        self._scope_state = threading.local()
+        event.listen(self._session_maker, "do_orm_execute", self._on_execute)
+        event.listen(self._session_maker, "after_flush", self._on_flush)
+
+    def ensure_indexes(self):
+        """
+        create_all() creates indexes and primary keys only along with new tables. This adds the ones an existing database
+        is missing
+        """
+        inspector = inspect(self._engine)
+        for table in self._schema.metadata.sorted_tables:
+            # Left behind by a build which failed half way, such an index is maintained on writes but never used
+            invalid_indexes = self._invalid_indexes(table)
+            for index_name in invalid_indexes:
+                logging.warning(f"Rebuilding invalid index {index_name} of {table.name}")
+                self._drop_index(table, index_name)
+            if not inspector.get_pk_constraint(table.name)["constrained_columns"] and table.primary_key.columns:
+                self._add_primary_key(table)
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)} - invalid_indexes
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    self._create_index(index)
+
+    def _invalid_indexes(self, table: Table) -> Set[str]:
+        return set()
+
+    def _drop_index(self, table: Table, index_name: str):
+        with self._engine.begin() as connection:
+            connection.execute(text(
+                f"DROP INDEX IF EXISTS {self._engine.dialect.identifier_preparer.quote(index_name)}"))
+
+    def _create_index(self, index: Index):
+        index.create(bind=self._engine, checkfirst=True)
+
+    def _add_primary_key(self, table: Table):
+        # Not every database can add a primary key to an existing table (SQLite can't), so at least index its columns
+        preparer = self._engine.dialect.identifier_preparer
+        columns = ", ".join(preparer.quote(column.name) for column in table.primary_key.columns)
+        with self._engine.begin() as connection:
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {preparer.quote(f'ix_{table.name}_pk')} "
+                f"ON {preparer.format_table(table)} ({columns})"
+            ))
+
+    def pool_status(self) -> Dict[str, int]:
+        pool = self._engine.pool
+        if not isinstance(pool, QueuePool):
+            # E.g. NullPool, which opens a connection per checkout
+            return dict()
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "waiting": metrics.gauge("db.pool.waiting").value,
+        }
+
+    def report_pool_status(self):
+        """
+        Sets the db.pool.* gauges from pool_status(), for MetricsLogger
+        """
+        for name, value in self.pool_status().items():
+            if name != "waiting":
+                metrics.gauge(f"db.pool.{name}").set(value)
 
     @contextmanager
-    def _get_session(self) -> Generator[Session, None, None]:
+    def session_scope(self) -> Generator[None, None, None]:
         """
-        with self._session_maker() as session:
+        Unit of work of a single request. All DAO calls made by the current thread inside this block share one Session,
+        which is closed and thrown away when the outermost scope exits. Outside any scope every thread keeps its own
+        long-living Session
+        """
+        depth = getattr(self._scope_state, "depth", 0)
+        self._scope_state.depth = depth + 1
+        if depth == 0:
+            self._scope_state.memo = dict()
+        try:
+            yield
+        finally:
+            self._scope_state.depth = depth
+            if depth == 0:
+                self._scope_state.memo = None
+                self._scoped_session.remove()
+
+    def _request_memo(self) -> Optional[dict]:
+        # Bound DAOs (see AsyncDao) don't open scopes of their own
+        scope_state = getattr(self, "_scope_state", None)
+        return getattr(scope_state, "memo", None)
+
+    def clear_request_memo(self):
+        memo = self._request_memo()
+        if memo:
+            memo.clear()
+
+    def _on_execute(self, orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            self.clear_request_memo()
+
+    def _on_flush(self, _session, _flush_context):
+        self.clear_request_memo()
+
+    @contextmanager
+    def _get_session(self) -> Generator[Session, None, None]:
+        session = self._scoped_session()
+        try:
             yield session
             session.commit()
-        """
-        yield self._session
-        self._session.commit()
+        except Exception:
+            session.rollback()
+            raise
 
-    def _get_obj(self, cls, uuid):
+    @contextmanager
+    def _detached_session(self) -> Generator[Session, None, None]:
+        # Cached objects are shared between threads, so they're loaded by a Session of their own and come out detached
+        with self._session_maker() as session:
+            yield session
+
+    def _get_obj(self, cls, uuid, load: LoadProfile = None):
         with self._get_session() as session:
-            return session.get(cls, uuid)
+            return session.get(cls, uuid, options=self._loader_options(cls, load))
+
+    @staticmethod
+    def _loader_options(cls, load: Optional[LoadProfile]) -> list:
+        strategies = {
+            Loading.LAZY: lazyload,
+            Loading.SELECTIN: selectinload,
+            Loading.JOINED: joinedload,
+        }
+        options = []
+        for path, loading in (load or {}).items():
+            option, current_cls = None, cls
+            keys = path.split(".")
+            for i, key in enumerate(keys):
+                attribute = getattr(current_cls, key)
+                strategy = strategies[loading] if i == len(keys) - 1 else defaultload
+                option = strategy(attribute) if option is None else getattr(option, strategy.__name__)(attribute)
+                current_cls = attribute.property.mapper.class_
+            options.append(option)
+        return options
 
     def _set_obj(self, obj):
         with self._get_session() as session:
             session.merge(obj, load=True)
 
+    def _upsert(self, session: Session, table: Table, values: Union[dict, List[dict]], where=None):
+        rows = values if isinstance(values, list) else [values]
+        statement = self._dialect_insert(table).values(rows)
+        primary_key = {column.key for column in table.primary_key.columns}
+        session.execute(statement.on_conflict_do_update(
+            index_elements=list(table.primary_key.columns),
+            set_={key: statement.excluded[key] for key in rows[0] if key not in primary_key},
+            where=where
+        ))
+
+    def insert_many(self, objs: Iterable):
+        """
+        Inserts new objects, their one-to-many children (e.g. status update images) and many-to-many associations (e.g.
+        status update teams) in one transaction with one multi-row INSERT per table. Unlike insert_* methods, it never
+        merges: objects must not exist yet, and the objects they refer to (e.g. the company) must already exist or be
+        inserted in the same call. Unpublished status updates move the draft pointers of their authors like
+        insert_status_update() does, which costs one more statement per draft
+        """
+        objs = list(objs)
+        rows: Dict[Table, List[dict]] = {table: [] for table in self._schema.metadata.sorted_tables}
+        for obj in objs:
+            self._collect_rows(obj, rows)
+        with self._get_session() as session:
+            for table, table_rows in rows.items():
+                if table_rows:
+                    session.execute(insert(table), table_rows)
+            for obj in objs:
+                if isinstance(obj, StatusUpdate) and not (obj.published or obj.deleted) and obj.author_slack_user_id:
+                    self._update_draft_pointer(session, obj)
+        for company_uuid in {self._taxonomy_company_uuid(obj) for obj in objs} - {None}:
+            self._taxonomy_cache.invalidate(company_uuid)
+        for company_uuid in {obj.company.uuid for obj in objs if isinstance(obj, StatusUpdate)}:
+            self._feed_generations.bump(company_uuid)
+
+    @staticmethod
+    def _taxonomy_company_uuid(obj) -> Optional[str]:
+        if isinstance(obj, Team):
+            return obj.department.company.uuid
+        if isinstance(obj, TAXONOMY_CLASSES):
+            return obj.company.uuid
+
+    def _collect_rows(self, obj, rows: Dict[Table, List[dict]]) -> dict:
+        mapper = inspect(type(obj))
+        row = {prop.columns[0].key: getattr(obj, prop.key, None) for prop in mapper.column_attrs}
+        rows.setdefault(mapper.local_table, []).append(row)
+
+        mapped_tables = {m.local_table for m in self._schema.registry.mappers}
+        unloaded = inspect(obj).unloaded
+        for rel in mapper.relationships:
+            if rel.key in unloaded:
+                continue
+            value = getattr(obj, rel.key)
+            if rel.secondary is not None:
+                # Association tables only, not the many-to-one shortcuts like Team.company (which go through departments)
+                if rel.secondary in mapped_tables:
+                    continue
+                for target in value or []:
+                    rows.setdefault(rel.secondary, []).append({
+                        **{secondary.key: getattr(obj, local.key) for local, secondary in rel.synchronize_pairs},
+                        **{secondary.key: getattr(target, remote.key)
+                           for remote, secondary in rel.secondary_synchronize_pairs},
+                    })
+            elif rel.direction is MANYTOONE:
+                for local, remote in rel.local_remote_pairs:
+                    row[local.key] = getattr(value, remote.key) if value is not None else None
+            elif rel.direction is ONETOMANY:
+                for child in value or []:
+                    self._collect_rows(child, rows).update(
+                        {remote.key: getattr(obj, local.key) for local, remote in rel.synchronize_pairs}
+                    )
+        return row
+
+    def soft_delete_many(self, cls: type, company_uuid: str, uuids: Iterable[str]):
+        uuids = list(uuids)
+        if not uuids:
+            return
+        table = inspect(cls).local_table
+        if cls is Team:
+            # Teams belong to a company through their department
+            in_company = table.c.department_uuid.in_(
+                select(self._schema.departments_table.c.uuid).where(self._schema.departments_table.c.company_uuid == company_uuid)
+            )
+        else:
+            in_company = table.c.company_uuid == company_uuid
+        with self._get_session() as session:
+            session.execute(update(table).where(table.c.uuid.in_(uuids), in_company).values(deleted=True))
+            if cls is StatusUpdate:
+                drafts = self._schema.slack_user_drafts_table
+                session.execute(drafts.delete().where(drafts.c.status_update_uuid.in_(uuids)))
+        if cls in TAXONOMY_CLASSES:
+            self._taxonomy_cache.invalidate(company_uuid)
+        if cls is StatusUpdate:
+            self._feed_generations.bump(company_uuid)
+
     def insert_status_update(self, status_update: StatusUpdate):
-        self._set_obj(status_update)
+        with self._get_session() as session:
+            session.merge(status_update, load=True)
+            self._update_draft_pointer(session, status_update)
+        self._feed_generations.bump(status_update.company.uuid)
+
+    def _update_draft_pointer(self, session: Session, status_update: StatusUpdate):
+        drafts = self._schema.slack_user_drafts_table
+        if status_update.published or status_update.deleted or not status_update.author_slack_user_id:
+            session.execute(drafts.delete().where(drafts.c.status_update_uuid == status_update.uuid))
+            return
+
+        # Only ever move the pointer forward: an older draft being saved again doesn't become the latest one
+        self._upsert(session, drafts, {
+            "company_uuid": status_update.company.uuid,
+            "author_slack_user_id": status_update.author_slack_user_id,
+            "source": status_update.source,
+            "status_update_uuid": status_update.uuid,
+            "created_at": status_update.created_at,
+        }, where=drafts.c.created_at <= status_update.created_at)
 
     def publish_status_update(self, company_uuid: str, uuid: str) -> bool:
-        status_update = self.read_status_update(company_uuid=company_uuid, uuid=uuid)
-        if status_update:
-            status_update.published = True
-            self._set_obj(status_update)
-            return True
-        else:
-            return False
+        return self.update_status_update(company_uuid, uuid, published=True)
+
+    def update_status_update(self, company_uuid: str, uuid: str, **values) -> bool:
+        table = self._schema.status_update_table
+        unknown_columns = set(values) - set(table.c.keys())
+        if unknown_columns:
+            raise ValueError(f"Unknown status update columns: {', '.join(sorted(unknown_columns))}")
+        with self._get_session() as session:
+            result = session.execute(update(table)
+                                     .where(table.c.uuid == uuid, table.c.company_uuid == company_uuid)
+                                     .values(**values))
+            if values.get("published") or values.get("deleted"):
+                drafts = self._schema.slack_user_drafts_table
+                session.execute(drafts.delete().where(drafts.c.status_update_uuid == uuid))
+            updated = result.rowcount > 0
+        if updated:
+            self._feed_generations.bump(company_uuid)
+        return updated
+
+    def replace_status_update_teams(self, company_uuid: str, uuid: str, team_uuids: Iterable[str]):
+        teams = self._schema.teams_table
+        self._replace_status_update_associations(
+            company_uuid, uuid, self._schema.status_update_teams_association_table.c.team_uuid,
+            select(teams.c.uuid).where(teams.c.uuid.in_(list(team_uuids)), teams.c.department_uuid.in_(
+                select(self._schema.departments_table.c.uuid)
+                .where(self._schema.departments_table.c.company_uuid == company_uuid)
+            ))
+        )
 
-    def read_status_update(self, company_uuid: str, uuid: str) -> Optional[StatusUpdate]:
-        status_update: StatusUpdate = self._get_obj(StatusUpdate, uuid)
+    def replace_status_update_projects(self, company_uuid: str, uuid: str, project_uuids: Iterable[str]):
+        projects = self._schema.projects_table
+        self._replace_status_update_associations(
+            company_uuid, uuid, self._schema.status_update_projects_association_table.c.project_uuid,
+            select(projects.c.uuid).where(projects.c.uuid.in_(list(project_uuids)),
+                                          projects.c.company_uuid == company_uuid)
+        )
+
+    def _replace_status_update_associations(self, company_uuid: str, uuid: str, target_column: Column, targets: Select):
+        association = target_column.table
+        status_updates = self._schema.status_update_table
+        in_company = exists().where(status_updates.c.uuid == uuid, status_updates.c.company_uuid == company_uuid)
+        with self._get_session() as session:
+            session.execute(association.delete().where(association.c.status_update_uuid == uuid, in_company))
+            # INSERT ... SELECT: only the targets of the same company, and only if the status update is one of it
+            targets = targets.add_columns(literal(uuid)).where(in_company)
+            session.execute(insert(association).from_select([target_column, association.c.status_update_uuid],
+                                                            targets))
+        self._feed_generations.bump(company_uuid)
+
+    def read_feed_generation(self, company_uuid: str) -> int:
+        return self._feed_generations.get(company_uuid) + self._taxonomy_cache.generation(company_uuid)
+
+    @request_memoized
+    def read_last_unpublished_status_update(self, company_uuid: str, author_slack_user_id: str,
+                                            no_older_than: timedelta = timedelta(days=2),
+                                            source: StatusUpdateSource = None) -> Optional[StatusUpdate]:
+        if source is not None:
+            drafts = self._schema.slack_user_drafts_table
+            with self._get_session() as session:
+                status_update = session.query(StatusUpdate)\
+                    .options(*self._loader_options(StatusUpdate, STATUS_UPDATE_FEED_LOAD_PROFILE))\
+                    .join(drafts, drafts.c.status_update_uuid == self._schema.status_update_table.c.uuid)\
+                    .filter(drafts.c.company_uuid == company_uuid,
+                            drafts.c.author_slack_user_id == author_slack_user_id,
+                            drafts.c.source == source,
+                            StatusUpdate.published == false(),
+                            StatusUpdate.deleted == false(),
+                            StatusUpdate.created_at >= datetime.utcnow() - no_older_than)\
+                    .first()
+            if status_update:
+                return status_update
+
+        # No pointer (e.g. the latest draft got published but an older one is still around): the author/source index
+        # finds it, and the pointer is set for the next time
+        status_update = super().read_last_unpublished_status_update(company_uuid, author_slack_user_id,
+                                                                    no_older_than=no_older_than, source=source)
+        if status_update and source is not None:
+            with self._get_session() as session:
+                self._update_draft_pointer(session, status_update)
+        return status_update
+
+    @request_memoized
+    def read_status_update(self, company_uuid: str, uuid: str,
+                           load: LoadProfile = STATUS_UPDATE_FEED_LOAD_PROFILE) -> Optional[StatusUpdate]:
+        status_update: StatusUpdate = self._get_obj(StatusUpdate, uuid, load=load)
         if status_update and status_update.company.uuid == company_uuid:
             return status_update
 
+    @request_memoized
     def read_status_updates(self, company_uuid: str, created_after: datetime = None, created_before: datetime = None,
                             from_teams: List[str] = None, from_departments: List[str] = None,
                             from_projects: List[str] = None, with_types: List[str] = None,
                             published: Optional[bool] = True, deleted: Optional[bool] = False,
-                            author_slack_user_id: str = None, last_n: int = None, source: StatusUpdateSource = None) \
-            -> List[StatusUpdate]:
+                            author_slack_user_id: str = None, last_n: int = None, source: StatusUpdateSource = None,
+                            older_than: StatusUpdateCursor = None,
+                            load: LoadProfile = STATUS_UPDATE_FEED_LOAD_PROFILE) -> List[StatusUpdate]:
+        status_updates = self._schema.status_update_table
+        teams_association = self._schema.status_update_teams_association_table
+        projects_association = self._schema.status_update_projects_association_table
+
         with self._get_session() as session:
-            result = session.query(StatusUpdate).join(Company)
-            result = result.filter(Company.uuid == company_uuid)
+            result = session.query(StatusUpdate).options(*self._loader_options(StatusUpdate, load))
+            result = result.filter(status_updates.c.company_uuid == company_uuid)
 
             if created_after:
                 result = result.filter(StatusUpdate.created_at >= created_after)
@@ -363,24 +954,28 @@ class SQLAlchemyDao(Dao, ABC):
             if created_before:
                 result = result.filter(StatusUpdate.created_at <= created_before)
 
+            # Semi-joins: an update matching several of the filter values still comes back once, so no DISTINCT needed
             if from_teams:
-                result = result.join(self._status_update_teams_association_table)
-                result = result.join(Team)
-                result = result.filter(or_(Team.uuid == team for team in from_teams))
+                result = result.filter(exists().where(
+                    teams_association.c.status_update_uuid == status_updates.c.uuid,
+                    teams_association.c.team_uuid.in_(from_teams)
+                ))
 
             if from_departments:
-                result = result.join(self._status_update_teams_association_table)
-                result = result.join(Team)
-                result = result.join(Department)
-                result = result.filter(or_(Department.uuid == department for department in from_departments))
+                result = result.filter(exists().where(
+                    teams_association.c.status_update_uuid == status_updates.c.uuid,
+                    teams_association.c.team_uuid == self._schema.teams_table.c.uuid,
+                    self._schema.teams_table.c.department_uuid.in_(from_departments)
+                ))
 
             if from_projects:
-                result = result.join(self._status_update_projects_association_table)
-                result = result.join(Project)
-                result = result.filter(or_(Project.uuid == project for project in from_projects))
+                result = result.filter(exists().where(
+                    projects_association.c.status_update_uuid == status_updates.c.uuid,
+                    projects_association.c.project_uuid.in_(from_projects)
+                ))
 
             if with_types:
-                result = result.filter(or_(StatusUpdate.type == type_ for type_ in with_types))
+                result = result.filter(status_updates.c.status_update_type_uuid.in_(with_types))
 
             if deleted is not None:
                 result = result.filter(StatusUpdate.deleted == (true() if deleted else false()))
@@ -394,68 +989,95 @@ class SQLAlchemyDao(Dao, ABC):
             if source is not None:
                 result = result.filter(StatusUpdate.source == source)
 
+            if older_than is not None:
+                result = result.filter(tuple_(StatusUpdate.created_at, StatusUpdate.uuid)
+                                       < tuple_(older_than.created_at, older_than.uuid))
+
             # noinspection PyTypeChecker
-            result = result.order_by(desc(StatusUpdate.created_at))
+            result = result.order_by(desc(StatusUpdate.created_at), desc(StatusUpdate.uuid))
 
             if last_n is not None:
                 result = result.limit(last_n)
 
-            return result.distinct().all()
+            return result.all()
 
     def delete_status_update(self, company_uuid: str, uuid: str):
-        with self._get_session() as session:
-            session.query(StatusUpdate).join(Company).filter(
-                and_(StatusUpdate.uuid == uuid, Company.uuid == company_uuid)).update(
-            {
-                StatusUpdate.deleted: True
-            }, synchronize_session=False)
+        self.soft_delete_many(StatusUpdate, company_uuid, [uuid])
 
     def delete_team_status_updates(self, company_uuid: str, team_uuid: str):
         with self._get_session() as session:
             session.query(StatusUpdate).join(Company).filter(Company.uuid == company_uuid).filter(
                 StatusUpdate.uuid.in_(
                     session.query(StatusUpdate.uuid)
-                        .join(self._status_update_teams_association_table).join(Team).filter(Team.uuid == team_uuid)
+                        .join(self._schema.status_update_teams_association_table).join(Team).filter(Team.uuid == team_uuid)
                 )
             ).update({
                 StatusUpdate.deleted: True
             }, synchronize_session=False)
+        self._feed_generations.bump(company_uuid)
 
     def insert_team(self, team: Team):
         self._set_obj(team)
+        self._taxonomy_cache.invalidate(team.department.company.uuid)
 
+    @request_memoized
     def read_team(self, company_uuid: str, uuid: str) -> Optional[Team]:
-        team: Team = self._get_obj(Team, uuid)
+        team: Team = self._get_obj(Team, uuid, load=TEAM_LOAD_PROFILE)
         if team and team.department.company.uuid == company_uuid:
             return team
 
-    def read_teams(self, company_uuid: str, team_name: str = None, department_uuid: str = None) -> List[Team]:
+    @request_memoized
+    def read_teams_by_uuids(self, company_uuid: str, uuids: Iterable[str]) -> List[Team]:
+        uuids = list(uuids)
+        if not uuids:
+            return []
         with self._get_session() as session:
-            result = session.query(Team).join(Department).join(Company)\
+            teams = session.query(Team).join(Department).join(Company)\
+                .options(contains_eager(Team.department).contains_eager(Department.company))\
+                .filter(Team.uuid.in_(uuids), Company.uuid == company_uuid)\
+                .all()
+        return self._in_order(teams, uuids)
+
+    @staticmethod
+    def _in_order(objs: list, uuids: List[str]) -> list:
+        by_uuid = {obj.uuid: obj for obj in objs}
+        return [by_uuid[uuid] for uuid in dict.fromkeys(uuids) if uuid in by_uuid]
+
+    def read_teams(self, company_uuid: str, team_name: str = None, department_uuid: str = None) -> List[Team]:
+        return [team for team in self._taxonomy_cache.get(company_uuid, "teams", lambda: self._load_teams(company_uuid))
+                if (team_name is None or team.name == team_name)
+                and (department_uuid is None or team.department.uuid == department_uuid)]
+
+    def _load_teams(self, company_uuid: str) -> List[Team]:
+        with self._detached_session() as session:
+            return session.query(Team).join(Department).join(Company)\
+                .options(contains_eager(Team.department).contains_eager(Department.company))\
                 .filter(Team.deleted == false())\
                 .filter(Department.deleted == false())\
                 .filter(Company.deleted == false())\
-                .filter(Company.uuid == company_uuid)
-            if team_name is not None:
-                result = result.filter(Team.name == team_name)
-            if department_uuid is not None:
-                result = result.filter(Department.uuid == department_uuid)
-            return result.distinct().all()
+                .filter(Company.uuid == company_uuid)\
+                .all()
 
     def delete_team(self, company_uuid: str, uuid: str):
-        with self._get_session() as session:
-            session.query(Team).filter(and_(Team.uuid == uuid, Team.uuid.in_(
-                session.query(Team.uuid).join(Department).join(Company).filter(Company.uuid == company_uuid)
-            ))).update({
-                Team.deleted: True
-            })
+        self.soft_delete_many(Team, company_uuid, [uuid])
 
     def insert_company(self, company: Company):
         self._set_obj(company)
+        self._company_cache.invalidate(company.slack_team_id)
 
+    @request_memoized
     def read_company(self, uuid: str) -> Optional[Company]:
         return self._get_obj(Company, uuid)
 
+    def read_company_by_slack_team_id(self, slack_team_id: str) -> Optional[Company]:
+        return self._company_cache.get(slack_team_id, lambda: self._load_company_by_slack_team_id(slack_team_id))
+
+    def _load_company_by_slack_team_id(self, slack_team_id: str) -> Optional[Company]:
+        with self._detached_session() as session:
+            return session.query(Company)\
+                .filter(Company.slack_team_id == slack_team_id, Company.deleted == false())\
+                .first()
+
     def read_companies(self, company_name: str = None, slack_team_id: str = None) -> List[Company]:
         with self._get_session() as session:
             result = session.query(Company).filter(Company.deleted == false())
@@ -467,94 +1089,147 @@ class SQLAlchemyDao(Dao, ABC):
 
     def insert_department(self, department: Department):
         self._set_obj(department)
+        self._taxonomy_cache.invalidate(department.company.uuid)
 
+    @request_memoized
     def read_department(self, company_uuid: str, uuid: str) -> Optional[Department]:
         department: Department = self._get_obj(Department, uuid)
         if department and department.company.uuid == company_uuid:
             return department
 
     def read_departments(self, company_uuid: str, department_name: str = None) -> List[Department]:
-        with self._get_session() as session:
-            result = session.query(Department).join(Company).filter(Department.deleted == false())\
-                .filter(Company.uuid == company_uuid)
-            if department_name is not None:
-                result = result.filter(Department.name == department_name)
-            return result.all()
+        return [department for department in self._taxonomy_cache.get(
+                    company_uuid, "departments", lambda: self._load_departments(company_uuid))
+                if department_name is None or department.name == department_name]
+
+    def _load_departments(self, company_uuid: str) -> List[Department]:
+        with self._detached_session() as session:
+            return session.query(Department).join(Company).options(contains_eager(Department.company))\
+                .filter(Department.deleted == false())\
+                .filter(Company.uuid == company_uuid)\
+                .all()
 
     def delete_department(self, company_uuid: str, uuid: str):
-        with self._get_session() as session:
-            session.query(Department).filter(and_(Department.uuid == uuid, Department.uuid.in_(
-                    session.query(Department.uuid).join(Company).filter(Company.uuid == company_uuid)
-                ))).update({
-                    Department.deleted: True
-                }, synchronize_session=False)
+        self.soft_delete_many(Department, company_uuid, [uuid])
 
     def insert_project(self, project: Project):
         self._set_obj(project)
+        self._taxonomy_cache.invalidate(project.company.uuid)
 
+    @request_memoized
     def read_project(self, company_uuid: str, uuid: str) -> Optional[Project]:
         project: Project = self._get_obj(Project, uuid)
         if project and project.company.uuid == company_uuid:
             return project
 
-    def read_projects(self, company_uuid: str, project_name: str = None) -> List[Project]:
+    @request_memoized
+    def read_projects_by_uuids(self, company_uuid: str, uuids: Iterable[str]) -> List[Project]:
+        uuids = list(uuids)
+        if not uuids:
+            return []
         with self._get_session() as session:
-            result = session.query(Project).join(Company).filter(and_(Project.deleted == false(),
-                                                                      Company.uuid == company_uuid))
-            if project_name is not None:
-                result = result.filter(Project.name == project_name)
-            return result.all()
+            projects = session.query(Project).join(Company).options(contains_eager(Project.company))\
+                .filter(Project.uuid.in_(uuids), Company.uuid == company_uuid)\
+                .all()
+        return self._in_order(projects, uuids)
+
+    def read_projects(self, company_uuid: str, project_name: str = None) -> List[Project]:
+        return [project for project in self._taxonomy_cache.get(
+                    company_uuid, "projects", lambda: self._load_projects(company_uuid))
+                if project_name is None or project.name == project_name]
+
+    def _load_projects(self, company_uuid: str) -> List[Project]:
+        with self._detached_session() as session:
+            return session.query(Project).join(Company).options(contains_eager(Project.company))\
+                .filter(and_(Project.deleted == false(), Company.uuid == company_uuid))\
+                .all()
 
     def delete_project(self, company_uuid: str, uuid: str):
-        with self._get_session() as session:
-            session.query(Project).filter(and_(Project.uuid == uuid, Project.uuid.in_(
-                session.query(Project.uuid).join(Company).filter(Company.uuid == company_uuid)
-            ))).update({
-                Project.deleted: True
-            }, synchronize_session=False)
+        self.soft_delete_many(Project, company_uuid, [uuid])
 
     def insert_status_update_type(self, status_update_type: StatusUpdateType):
         self._set_obj(status_update_type)
+        self._taxonomy_cache.invalidate(status_update_type.company.uuid)
 
+    @request_memoized
     def read_status_update_type(self, company_uuid: str, uuid: str) -> Optional[StatusUpdateType]:
         status_update_type: StatusUpdateType = self._get_obj(StatusUpdateType, uuid)
         if status_update_type and status_update_type.company.uuid == company_uuid:
             return status_update_type
 
     def read_status_update_types(self, company_uuid: str, name: str = None) -> List[StatusUpdateType]:
-        with self._get_session() as session:
-            result = session.query(StatusUpdateType).filter(StatusUpdateType.deleted == false())
-            result = result.join(Company).filter(Company.uuid == company_uuid)
-            if name:
-                result = result.filter(StatusUpdateType.name == name)
-            return result.all()
+        return [status_update_type for status_update_type in self._taxonomy_cache.get(
+                    company_uuid, "status_update_types", lambda: self._load_status_update_types(company_uuid))
+                if not name or status_update_type.name == name]
+
+    def _load_status_update_types(self, company_uuid: str) -> List[StatusUpdateType]:
+        with self._detached_session() as session:
+            return session.query(StatusUpdateType).join(Company).options(contains_eager(StatusUpdateType.company))\
+                .filter(StatusUpdateType.deleted == false())\
+                .filter(Company.uuid == company_uuid)\
+                .all()
 
     def delete_status_update_type(self, company_uuid: str, uuid: str):
-        with self._get_session() as session:
-            session.query(StatusUpdateType).filter(and_(StatusUpdateType.uuid == uuid, StatusUpdateType.uuid.in_(
-                session.query(StatusUpdateType.uuid).join(Company).filter(Company.uuid == company_uuid)
-            ))).update({
-                StatusUpdate.deleted: True
-            }, synchronize_session=False)
+        self.soft_delete_many(StatusUpdateType, company_uuid, [uuid])
 
 
     def read_slack_user_preferences(self, user_id: str) -> Optional[SlackUserPreferences]:
-        return self._get_obj(SlackUserPreferences, user_id)
+        # Detached, so callers can keep preferences between requests (see WriteBehindCache)
+        with self._detached_session() as session:
+            return session.get(SlackUserPreferences, user_id,
+                               options=self._loader_options(SlackUserPreferences, SLACK_USER_PREFERENCES_LOAD_PROFILE))
 
     def insert_slack_user_preferences(self, slack_user_preferences: SlackUserPreferences):
-        self._set_obj(slack_user_preferences)
+        self.insert_many_slack_user_preferences([slack_user_preferences])
+
+    def insert_many_slack_user_preferences(self, slack_user_preferences: Iterable[SlackUserPreferences]):
+        with self._get_session() as session:
+            rows = []
+            for preferences in slack_user_preferences:
+                # The upsert is the write: don't let the Session flush the same changes once more
+                if preferences in session:
+                    session.expunge(preferences)
+                rows.append(self._collect_rows(preferences, {}))
+            if rows:
+                self._upsert(session, self._schema.slack_user_preferences_table, rows)
 
     def insert_status_update_reaction(self, status_update_reaction: StatusUpdateReaction):
         self._set_obj(status_update_reaction)
+        self._taxonomy_cache.invalidate(status_update_reaction.company.uuid)
 
     def read_status_update_reactions(self, company_uuid: str) -> List[StatusUpdateReaction]:
-        with self._get_session() as session:
+        return list(self._taxonomy_cache.get(company_uuid, "status_update_reactions",
+                                             lambda: self._load_status_update_reactions(company_uuid)))
+
+    def _load_status_update_reactions(self, company_uuid: str) -> List[StatusUpdateReaction]:
+        with self._detached_session() as session:
             return session.query(StatusUpdateReaction).join(Company)\
+                .options(contains_eager(StatusUpdateReaction.company))\
                 .filter(and_(StatusUpdateReaction.deleted == false(),
                              Company.uuid == company_uuid)).all()
 
 
-class SQLiteDao(SQLAlchemyDao):
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool which reports how long a checkout takes (waiting for a free connection included, as well as opening a new
+    one) and how many threads are currently waiting for a connection
+    """
+
+    def _do_get(self):
+        waiting = metrics.gauge("db.pool.waiting")
+        waiting.inc()
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            metrics.counter("db.pool.checkout_errors").inc()
+            raise
+        finally:
+            waiting.dec()
+            metrics.timer("db.pool.checkout").observe(time.perf_counter() - start)
+
+
+class SQLiteFileMixin:
     _DB_FILENAME = "update_me.db"
     _DB_PYTEST_FILENAME = "pytest_update_me.db"
 
@@ -565,22 +1240,115 @@ class SQLiteDao(SQLAlchemyDao):
     @property
     def _db_file(self):
         filename = self._DB_FILENAME if "pytest" not in sys.modules else self._DB_PYTEST_FILENAME
-        return os.path.join(self._db_folder, filename)
+        return get_sqlite_db_file(default=os.path.join(self._db_folder, filename))
+
+
+class SQLiteDao(SQLiteFileMixin, SQLAlchemyDao):
+
+    def _dialect_insert(self, table: Table) -> Insert:
+        return sqlite.insert(table)
 
     def _create_engine(self) -> Engine:
         if not os.path.isdir(self._db_folder):
             os.mkdir(self._db_folder)
+        if get_sqlite_profile() == SQLiteProfile.PERFORMANCE:
+            return self._create_performance_engine()
         return create_engine(f"sqlite:///{self._db_file}", echo=False, poolclass=NullPool)
 
+    def _create_performance_engine(self) -> Engine:
+        # Connections are kept open and shared between Bolt worker threads. WAL lets readers go on while a writer
+        # commits, and with WAL synchronous=NORMAL is still safe against corruption (only the last commits may be lost
+        # on a power failure)
+        pool_config = get_db_pool_config()
+        tuning_config = get_sqlite_tuning_config()
+        engine = create_engine(
+            f"sqlite:///{self._db_file}",
+            echo=False,
+            poolclass=InstrumentedQueuePool,
+            pool_size=pool_config.size,
+            max_overflow=pool_config.max_overflow,
+            pool_timeout=pool_config.timeout,
+            connect_args={"check_same_thread": False},
+        )
+
+        @event.listens_for(engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, _connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute(f"PRAGMA busy_timeout = {int(tuning_config.busy_timeout)}")
+                cursor.execute("PRAGMA journal_mode = WAL")
+                cursor.execute("PRAGMA synchronous = NORMAL")
+                cursor.execute(f"PRAGMA mmap_size = {int(tuning_config.mmap_size)}")
+                cursor.execute(f"PRAGMA cache_size = {int(tuning_config.cache_size)}")
+                cursor.execute("PRAGMA temp_store = MEMORY")
+            finally:
+                cursor.close()
+
+        return engine
+
 
 class PostgresDao(SQLAlchemyDao):
     CONN_PYTEST_STRING = "postgresql://localhost:5432/shareit_test"
     CONN_STRING = "postgresql://localhost:5432/shareit_prod"
 
+    def _dialect_insert(self, table: Table) -> Insert:
+        return postgresql.insert(table)
+
     def _create_engine(self) -> Engine:
-        conn_string = self.CONN_STRING if "pytest" not in sys.modules else self.CONN_PYTEST_STRING
-        print(conn_string)
-        return create_engine(conn_string)
+        conn_string = get_postgres_conn_string(
+            default=self.CONN_STRING if "pytest" not in sys.modules else self.CONN_PYTEST_STRING)
+        pool_config = get_db_pool_config()
+        return create_engine(
+            conn_string,
+            poolclass=InstrumentedQueuePool,
+            pool_size=pool_config.size,
+            max_overflow=pool_config.max_overflow,
+            pool_timeout=pool_config.timeout,
+            pool_pre_ping=pool_config.pre_ping,
+            pool_recycle=pool_config.recycle,
+        )
+
+    def _create_index(self, index: Index):
+        # CONCURRENTLY doesn't block writes to the table while the index is being built, but can't run inside a
+        # transaction
+        preparer = self._engine.dialect.identifier_preparer
+        columns = ", ".join(preparer.quote(column.name) for column in index.columns)
+        with self._engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text(
+                f"CREATE {'UNIQUE ' if index.unique else ''}INDEX CONCURRENTLY IF NOT EXISTS "
+                f"{preparer.quote(index.name)} ON {preparer.format_table(index.table)} ({columns})"
+            ))
+
+    def _invalid_indexes(self, table: Table) -> Set[str]:
+        # A failed CREATE INDEX CONCURRENTLY leaves the index behind marked invalid, and IF NOT EXISTS then skips it
+        with self._engine.connect() as connection:
+            return set(connection.execute(text(
+                "SELECT index_class.relname FROM pg_index "
+                "JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid "
+                "WHERE pg_index.indrelid = to_regclass(:table_name) AND NOT pg_index.indisvalid"
+            ), {"table_name": self._engine.dialect.identifier_preparer.format_table(table)}).scalars())
+
+    def _drop_index(self, table: Table, index_name: str):
+        with self._engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text(
+                f"DROP INDEX CONCURRENTLY IF EXISTS {self._engine.dialect.identifier_preparer.quote(index_name)}"))
+
+    def _add_primary_key(self, table: Table):
+        preparer = self._engine.dialect.identifier_preparer
+        index_name = preparer.quote(f"{table.name}_pkey")
+        columns = ", ".join(preparer.quote(column.name) for column in table.primary_key.columns)
+        try:
+            with self._engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                connection.execute(text(
+                    f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+                    f"ON {preparer.format_table(table)} ({columns})"
+                ))
+                connection.execute(text(
+                    f"ALTER TABLE {preparer.format_table(table)} ADD PRIMARY KEY USING INDEX {index_name}"
+                ))
+        except DBAPIError as e:
+            # Most likely there are duplicated rows, which have to be cleaned up manually
+            logging.error(f"Can not add a primary key to {table.name}: {e}")
 
 
 if get_active_dao_type() == DaoType.POSTGRES:
@@ -592,43 +1360,33 @@ else:
 
 
 def create_initial_data(company: Company):
+    new_objs = []
+
+    departments = {department.name: department for department in dao.read_departments(company_uuid=company.uuid)}
+    existing_teams = {(team.department.uuid, team.name) for team in dao.read_teams(company_uuid=company.uuid)}
     for department_name, team_names in INITIAL_TEAM_NAMES.items():
-        departments = dao.read_departments(department_name)
-        if departments:
-            department = departments[0]
-        else:
+        department = departments.get(department_name)
+        if department is None:
             department = Department(name=department_name, company=company)
-            dao.insert_department(department)
+            new_objs.append(department)
 
         for team_name in team_names:
-            for team in dao.read_teams(team_name):
-                if team.department.uuid == department.uuid:
-                    break
-            else:
-                team = Team(team_name, department)
-                dao.insert_team(team)
-
-    existing_project_names = [p.name for p in dao.read_projects(company_uuid=company.uuid)]
+            if (department.uuid, team_name) not in existing_teams:
+                new_objs.append(Team(team_name, department))
+
+    existing_project_names = {p.name for p in dao.read_projects(company_uuid=company.uuid)}
     for project_name in set(INITIAL_PROJECT_NAMES):
         if project_name not in existing_project_names:
-            dao.insert_project(Project(project_name, company=company))
+            new_objs.append(Project(project_name, company=company))
 
-    existing_status_update_types = dao.read_status_update_types(company_uuid=company.uuid)
+    existing_status_update_type_names = {t.name for t in dao.read_status_update_types(company_uuid=company.uuid)}
     for name in INITIAL_STATUS_UPDATE_TYPES:
-        for status_update_type_ in existing_status_update_types:
-            if status_update_type_.name == name:
-                break
-        else:
-            new_status_update_type = StatusUpdateType(name=name, company=company)
-            dao.insert_status_update_type(new_status_update_type)
-            existing_status_update_types.append(new_status_update_type)
+        if name not in existing_status_update_type_names:
+            new_objs.append(StatusUpdateType(name=name, company=company))
 
-    existing_initial_reactions = dao.read_status_update_reactions(company_uuid=company.uuid)
+    existing_reactions = {(r.name, r.emoji) for r in dao.read_status_update_reactions(company_uuid=company.uuid)}
     for name, emoji in INITIAL_REACTIONS:
-        for existing_initial_reaction in existing_initial_reactions:
-            if existing_initial_reaction.name == name and existing_initial_reaction.emoji == emoji:
-                break
-        else:
-            new_status_update_reaction = StatusUpdateReaction(emoji, name, company=company)
-            dao.insert_status_update_reaction(new_status_update_reaction)
-            existing_initial_reactions.append(new_status_update_reaction)
+        if (name, emoji) not in existing_reactions:
+            new_objs.append(StatusUpdateReaction(emoji, name, company=company))
+
+    dao.insert_many(new_objs)
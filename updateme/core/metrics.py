@@ -0,0 +1,168 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, Generator, Iterable, Optional, Union
+
+
+class Counter:
+    def __init__(self):
+        self._lock = Lock()
+        self._value = 0
+
+    def inc(self, value: int = 1):
+        with self._lock:
+            self._value += value
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def snapshot(self) -> int:
+        return self._value
+
+
+class Gauge:
+    def __init__(self):
+        self._lock = Lock()
+        self._value = 0
+        self._max_value = 0
+
+    def set(self, value: int):
+        with self._lock:
+            self._value = value
+            self._max_value = max(self._max_value, value)
+
+    def inc(self, value: int = 1):
+        with self._lock:
+            self._value += value
+            self._max_value = max(self._max_value, self._value)
+
+    def dec(self, value: int = 1):
+        with self._lock:
+            self._value -= value
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    @property
+    def max_value(self) -> int:
+        return self._max_value
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"value": self._value, "max": self._max_value}
+
+
+class Timer:
+    def __init__(self):
+        self._lock = Lock()
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._count += 1
+            self._total += seconds
+            self._max = max(self._max, seconds)
+
+    @contextmanager
+    def time(self) -> Generator[None, None, None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def total(self) -> float:
+        return self._total
+
+    @property
+    def max(self) -> float:
+        return self._max
+
+    @property
+    def mean(self) -> float:
+        return self._total / self._count if self._count else 0.0
+
+    def snapshot(self) -> Dict[str, Union[int, float]]:
+        with self._lock:
+            return {"count": self._count, "total": self._total, "mean": self.mean, "max": self._max}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = Lock()
+        self._metrics: Dict[str, Union[Counter, Gauge, Timer]] = dict()
+
+    def _get_or_create(self, name: str, cls):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(name, cls())
+        if not isinstance(metric, cls):
+            raise TypeError(f"Metric {name} is a {type(metric).__name__}, not a {cls.__name__}")
+        return metric
+
+    def counter(self, name: str) -> Counter:
+        return self._get_or_create(name, Counter)
+
+    def gauge(self, name: str) -> Gauge:
+        return self._get_or_create(name, Gauge)
+
+    def timer(self, name: str) -> Timer:
+        return self._get_or_create(name, Timer)
+
+    def snapshot(self, prefix: str = "") -> Dict[str, Union[int, Dict[str, Union[int, float]]]]:
+        return {name: metric.snapshot() for name, metric in sorted(self._metrics.items()) if name.startswith(prefix)}
+
+
+class MetricsLogger:
+    """
+    Writes a snapshot of the registry to the log every interval seconds. Collectors run right before each snapshot to
+    set the gauges of state which can only be polled, e.g. the database connection pool
+    """
+
+    def __init__(self, registry: MetricsRegistry, interval: float, collectors: Iterable[Callable[[], None]] = ()):
+        self._registry = registry
+        self._interval = interval
+        self._collectors = list(collectors)
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+
+    def start(self):
+        if self._interval <= 0 or self._thread is not None:
+            return
+        self._thread = Thread(target=self._run, name="metrics-logger", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Logs the last snapshot, so the counts of a process are complete up to its exit
+        """
+        if self._thread is None or self._stopped.is_set():
+            return
+        self._stopped.set()
+        self.report()
+
+    def report(self):
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logging.error(f"Can not collect metrics: {e}")
+        logging.getLogger("updateme.metrics").info(f"metrics {json.dumps(self._registry.snapshot(), sort_keys=True)}")
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            self.report()
+
+
+metrics = MetricsRegistry()
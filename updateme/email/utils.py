@@ -1,4 +1,20 @@
-from markdown import markdown
+import hashlib
+from threading import Lock, local
+
+from cachetools import LRUCache
+from markdown import Markdown
+
+from updateme.core.metrics import metrics
+
+
+# Digests for many recipients convert the same status updates over and over again
+_HTML_CACHE: LRUCache = LRUCache(maxsize=4096)
+_HTML_CACHE_LOCK = Lock()
+_HTML_CACHE_HITS = metrics.counter("cache.slack_markdown_to_html.hits")
+_HTML_CACHE_MISSES = metrics.counter("cache.slack_markdown_to_html.misses")
+# Building a Markdown instance (extensions, processors) costs more than converting a status update. An instance is not
+# thread-safe, so every thread gets its own
+_markdown_engines = local()
 
 
 def html_special_chars(s: str) -> str:
@@ -43,8 +59,25 @@ def fix_slack_markdown_links(markdown_str: str):
     return "".join(result)
 
 
+def _markdown_engine() -> Markdown:
+    engine = getattr(_markdown_engines, "engine", None)
+    if engine is None:
+        engine = _markdown_engines.engine = Markdown()
+    return engine
+
+
 def slack_markdown_to_html(markdown_str) -> str:
-    html_str = markdown(fix_slack_markdown_links(markdown_str))
+    key = hashlib.blake2b(markdown_str.encode(), digest_size=16).digest()
+    with _HTML_CACHE_LOCK:
+        html_str = _HTML_CACHE.get(key)
+    if html_str is not None:
+        _HTML_CACHE_HITS.inc()
+        return html_str
+
+    _HTML_CACHE_MISSES.inc()
+    html_str = _markdown_engine().reset().convert(fix_slack_markdown_links(markdown_str))
     if html_str.startswith("<p>") and html_str.endswith("</p>"):
         html_str = html_str[3:-4]
+    with _HTML_CACHE_LOCK:
+        _HTML_CACHE[key] = html_str
     return html_str
@@ -1,28 +1,40 @@
+import atexit
 import logging
+import os
+import signal
 
-from typing import Optional
+from typing import Callable, Optional
 
-from cachetools import cached, TTLCache
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
+from slack_bolt.lazy_listener import ThreadLazyListenerRunner
 from slack_bolt.workflows.step import WorkflowStep
 from slack_sdk import WebClient
 from slack_sdk.models.metadata import Metadata
 
 from updateme.core import dao
-from updateme.core.config import slack_bot_token, slack_app_token, get_env, Env
+from updateme.core.cache import get_cache_backend
+from updateme.core.dao import StatusUpdateCursor
+from updateme.core.metrics import MetricsLogger, metrics
+from updateme.core.config import slack_bot_token, slack_app_token, get_env, Env, get_slack_user_directory_file, \
+    get_listener_executor_config, get_slack_api_dispatcher_config, get_metrics_log_interval
 from updateme.core.model import StatusUpdateSource, StatusUpdate, SlackUserInfo, Department, Team, Project, \
-    StatusUpdateType
+    StatusUpdateType, SlackUserPreferences
 from updateme.core.utils import generate_slack_message_url, \
     slack_channel_id_thread_ts_message_ts_from_status_update_link, encode_link_in_slack_message
+from updateme.slackbot.dispatcher import SlackApiDispatcher, ThrottledWebClient, throttled_client_middleware
+from updateme.slackbot.executor import BoundedListenerExecutor
+from updateme.slackbot.home_tab import HomeTabRefresher, home_view_hash
+from updateme.slackbot.listeners import ack_first, stage
 from updateme.slackbot.messages import status_update_preview_message, status_update_from_message
-from updateme.slackbot.utils import get_or_create_slack_user_preferences, get_or_create_company_by_event, \
-    get_or_create_company_by_body, es
+from updateme.slackbot.users import SlackUserDirectory
+from updateme.slackbot.utils import get_or_create_slack_user_preferences, save_slack_user_preferences, \
+    get_or_create_company_by_event, get_or_create_company_by_body, es, SLACK_USER_PREFERENCES_CACHE
 from updateme.slackbot.views import status_update_dialog_view, retrieve_status_update_from_view, \
     share_status_update_preview_view, STATUS_UPDATE_MODAL_STATUS_UPDATE_TYPE_ACTION_ID, \
     STATUS_UPDATE_MODAL_STATUS_UPDATE_TEAMS_ACTION_ID, \
     STATUS_UPDATE_MODAL_STATUS_UPDATE_PROJECTS_ACTION_ID, retrieve_private_metadata_from_view, \
-    home_page_my_updates_view, home_page_company_updates_view, retrieve_status_update_filters_from_view, \
+    home_page_my_updates_view, COMPANY_UPDATES_FEED_CACHE, retrieve_status_update_filters_from_view, \
     home_page_configuration_departments_view, home_page_configuration_teams_view, \
     home_page_configuration_add_new_department_view, home_page_configuration_delete_department_view, \
     home_page_configuration_add_new_team_view, home_page_configuration_delete_team_view, \
@@ -39,32 +51,93 @@ from updateme.slackbot.workflows.remider import reminder_wf_step_edit_handler, r
 
 logging.basicConfig(level=logging.DEBUG if get_env() == Env.DEV else logging.INFO,
                     format="%(asctime)s %(levelname)s %(module)s - %(thread)d - %(message)s")
-app = App(token=slack_bot_token())
+LISTENER_EXECUTOR_CONFIG = get_listener_executor_config()
+SLACK_API_DISPATCHER_CONFIG = get_slack_api_dispatcher_config()
+# Shared with the asyncio app, so that both count against the same rate limits
+SLACK_API_DISPATCHER = SlackApiDispatcher(max_concurrent_calls=SLACK_API_DISPATCHER_CONFIG.max_concurrent_calls)
+app = App(client=ThrottledWebClient(
+    token=slack_bot_token(), dispatcher=SLACK_API_DISPATCHER, max_retries=SLACK_API_DISPATCHER_CONFIG.max_retries
+), listener_executor=BoundedListenerExecutor(
+    "listener", max_workers=LISTENER_EXECUTOR_CONFIG.workers, max_queue_size=LISTENER_EXECUTOR_CONFIG.max_queue_size,
+    rejection_policy=LISTENER_EXECUTOR_CONFIG.rejection_policy))
+app.use(throttled_client_middleware(app.client))
+# Acks must not wait in line behind the work of earlier requests, so lazy listeners get an executor of their own
+app.listener_runner.lazy_listener_runner = ThreadLazyListenerRunner(logger=app.logger, executor=BoundedListenerExecutor(
+    "lazy_listener", max_workers=LISTENER_EXECUTOR_CONFIG.lazy_workers,
+    max_queue_size=LISTENER_EXECUTOR_CONFIG.max_queue_size,
+    rejection_policy=LISTENER_EXECUTOR_CONFIG.lazy_rejection_policy))
+
+HOME_PAGE_FEED_PAGE_SIZE = 20
+
+
+USER_DIRECTORY = SlackUserDirectory(
+    app.client,
+    get_slack_user_directory_file(
+        default=os.path.join(os.path.dirname(__file__), "..", "..", "db", "slack_users.json")),
+    backend=get_cache_backend()
+)
+
+
+def shutdown():
+    """
+    Saves what this process keeps in memory only: preferences not written back yet and the Slack user directory
+    """
+    try:
+        SLACK_USER_PREFERENCES_CACHE.flush()
+    except Exception as e:
+        logging.error(f"Can not write back Slack user preferences: {e}")
+    USER_DIRECTORY.shutdown()
+    METRICS_LOGGER.stop()
+
+
+def exit_on_sigterm(signum, _frame):
+    # Python's default action for SIGTERM (e.g. a container being stopped) skips atexit hooks
+    shutdown()
+    raise SystemExit(128 + signum)
+
+
+METRICS_LOGGER = MetricsLogger(metrics, get_metrics_log_interval(), collectors=[dao.report_pool_status])
+atexit.register(shutdown)
+HOME_TAB_REFRESHER = HomeTabRefresher()
 
 
-@cached(cache=TTLCache(maxsize=1024 * 20, ttl=60 * 60))
 def get_user_info(slack_user_id: str) -> Optional[SlackUserInfo]:
-    user = app.client.users_info(user=slack_user_id)
-    profile = user.data["user"]["profile"]
+    return USER_DIRECTORY.get(slack_user_id)
 
-    name = None
 
-    try:
-        name = profile["display_name"]
-    except (KeyError, TypeError):
-        try:
-            name = profile["real_name"]
-        except (KeyError, TypeError):
-            pass
+def refresh_home_tab(user_id: str, body: dict, render: Callable[[], dict]):
+    """
+    Renders and publishes the home tab of the user over the one the interaction came from (see HomeTabRefresher)
+    """
+    HOME_TAB_REFRESHER.refresh(app.client, user_id, render, home_view_hash(body))
 
-    if name is None:
-        return None
 
-    return SlackUserInfo(
-        name=name,
-        is_admin=user.data["user"]["is_admin"],
-        is_owner=user.data["user"]["is_owner"]
-    )
+def my_updates_home_view(company_uuid: str, user_id: str, is_admin: bool,
+                         older_than: StatusUpdateCursor = None) -> dict:
+    with stage("query"):
+        status_updates, older_updates_cursor = dao.read_status_updates_page(
+            company_uuid=company_uuid, author_slack_user_id=user_id, page_size=HOME_PAGE_FEED_PAGE_SIZE,
+            older_than=older_than)
+        status_update_reactions = dao.read_status_update_reactions(company_uuid)
+    with stage("render"):
+        return home_page_my_updates_view(
+            status_updates=status_updates,
+            status_update_reactions=status_update_reactions,
+            is_admin=is_admin,
+            current_user_slack_id=user_id,
+            older_updates_cursor=older_updates_cursor
+        )
+
+
+def company_updates_home_view(company_uuid: str, user_id: str, user_preferences: SlackUserPreferences,
+                              is_admin: bool, older_than: StatusUpdateCursor = None) -> dict:
+    # The feed cache queries only on a miss, so both count as rendering
+    with stage("render"):
+        return COMPANY_UPDATES_FEED_CACHE.view(
+            company_uuid, current_user_slack_id=user_id, is_admin=is_admin, page_size=HOME_PAGE_FEED_PAGE_SIZE,
+            team=user_preferences.active_team_filter, department=user_preferences.active_department_filter,
+            project=user_preferences.active_project_filter, older_than=older_than
+        )
 
 @app.action(STATUS_UPDATE_MODAL_STATUS_UPDATE_TYPE_ACTION_ID)
 def status_update_modal_status_type_action_handler(ack):
@@ -81,90 +154,55 @@ def status_update_modal_status_projects_action_handler(ack):
     ack()
 
 
-@app.event("app_home_opened")
+@ack_first(app.event("app_home_opened"))
 def home_page_open_handler(client: WebClient, event, logger):
     user_id = event["user"]
-    user_preferences = get_or_create_slack_user_preferences(user_id)
-    user_info = get_user_info(user_id)
-    is_admin = user_info and (user_info.is_admin or user_info.is_owner)
-    company = get_or_create_company_by_event(event)
+    with stage("resolve"):
+        user_preferences = get_or_create_slack_user_preferences(user_id)
+        user_info = get_user_info(user_id)
+        is_admin = user_info and (user_info.is_admin or user_info.is_owner)
+        company = get_or_create_company_by_event(event)
     if not company:
         # The "Message" tab is opened
         return
     company_uuid = company.uuid
 
-    kwargs = {}
-    if user_preferences.active_project_filter:
-        kwargs["from_projects"] = [user_preferences.active_project_filter.uuid]
-    if user_preferences.active_team_filter:
-        kwargs["from_teams"] = [user_preferences.active_team_filter.uuid]
-    if user_preferences.active_department_filter:
-        kwargs["from_departments"] = [user_preferences.active_department_filter.uuid]
-    status_updates = dao.read_status_updates(company_uuid=company_uuid, last_n=20, **kwargs)
-
-    if user_preferences.active_tab == "my_updates":
-        view = home_page_my_updates_view(
-            status_updates=dao.read_status_updates(company_uuid=company_uuid, author_slack_user_id=user_id, last_n=20),
-            status_update_reactions=dao.read_status_update_reactions(company_uuid),
-            is_admin=is_admin,
-            current_user_slack_id=user_id
-        )
-    elif user_preferences.active_tab == "company_updates":
-        view = home_page_company_updates_view(
-            status_updates=status_updates,
-            team=user_preferences.active_team_filter,
-            department=user_preferences.active_department_filter,
-            project=user_preferences.active_project_filter,
-            teams=dao.read_teams(company_uuid),
-            projects=dao.read_projects(company_uuid),
-            status_update_reactions=dao.read_status_update_reactions(company_uuid),
-            is_admin=is_admin,
-            current_user_slack_id=user_id
-        )
-    else:
-        view = home_page_configuration_departments_view(
-            departments=dao.read_departments(company_uuid=company_uuid)
-        )
+    def render():
+        if user_preferences.active_tab == "my_updates":
+            return my_updates_home_view(company_uuid, user_id, is_admin)
+        if user_preferences.active_tab == "company_updates":
+            return company_updates_home_view(company_uuid, user_id, user_preferences, is_admin)
+        with stage("render"):
+            return home_page_configuration_departments_view(
+                departments=dao.read_departments(company_uuid=company_uuid)
+            )
 
     try:
-        client.views_publish(
-            user_id=user_id,
-            view=view
-        )
+        HOME_TAB_REFRESHER.refresh(client, user_id, render, home_view_hash(event))
     except Exception as e:
         logger.error(f"Error publishing home tab: {e}")
 
 
-@app.action("home_page_my_updates_button_clicked")
-def home_page_my_updates_button_click_handler(ack, body, logger):
-    ack()
+@ack_first(app.action("home_page_my_updates_button_clicked"))
+def home_page_my_updates_button_click_handler(body, logger):
     logger.info(body)
     user_id = body["user"]["id"]
-    user_preferences = get_or_create_slack_user_preferences(user_id)
-    user_preferences.active_tab = "my_updates"
-    dao.insert_slack_user_preferences(user_preferences)
-    user_info = get_user_info(user_id)
-    is_admin = user_info and (user_info.is_admin or user_info.is_owner)
-    company_uuid = get_or_create_company_by_body(body).uuid
+    with stage("resolve"):
+        user_preferences = get_or_create_slack_user_preferences(user_id)
+        user_preferences.active_tab = "my_updates"
+        save_slack_user_preferences(user_preferences)
+        user_info = get_user_info(user_id)
+        is_admin = user_info and (user_info.is_admin or user_info.is_owner)
+        company_uuid = get_or_create_company_by_body(body).uuid
 
     try:
-        app.client.views_publish(
-            user_id=user_id,
-            view=home_page_my_updates_view(
-                status_updates=dao.read_status_updates(company_uuid=company_uuid, author_slack_user_id=user_id,
-                                                       last_n=20),
-                status_update_reactions=dao.read_status_update_reactions(company_uuid),
-                is_admin=is_admin,
-                current_user_slack_id=user_id
-            )
-        )
+        refresh_home_tab(user_id, body, lambda: my_updates_home_view(company_uuid, user_id, is_admin))
     except Exception as e:
         logger.error(f"Error publishing home tab: {e}")
 
 
-@app.shortcut("share_message_button_clicked_callback")
-def share_message_button_clicked_callback_handler(ack, body, logger):
-    ack()
+@ack_first(app.shortcut("share_message_button_clicked_callback"))
+def share_message_button_clicked_callback_handler(body, logger):
     logger.info(body)
     company = get_or_create_company_by_body(body)
     try:
@@ -194,9 +232,8 @@ def share_message_button_clicked_callback_handler(ack, body, logger):
     )
 
 
-@app.action("my_updates_status_message_menu_button_clicked")
-def my_updates_status_message_menu_button_clicked_handler(ack, body, logger):
-    ack()
+@ack_first(app.action("my_updates_status_message_menu_button_clicked"))
+def my_updates_status_message_menu_button_clicked_handler(body, logger):
     logger.info(body)
 
     selected_option_value = str(body["actions"][0]["selected_option"]["value"])
@@ -237,9 +274,8 @@ def my_updates_status_message_menu_button_clicked_handler(ack, body, logger):
         pass
 
 
-@app.view("home_page_my_updates_delete_status_update_dialog_submitted")
-def home_page_my_updates_delete_status_update_dialog_submitted_handler(ack, body, logger):
-    ack()
+@ack_first(app.view("home_page_my_updates_delete_status_update_dialog_submitted"))
+def home_page_my_updates_delete_status_update_dialog_submitted_handler(body, logger):
     logger.info(body)
 
     status_update_uuid = body["view"]["private_metadata"]
@@ -255,38 +291,19 @@ def home_page_my_updates_delete_status_update_dialog_submitted_handler(ack, body
     try:
         user_info = get_user_info(body["user"]["id"])
         is_admin = user_info and (user_info.is_admin or user_info.is_owner)
-
-        app.client.views_publish(
-            user_id=body["user"]["id"],
-            view=home_page_my_updates_view(
-                status_updates=dao.read_status_updates(company_uuid=company_uuid, author_slack_user_id=user_id,
-                                                       last_n=20),
-                status_update_reactions=dao.read_status_update_reactions(company_uuid),
-                is_admin=is_admin,
-                current_user_slack_id=user_id
-            )
-        )
+        refresh_home_tab(user_id, body, lambda: my_updates_home_view(company_uuid, user_id, is_admin))
     except Exception as e:
         logger.error(f"Error publishing home tab: {e}")
 
 
-@app.action("home_page_company_updates_button_clicked")
-def home_page_company_updates_button_click_handler(ack, body, logger):
-    ack()
+@ack_first(app.action("home_page_company_updates_button_clicked"))
+def home_page_company_updates_button_click_handler(body, logger):
     logger.info(body)
     user_id = body["user"]["id"]
-    user_preferences = get_or_create_slack_user_preferences(user_id)
-    user_info = get_user_info(user_id)
-    company_uuid = get_or_create_company_by_body(body).uuid
-
-    kwargs = {}
-    if user_preferences.active_project_filter:
-        kwargs["from_projects"] = [user_preferences.active_project_filter.uuid]
-    if user_preferences.active_team_filter:
-        kwargs["from_teams"] = [user_preferences.active_team_filter.uuid]
-    if user_preferences.active_department_filter:
-        kwargs["from_departments"] = [user_preferences.active_department_filter.uuid]
-    status_updates = dao.read_status_updates(company_uuid=company_uuid, last_n=20, **kwargs)
+    with stage("resolve"):
+        user_preferences = get_or_create_slack_user_preferences(user_id)
+        user_info = get_user_info(user_id)
+        company_uuid = get_or_create_company_by_body(body).uuid
 
     if user_preferences.active_tab == "company_updates":
         # Something is wrong in the home_page_status_update_filters function. Even if we pass Nulls
@@ -300,29 +317,18 @@ def home_page_company_updates_button_click_handler(ack, body, logger):
         pass
     else:
         user_preferences.active_tab = "company_updates"
-        dao.insert_slack_user_preferences(user_preferences)
+        save_slack_user_preferences(user_preferences)
 
     try:
-        app.client.views_publish(
-            user_id=user_id,
-            view=home_page_company_updates_view(
-                status_updates=status_updates,
-                team=user_preferences.active_team_filter,
-                department=user_preferences.active_department_filter,
-                project=user_preferences.active_project_filter,
-                teams=dao.read_teams(company_uuid),
-                projects=dao.read_projects(company_uuid),
-                status_update_reactions=dao.read_status_update_reactions(company_uuid),
-                is_admin=user_info is not None and (user_info.is_admin or user_info.is_owner),
-                current_user_slack_id=user_id
-            )
-        )
+        refresh_home_tab(user_id, body, lambda: company_updates_home_view(
+            company_uuid, user_id, user_preferences,
+            is_admin=user_info is not None and (user_info.is_admin or user_info.is_owner)
+        ))
     except Exception as e:
         logger.error(f"Error publishing home tab: {e}")
 
-@app.action("company_updates_status_message_menu_button_clicked")
-def company_updates_status_message_menu_button_clicked_handler(ack, body, logger):
-    ack()
+@ack_first(app.action("company_updates_status_message_menu_button_clicked"))
+def company_updates_status_message_menu_button_clicked_handler(body, logger):
     logger.info(body)
 
     selected_option_value = str(body["actions"][0]["selected_option"]["value"])
@@ -362,9 +368,8 @@ def company_updates_status_message_menu_button_clicked_handler(ack, body, logger
     else:
         pass
 
-@app.view("home_page_company_updates_delete_status_update_dialog_submitted")
-def home_page_company_updates_delete_status_update_dialog_submitted_handler(ack, body, logger):
-    ack()
+@ack_first(app.view("home_page_company_updates_delete_status_update_dialog_submitted"))
+def home_page_company_updates_delete_status_update_dialog_submitted_handler(body, logger):
     logger.info(body)
 
     status_update_uuid = body["view"]["private_metadata"]
@@ -379,47 +384,65 @@ def home_page_company_updates_delete_status_update_dialog_submitted_handler(ack,
     user_preferences = get_or_create_slack_user_preferences(user_id)
     user_info = get_user_info(user_id)
 
-    kwargs = {}
-    if user_preferences.active_project_filter:
-        kwargs["from_projects"] = [user_preferences.active_project_filter.uuid]
-    if user_preferences.active_team_filter:
-        kwargs["from_teams"] = [user_preferences.active_team_filter.uuid]
-    if user_preferences.active_department_filter:
-        kwargs["from_departments"] = [user_preferences.active_department_filter.uuid]
-    status_updates = dao.read_status_updates(company_uuid=company_uuid, last_n=20, **kwargs)
+    try:
+        refresh_home_tab(user_id, body, lambda: company_updates_home_view(
+            company_uuid, user_id, user_preferences,
+            is_admin=user_info is not None and (user_info.is_admin or user_info.is_owner)
+        ))
+    except Exception as e:
+        logger.error(f"Error publishing home tab: {e}")
+
+@ack_first(app.action("home_page_my_updates_load_older_clicked"))
+def home_page_my_updates_load_older_click_handler(body, logger):
+    logger.info(body)
+    user_id = body["user"]["id"]
+    with stage("resolve"):
+        user_info = get_user_info(user_id)
+        company_uuid = get_or_create_company_by_body(body).uuid
+    older_than = StatusUpdateCursor.from_str(body["actions"][0]["value"])
 
     try:
-        app.client.views_publish(
-            user_id=body["user"]["id"],
-            view=home_page_company_updates_view(
-                status_updates=status_updates,
-                team=user_preferences.active_team_filter,
-                department=user_preferences.active_department_filter,
-                project=user_preferences.active_project_filter,
-                teams=dao.read_teams(company_uuid),
-                projects=dao.read_projects(company_uuid),
-                status_update_reactions=dao.read_status_update_reactions(company_uuid),
-                is_admin=user_info is not None and (user_info.is_admin or user_info.is_owner),
-                current_user_slack_id=user_id
-            )
-        )
+        refresh_home_tab(user_id, body, lambda: my_updates_home_view(
+            company_uuid, user_id,
+            is_admin=user_info is not None and (user_info.is_admin or user_info.is_owner),
+            older_than=older_than
+        ))
     except Exception as e:
         logger.error(f"Error publishing home tab: {e}")
 
-@app.action("home_page_configuration_button_clicked")
-def home_page_configuration_button_clicked_handler(ack, body, logger):
-    ack()
+
+@ack_first(app.action("home_page_company_updates_load_older_clicked"))
+def home_page_company_updates_load_older_click_handler(body, logger):
+    logger.info(body)
+    user_id = body["user"]["id"]
+    user_preferences = get_or_create_slack_user_preferences(user_id)
+    user_info = get_user_info(user_id)
+    company_uuid = get_or_create_company_by_body(body).uuid
+
+    try:
+        older_than = StatusUpdateCursor.from_str(body["actions"][0]["value"])
+        refresh_home_tab(user_id, body, lambda: company_updates_home_view(
+            company_uuid, user_id, user_preferences,
+            is_admin=user_info is not None and (user_info.is_admin or user_info.is_owner),
+            older_than=older_than
+        ))
+    except Exception as e:
+        logger.error(f"Error publishing home tab: {e}")
+
+
+@ack_first(app.action("home_page_configuration_button_clicked"))
+def home_page_configuration_button_clicked_handler(body, logger):
     logger.info(body)
     user_id = body["user"]["id"]
     user_preferences = get_or_create_slack_user_preferences(user_id)
     user_preferences.active_tab = "configuration"
-    dao.insert_slack_user_preferences(user_preferences)
+    save_slack_user_preferences(user_preferences)
     company_uuid = get_or_create_company_by_body(body).uuid
 
     try:
-        app.client.views_publish(
-            user_id=user_id,
-            view=home_page_configuration_departments_view(
+        refresh_home_tab(
+            user_id, body,
+            lambda: home_page_configuration_departments_view(
                 departments=dao.read_departments(company_uuid=company_uuid)
             )
         )
@@ -427,20 +450,19 @@ def home_page_configuration_button_clicked_handler(ack, body, logger):
         logger.error(f"Error publishing home tab: {e}")
 
 
-@app.action("configuration_departments_button_clicked")
-def configuration_departments_button_clicked_handler(ack, body, logger):
-    ack()
+@ack_first(app.action("configuration_departments_button_clicked"))
+def configuration_departments_button_clicked_handler(body, logger):
     logger.info(body)
     user_id = body["user"]["id"]
     user_preferences = get_or_create_slack_user_preferences(user_id)
     user_preferences.active_configuration_tab = "departments"
-    dao.insert_slack_user_preferences(user_preferences)
+    save_slack_user_preferences(user_preferences)
     company_uuid = get_or_create_company_by_body(body).uuid
 
     try:
-        app.client.views_publish(
-            user_id=user_id,
-            view=home_page_configuration_departments_view(
+        refresh_home_tab(
+            user_id, body,
+            lambda: home_page_configuration_departments_view(
                 departments=dao.read_departments(company_uuid=company_uuid)
             )
         )
@@ -448,40 +470,38 @@ def configuration_departments_button_clicked_handler(ack, body, logger):
         logger.error(f"Error publishing home tab: {e}")
 
 
-@app.action("configuration_teams_button_clicked")
-def configuration_teams_button_clicked_handler(ack, body, logger):
-    ack()
+@ack_first(app.action("configuration_teams_button_clicked"))
+def configuration_teams_button_clicked_handler(body, logger):
     logger.info(body)
     user_id = body["user"]["id"]
     user_preferences = get_or_create_slack_user_preferences(user_id)
     user_preferences.active_configuration_tab = "teams"
-    dao.insert_slack_user_preferences(user_preferences)
+    save_slack_user_preferences(user_preferences)
     company_uuid = get_or_create_company_by_body(body).uuid
 
     try:
-        app.client.views_publish(
-            user_id=user_id,
-            view=home_page_configuration_teams_view(
+        refresh_home_tab(
+            user_id, body,
+            lambda: home_page_configuration_teams_view(
                 teams=dao.read_teams(company_uuid=company_uuid)
             )
         )
     except Exception as e:
         logger.error(f"Error publishing home tab: {e}")
 
-@app.action("configuration_projects_button_clicked")
-def home_page_configuration_projects_button_clicked_handler(ack, body, logger):
-    ack()
+@ack_first(app.action("configuration_projects_button_clicked"))
+def home_page_configuration_projects_button_clicked_handler(body, logger):
     logger.info(body)
     company_uuid = get_or_create_company_by_body(body).uuid
     user_id = body["user"]["id"]
     user_preferences = get_or_create_slack_user_preferences(user_id)
     user_preferences.active_configuration_tab = "projects"
-    dao.insert_slack_user_preferences(user_preferences)
+    save_slack_user_preferences(user_preferences)
 
     try:
-        app.client.views_publish(
-            user_id=user_id,
-            view=home_page_configuration_projects_view(
+        refresh_home_tab(
+            user_id, body,
+            lambda: home_page_configuration_projects_view(
                 projects=dao.read_projects(company_uuid=company_uuid)
             )
         )
@@ -489,20 +509,19 @@ def home_page_configuration_projects_button_clicked_handler(ack, body, logger):
         logger.error(f"Error publishing home tab: {e}")
 
 
-@app.action("configuration_status_types_button_clicked")
-def configuration_status_types_button_clicked_handler(ack, body, logger):
-    ack()
+@ack_first(app.action("configuration_status_types_button_clicked"))
+def configuration_status_types_button_clicked_handler(body, logger):
     logger.info(body)
     user_id = body["user"]["id"]
     user_preferences = get_or_create_slack_user_preferences(user_id)
     user_preferences.active_configuration_tab = "status_types"
-    dao.insert_slack_user_preferences(user_preferences)
+    save_slack_user_preferences(user_preferences)
     company_uuid = get_or_create_company_by_body(body).uuid
 
     try:
-        app.client.views_publish(
-            user_id=user_id,
-            view=home_page_configuration_status_types_view(
+        refresh_home_tab(
+            user_id, body,
+            lambda: home_page_configuration_status_types_view(
                 status_types=dao.read_status_update_types(company_uuid=company_uuid)
             )
         )
@@ -510,9 +529,8 @@ def configuration_status_types_button_clicked_handler(ack, body, logger):
         logger.error(f"Error publishing home tab: {e}")
 
 
-@app.action("configuration_add_new_department_clicked")
-def configuration_add_new_department_clicked_handler(ack, body, logger):
-    ack()
+@ack_first(app.action("configuration_add_new_department_clicked"))
+def configuration_add_new_department_clicked_handler(body, logger):
     logger.info(body)
     try:
         app.client.views_open(
@@ -523,9 +541,8 @@ def configuration_add_new_department_clicked_handler(ack, body, logger):
         logger.error(f"Error publishing home tab: {e}")
 
 
-@app.view("home_page_configuration_new_department_dialog_submitted")
-def home_page_configuration_new_department_dialog_submitted_handler(ack, body, logger):
-    ack()
+@ack_first(app.view("home_page_configuration_new_department_dialog_submitted"))
+def home_page_configuration_new_department_dialog_submitted_handler(body, logger):
     logger.info(body)
 
     department_name = str(body["view"]["state"]["values"]["home_page_configuration_new_department_dialog_input_block"][
@@ -538,7 +555,7 @@ def home_page_configuration_new_department_dialog_submitted_handler(ack, body, l
 
     department_uuid = body["view"]["private_metadata"]
     if department_uuid:
-        department = dao.read_department(department_uuid)
+        department = dao.read_department(company_uuid=company.uuid, uuid=department_uuid)
         if not department:
             logger.error(f"Can not find department {department_uuid}")
         else:
@@ -547,15 +564,16 @@ def home_page_configuration_new_department_dialog_submitted_handler(ack, body, l
                 logger.error("Department with such name already exist")
             else:
                 department.name = department_name
+                dao.insert_department(department)
     else:
         if not dao.read_departments(company_uuid=company.uuid, department_name=department_name) :
             dao.insert_department(Department(company=company, name=department_name))
 
     user_id = body["user"]["id"]
     try:
-        app.client.views_publish(
-            user_id=user_id,
-            view=home_page_configuration_departments_view(
+        refresh_home_tab(
+            user_id, body,
+            lambda: home_page_configuration_departments_view(
                 departments=dao.read_departments(company_uuid=company.uuid)
             )
         )
@@ -563,9 +581,8 @@ def home_page_configuration_new_department_dialog_submitted_handler(ack, body, l
         logger.error(f"Error publishing home tab: {e}")
 
 
-@app.action("configuration_department_menu_clicked")
-def configuration_department_menu_clicked_handler(ack, body, logger):
-    ack()
+@ack_first(app.action("configuration_department_menu_clicked"))
+def configuration_department_menu_clicked_handler(body, logger):
     logger.info(body)
     action = str(body['actions'][0]['selected_option']['value'])
     company_uuid = get_or_create_company_by_body(body).uuid
@@ -600,9 +617,8 @@ def configuration_department_menu_clicked_handler(ack, body, logger):
         pass
 
 
-@app.view("home_page_configuration_delete_dialog_submitted")
-def home_page_configuration_delete_dialog_submitted_handler(ack, body, logger):
-    ack()
+@ack_first(app.view("home_page_configuration_delete_dialog_submitted"))
+def home_page_configuration_delete_dialog_submitted_handler(body, logger):
     logger.info(body)
     department_uuid = body["view"]["private_metadata"]
     company_uuid = get_or_create_company_by_body(body).uuid
@@ -611,23 +627,22 @@ def home_page_configuration_delete_dialog_submitted_handler(ack, body, logger):
     if department is None:
         logger.error(f"Can not find department {department_uuid}")
     else:
-        for team in dao.read_teams(company_uuid=company_uuid, department_uuid=department.uuid):
-            dao.delete_team(company_uuid=company_uuid, uuid=team.uuid)
+        teams = dao.read_teams(company_uuid=company_uuid, department_uuid=department.uuid)
+        dao.soft_delete_many(Team, company_uuid=company_uuid, uuids=[team.uuid for team in teams])
         dao.delete_department(company_uuid=company_uuid, uuid=department.uuid)
 
     try:
-        app.client.views_publish(
-            user_id=body["user"]["id"],
-            view=home_page_configuration_departments_view(
+        refresh_home_tab(
+            body["user"]["id"], body,
+            lambda: home_page_configuration_departments_view(
                 departments=dao.read_departments(company_uuid=department.company.uuid)
             )
         )
     except Exception as e:
         logger.error(f"Error publishing home tab: {e}")
 
-@app.action("configuration_add_new_team_clicked")
-def configuration_add_new_team_clicked_handler(ack, body, logger):
-    ack()
+@ack_first(app.action("configuration_add_new_team_clicked"))
+def configuration_add_new_team_clicked_handler(body, logger):
     logger.info(body)
     company_uuid = get_or_create_company_by_body(body).uuid
 
@@ -642,9 +657,8 @@ def configuration_add_new_team_clicked_handler(ack, body, logger):
         logger.error(f"Error opening add new team dialog: {e}")
 
 
-@app.view("home_page_configuration_new_team_dialog_submitted")
-def home_page_configuration_new_team_dialog_submitted_handler(ack, body, logger):
-    ack()
+@ack_first(app.view("home_page_configuration_new_team_dialog_submitted"))
+def home_page_configuration_new_team_dialog_submitted_handler(body, logger):
     logger.info(body)
 
     company_uuid = get_or_create_company_by_body(body).uuid
@@ -666,6 +680,7 @@ def home_page_configuration_new_team_dialog_submitted_handler(ack, body, logger)
         if team:
             team.name = team_name
             team.department = department
+            dao.insert_team(team)
         else:
             team = dao.read_teams(company_uuid=company_uuid, team_name=team_name)
             if not team:
@@ -675,9 +690,9 @@ def home_page_configuration_new_team_dialog_submitted_handler(ack, body, logger)
                 ))
 
     try:
-        app.client.views_publish(
-            user_id=body["user"]["id"],
-            view=home_page_configuration_teams_view(
+        refresh_home_tab(
+            body["user"]["id"], body,
+            lambda: home_page_configuration_teams_view(
                 teams=dao.read_teams(company_uuid=company_uuid)
             )
         )
@@ -685,9 +700,8 @@ def home_page_configuration_new_team_dialog_submitted_handler(ack, body, logger)
         logger.error(f"Error publishing home tab: {e}")
 
 
-@app.action("configuration_team_menu_clicked")
-def configuration_team_menu_clicked_handler(ack, body, logger):
-    ack()
+@ack_first(app.action("configuration_team_menu_clicked"))
+def configuration_team_menu_clicked_handler(body, logger):
     logger.info(body)
 
     action = str(body["actions"][0]["selected_option"]["value"])
@@ -728,9 +742,8 @@ def configuration_team_menu_clicked_handler(ack, body, logger):
         pass
 
 
-@app.view("home_page_configuration_delete_team_dialog_submitted")
-def home_page_configuration_delete_team_dialog_submitted_handler(ack, body, logger):
-    ack()
+@ack_first(app.view("home_page_configuration_delete_team_dialog_submitted"))
+def home_page_configuration_delete_team_dialog_submitted_handler(body, logger):
     logger.info(body)
 
     team_uuid = body["view"]["private_metadata"]
@@ -743,9 +756,9 @@ def home_page_configuration_delete_team_dialog_submitted_handler(ack, body, logg
         dao.delete_team(company_uuid=company_uuid, uuid=team_uuid)
 
     try:
-        app.client.views_publish(
-            user_id=body["user"]["id"],
-            view=home_page_configuration_teams_view(
+        refresh_home_tab(
+            body["user"]["id"], body,
+            lambda: home_page_configuration_teams_view(
                 teams=dao.read_teams(company_uuid=company_uuid)
             )
         )
@@ -753,9 +766,8 @@ def home_page_configuration_delete_team_dialog_submitted_handler(ack, body, logg
         logger.error(f"Error publishing home tab: {e}")
 
 
-@app.action("home_page_select_team_filter_changed")
-def home_page_select_team_filter_change_handler(ack, body, logger):
-    ack()
+@ack_first(app.action("home_page_select_team_filter_changed"))
+def home_page_select_team_filter_change_handler(body, logger):
     logger.info(body)
 
     company_uuid = get_or_create_company_by_body(body).uuid
@@ -767,44 +779,24 @@ def home_page_select_team_filter_change_handler(ack, body, logger):
         user_preferences.active_team_filter = team
         user_preferences.active_department_filter = department
         user_preferences.active_project_filter = project
-        dao.insert_status_update(user_preferences)
+        save_slack_user_preferences(user_preferences)
         user_info = get_user_info(user_id)
 
-        kwargs = {}
-        if user_preferences.active_project_filter:
-            kwargs["from_projects"] = [user_preferences.active_project_filter.uuid]
-        if user_preferences.active_team_filter:
-            kwargs["from_teams"] = [user_preferences.active_team_filter.uuid]
-        if user_preferences.active_department_filter:
-            kwargs["from_departments"] = [user_preferences.active_department_filter.uuid]
-        status_updates = dao.read_status_updates(company_uuid=company_uuid, last_n=20, **kwargs)
-
-        app.client.views_publish(
-            user_id=user_id,
-            view=home_page_company_updates_view(
-                status_updates=status_updates,
-                team=user_preferences.active_team_filter,
-                department=user_preferences.active_department_filter,
-                project=user_preferences.active_project_filter,
-                teams=dao.read_teams(company_uuid),
-                projects=dao.read_projects(company_uuid),
-                status_update_reactions=dao.read_status_update_reactions(company_uuid),
-                is_admin=user_info is not None and (user_info.is_admin or user_info.is_owner),
-                current_user_slack_id=user_id
-            )
-        )
+        refresh_home_tab(user_id, body, lambda: company_updates_home_view(
+            company_uuid, user_id, user_preferences,
+            is_admin=user_info is not None and (user_info.is_admin or user_info.is_owner)
+        ))
     except Exception as e:
         logger.error(f"Error publishing home tab: {e}")
 
 
-@app.action("home_page_select_project_filter_changed")
-def home_page_select_team_project_change_handler(ack, body, logger):
-    home_page_select_team_filter_change_handler(ack, body, logger)
+@ack_first(app.action("home_page_select_project_filter_changed"))
+def home_page_select_team_project_change_handler(body, logger):
+    home_page_select_team_filter_change_handler(body, logger)
 
 
-@app.action("configuration_project_menu_clicked")
-def configuration_project_menu_clicked_handler(ack, body, logger):
-    ack()
+@ack_first(app.action("configuration_project_menu_clicked"))
+def configuration_project_menu_clicked_handler(body, logger):
     logger.info(body)
 
     action = str(body["actions"][0]["selected_option"]["value"])
@@ -843,9 +835,8 @@ def configuration_project_menu_clicked_handler(ack, body, logger):
         pass
 
 
-@app.action("configuration_add_new_project_clicked")
-def configuration_add_new_project_clicked_handler(ack, body, logger):
-    ack()
+@ack_first(app.action("configuration_add_new_project_clicked"))
+def configuration_add_new_project_clicked_handler(body, logger):
     logger.info(body)
     try:
         app.client.views_open(
@@ -856,9 +847,8 @@ def configuration_add_new_project_clicked_handler(ack, body, logger):
         logger.error(f"Error publishing home tab: {e}")
 
 
-@app.view("home_page_configuration_new_project_dialog_submitted")
-def home_page_configuration_new_project_dialog_submitted_handler(ack, body, logger):
-    ack()
+@ack_first(app.view("home_page_configuration_new_project_dialog_submitted"))
+def home_page_configuration_new_project_dialog_submitted_handler(body, logger):
     logger.info(body)
 
     project_name = str(body["view"]["state"]["values"]["home_page_configuration_new_project_dialog_input_block"][
@@ -881,15 +871,16 @@ def home_page_configuration_new_project_dialog_submitted_handler(ack, body, logg
             else:
                 project.name = project_name
                 project.deleted = False
+                dao.insert_project(project)
     else:
         if not dao.read_projects(company_uuid=company.uuid, project_name=project_name) :
-            dao.insert_department(Project(company=company, name=project_name))
+            dao.insert_project(Project(company=company, name=project_name))
 
     user_id = body["user"]["id"]
     try:
-        app.client.views_publish(
-            user_id=user_id,
-            view=home_page_configuration_projects_view(
+        refresh_home_tab(
+            user_id, body,
+            lambda: home_page_configuration_projects_view(
                 projects=dao.read_projects(company_uuid=company.uuid)
             )
         )
@@ -897,9 +888,8 @@ def home_page_configuration_new_project_dialog_submitted_handler(ack, body, logg
         logger.error(f"Error publishing home tab: {e}")
 
 
-@app.view("home_page_configuration_delete_project_dialog_submitted")
-def home_page_configuration_delete_project_dialog_submitted_handler(ack, body, logger):
-    ack()
+@ack_first(app.view("home_page_configuration_delete_project_dialog_submitted"))
+def home_page_configuration_delete_project_dialog_submitted_handler(body, logger):
     logger.info(body)
     company_uuid = get_or_create_company_by_body(body).uuid
 
@@ -911,9 +901,9 @@ def home_page_configuration_delete_project_dialog_submitted_handler(ack, body, l
         dao.delete_project(company_uuid=company_uuid, uuid=project_uuid)
 
     try:
-        app.client.views_publish(
-            user_id=body["user"]["id"],
-            view=home_page_configuration_projects_view(
+        refresh_home_tab(
+            body["user"]["id"], body,
+            lambda: home_page_configuration_projects_view(
                 projects=dao.read_projects(company_uuid=company_uuid)
             )
         )
@@ -921,9 +911,8 @@ def home_page_configuration_delete_project_dialog_submitted_handler(ack, body, l
         logger.error(f"Error publishing home tab: {e}")
 
 
-@app.action("configuration_add_new_status_type_clicked")
-def configuration_add_new_status_type_clicked_handler(ack, body, logger):
-    ack()
+@ack_first(app.action("configuration_add_new_status_type_clicked"))
+def configuration_add_new_status_type_clicked_handler(body, logger):
     logger.info(body)
     try:
         app.client.views_open(
@@ -934,9 +923,8 @@ def configuration_add_new_status_type_clicked_handler(ack, body, logger):
         logger.error(f"Error publishing home tab: {e}")
 
 
-@app.action("configuration_status_type_menu_clicked")
-def configuration_status_type_menu_clicked_handler(ack, body, logger):
-    ack()
+@ack_first(app.action("configuration_status_type_menu_clicked"))
+def configuration_status_type_menu_clicked_handler(body, logger):
     logger.info(body)
 
     action = str(body["actions"][0]["selected_option"]["value"])
@@ -975,9 +963,8 @@ def configuration_status_type_menu_clicked_handler(ack, body, logger):
         pass
 
 
-@app.view("home_page_configuration_new_status_update_type_dialog_submitted")
-def home_page_configuration_new_status_update_type_dialog_submitted_handler(ack, body, logger):
-    ack()
+@ack_first(app.view("home_page_configuration_new_status_update_type_dialog_submitted"))
+def home_page_configuration_new_status_update_type_dialog_submitted_handler(body, logger):
     logger.info(body)
 
     status_update_type_name = str(body["view"]["state"]["values"][
@@ -987,10 +974,9 @@ def home_page_configuration_new_status_update_type_dialog_submitted_handler(ack,
     if not status_update_type_name:
         raise ValueError("Status update type name is empty")
 
-    try:
-        company = dao.read_companies(slack_team_id=body["team"]["id"])[0]
-    except IndexError:
-        raise IndexError(f"Can not find a company with id = {body['team']['id']}") from None
+    company = dao.read_company_by_slack_team_id(body["team"]["id"])
+    if company is None:
+        raise IndexError(f"Can not find a company with id = {body['team']['id']}")
 
     status_update_type_uuid = body["view"]["private_metadata"]
     if status_update_type_uuid:
@@ -1004,15 +990,16 @@ def home_page_configuration_new_status_update_type_dialog_submitted_handler(ack,
             else:
                 status_update_type.name = status_update_type_name
                 status_update_type.deleted = False
+                dao.insert_status_update_type(status_update_type)
     else:
         if not dao.read_status_update_types(company_uuid=company.uuid, name=status_update_type_name) :
             dao.insert_status_update_type(StatusUpdateType(company=company, name=status_update_type_name))
 
     user_id = body["user"]["id"]
     try:
-        app.client.views_publish(
-            user_id=user_id,
-            view=home_page_configuration_status_types_view(
+        refresh_home_tab(
+            user_id, body,
+            lambda: home_page_configuration_status_types_view(
                 status_types=dao.read_status_update_types(company_uuid=company.uuid)
             )
         )
@@ -1020,9 +1007,8 @@ def home_page_configuration_new_status_update_type_dialog_submitted_handler(ack,
         logger.error(f"Error publishing home tab: {e}")
 
 
-@app.view("home_page_configuration_delete_status_update_type_dialog_submitted")
-def home_page_configuration_delete_status_update_type_dialog_submitted_handler(ack, body, logger):
-    ack()
+@ack_first(app.view("home_page_configuration_delete_status_update_type_dialog_submitted"))
+def home_page_configuration_delete_status_update_type_dialog_submitted_handler(body, logger):
     logger.info(body)
     company_uuid = get_or_create_company_by_body(body).uuid
 
@@ -1034,9 +1020,9 @@ def home_page_configuration_delete_status_update_type_dialog_submitted_handler(a
         dao.delete_status_update_type(uuid=status_update_type_uuid, company_uuid=company_uuid)
 
     try:
-        app.client.views_publish(
-            user_id=body["user"]["id"],
-            view=home_page_configuration_status_types_view(
+        refresh_home_tab(
+            body["user"]["id"], body,
+            lambda: home_page_configuration_status_types_view(
                 status_types=dao.read_status_update_types(company_uuid=company_uuid)
             )
         )
@@ -1044,9 +1030,8 @@ def home_page_configuration_delete_status_update_type_dialog_submitted_handler(a
         logger.error(f"Error publishing home tab: {e}")
 
 
-@app.action("share_status_update_button_clicked")
-def share_status_update_button_click_handler(ack, body, logger):
-    ack()
+@ack_first(app.action("share_status_update_button_clicked"))
+def share_status_update_button_click_handler(body, logger):
     company_uuid = get_or_create_company_by_body(body).uuid
 
     try:
@@ -1067,13 +1052,13 @@ def share_status_update_button_click_handler(ack, body, logger):
         logger.error(f"Error publishing home tab: {e}")
 
 
-@app.view("status_update_preview_button_clicked")
-def status_update_preview_button_click_handler(ack, body, logger):
-    ack()
-    status_update = retrieve_status_update_from_view(body)
-    company = get_or_create_company_by_body(body)
-    existing_status_update = dao.read_status_update(company_uuid=company.uuid, uuid=status_update.uuid)
-    user_info = get_user_info(status_update.author_slack_user_id)
+@ack_first(app.view("status_update_preview_button_clicked"))
+def status_update_preview_button_click_handler(body, logger):
+    with stage("resolve"):
+        status_update = retrieve_status_update_from_view(body)
+        company = get_or_create_company_by_body(body)
+        existing_status_update = dao.read_status_update(company_uuid=company.uuid, uuid=status_update.uuid)
+        user_info = get_user_info(status_update.author_slack_user_id)
     show_preview = True
 
     if user_info:
@@ -1091,37 +1076,23 @@ def status_update_preview_button_click_handler(ack, body, logger):
 
     if show_preview:
         try:
-            app.client.views_open(
-                trigger_id=body["trigger_id"],
-                view=share_status_update_preview_view(update=status_update),
-            )
+            view = share_status_update_preview_view(update=status_update)
+            with stage("publish"):
+                app.client.views_open(trigger_id=body["trigger_id"], view=view)
         except Exception as e:
             logger.error(f"Error publishing home tab: {e}")
     else:
         try:
             user_info = get_user_info(body["user"]["id"])
             is_admin = user_info and (user_info.is_admin or user_info.is_owner)
-
-            app.client.views_publish(
-                user_id=body["user"]["id"],
-                view=home_page_my_updates_view(
-                    status_updates=dao.read_status_updates(
-                        company_uuid=company.uuid,
-                        author_slack_user_id=status_update.author_slack_user_id,
-                        last_n=20
-                    ),
-                    status_update_reactions=dao.read_status_update_reactions(company.uuid),
-                    is_admin=is_admin,
-                    current_user_slack_id=status_update.author_slack_user_id
-                )
-            )
+            refresh_home_tab(body["user"]["id"], body, lambda: my_updates_home_view(
+                company.uuid, status_update.author_slack_user_id, is_admin))
         except Exception as e:
             logger.error(f"Error publishing home tab: {e}")
 
 
-@app.action("status_update_preview_back_to_editing_clicked")
-def status_update_preview_back_to_editing_click_handler(ack, body, logger):
-    ack()
+@ack_first(app.action("status_update_preview_back_to_editing_clicked"))
+def status_update_preview_back_to_editing_click_handler(body, logger):
     company_uuid = get_or_create_company_by_body(body).uuid
     status_update = dao.read_status_update(
         company_uuid=company_uuid,
@@ -1143,9 +1114,8 @@ def status_update_preview_back_to_editing_click_handler(ack, body, logger):
         logger.error(f"Error publishing home tab: {e}")
 
 
-@app.view("status_update_preview_share_button_clicked")
-def status_update_preview_share_button_click_handler(ack, body, logger):
-    ack()
+@ack_first(app.view("status_update_preview_share_button_clicked"))
+def status_update_preview_share_button_click_handler(body, logger):
     company = get_or_create_company_by_body(body)
     status_update_uuid = retrieve_private_metadata_from_view(body).status_update_uuid
     dao.publish_status_update(
@@ -1169,7 +1139,7 @@ def status_update_preview_share_button_click_handler(ack, body, logger):
         )
 
 
-@app.event("message")
+@ack_first(app.event("message"))
 def message_event_handler(body, logger):
     company = get_or_create_company_by_body(body)
     status_update = status_update_from_message(body)
@@ -1202,34 +1172,38 @@ def message_event_handler(body, logger):
     logger.info(body)
 
 
-@app.action("status_update_message_preview_team_selected")
-def status_update_message_preview_team_select_handler(ack, body, logger):
-    ack()
+@ack_first(app.action("status_update_message_preview_team_selected"))
+def status_update_message_preview_team_select_handler(body, logger):
     logger.info(body)
     status_update_uuid = body["message"]["metadata"]["event_payload"]["status_update_uuid"]
     company = get_or_create_company_by_body(body)
 
-    status_update = dao.read_status_update(company_uuid=company.uuid, uuid=status_update_uuid)
-    if status_update is None:
-        status_update = StatusUpdate(
-            source=StatusUpdateSource.SLACK_MESSAGE,
-            text=body["message"]["text"],
-            published=False,
-            company=company
-        )
-    status_update.teams = [dao.read_team(company_uuid=company.uuid, uuid=team["value"])
-                           for team in body["state"]["values"][
+    team_uuids = [team["value"] for team in body["state"]["values"][
         "status_update_preview_teams_list"]["status_update_message_preview_team_selected"]["selected_options"]]
-    status_update.projects = [dao.read_project(company_uuid=company.uuid, uuid=project["value"])
-                              for project in body["state"]["values"][
+    project_uuids = [project["value"] for project in body["state"]["values"][
         "status_update_preview_projects_list"]["status_update_message_preview_project_selected"]["selected_options"]]
     try:
         status_update_type_uuid = body["state"]["values"]["status_update_preview_status_update_type"][
             "status_update_message_preview_status_update_type_selected"]["selected_option"]["value"]
-        status_update.type = dao.read_status_update_type(company_uuid=company.uuid, uuid=status_update_type_uuid)
     except TypeError:
-        status_update.type = None
-    dao.insert_status_update(status_update)
+        status_update_type_uuid = None
+
+    if dao.update_status_update(company.uuid, status_update_uuid, status_update_type_uuid=status_update_type_uuid):
+        dao.replace_status_update_teams(company.uuid, status_update_uuid, team_uuids)
+        dao.replace_status_update_projects(company.uuid, status_update_uuid, project_uuids)
+        status_update = dao.read_status_update(company_uuid=company.uuid, uuid=status_update_uuid)
+    else:
+        status_update = StatusUpdate(
+            source=StatusUpdateSource.SLACK_MESSAGE,
+            text=body["message"]["text"],
+            published=False,
+            company=company,
+            teams=dao.read_teams_by_uuids(company.uuid, team_uuids),
+            projects=dao.read_projects_by_uuids(company.uuid, project_uuids),
+            type=dao.read_status_update_type(company_uuid=company.uuid, uuid=status_update_type_uuid)
+            if status_update_type_uuid else None
+        )
+        dao.insert_status_update(status_update)
 
     prefix = ""
     if status_update.projects:
@@ -1250,40 +1224,35 @@ def status_update_message_preview_team_select_handler(ack, body, logger):
     )
 
 
-@app.action("status_update_message_preview_project_selected")
-def status_update_message_preview_project_select_handler(ack, body, logger):
-    status_update_message_preview_team_select_handler(ack, body, logger)
+@ack_first(app.action("status_update_message_preview_project_selected"))
+def status_update_message_preview_project_select_handler(body, logger):
+    status_update_message_preview_team_select_handler(body, logger)
 
 
-@app.action("status_update_message_preview_status_update_type_selected")
-def status_update_message_preview_status_update_type_select_handler(ack, body, logger):
-    status_update_message_preview_team_select_handler(ack, body, logger)
+@ack_first(app.action("status_update_message_preview_status_update_type_selected"))
+def status_update_message_preview_status_update_type_select_handler(body, logger):
+    status_update_message_preview_team_select_handler(body, logger)
 
 
-@app.action("status_update_message_preview_publish_button_clicked")
-def status_update_message_preview_publish_button_click_handler(ack, body, logger):
+@ack_first(app.action("status_update_message_preview_publish_button_clicked"))
+def status_update_message_preview_publish_button_click_handler(body, logger):
     company = get_or_create_company_by_body(body)
     status_update_uuid = body["message"]["metadata"]["event_payload"]["status_update_uuid"]
-    status_update = dao.read_status_update(company_uuid=company.uuid, uuid=status_update_uuid)
-    status_update.published = True
     try:
         link = body["state"]["values"]["status_update_preview_link"][
             "status_update_message_preview_link_updated"]["value"]
     except (KeyError, TypeError):
         link = None
-    status_update.link = link
-    dao.insert_status_update(status_update)
-    status_update_message_preview_team_select_handler(ack, body, logger)
+    dao.update_status_update(company.uuid, status_update_uuid, published=True, link=link)
+    status_update_message_preview_team_select_handler(body, logger)
 
 
-@app.action("status_update_message_preview_cancel_button_clicked")
-def status_update_message_preview_cancel_button_click_handler(ack, body, logger):
+@ack_first(app.action("status_update_message_preview_cancel_button_clicked"))
+def status_update_message_preview_cancel_button_click_handler(body, logger):
     company = get_or_create_company_by_body(body)
     status_update_uuid = body["message"]["metadata"]["event_payload"]["status_update_uuid"]
-    status_update = dao.read_status_update(company_uuid=company.uuid, uuid=status_update_uuid)
-    status_update.deleted = True
-    dao.insert_status_update(status_update)
-    status_update_message_preview_team_select_handler(ack, body, logger)
+    dao.update_status_update(company.uuid, status_update_uuid, deleted=True)
+    status_update_message_preview_team_select_handler(body, logger)
 
 
 app.step(WorkflowStep(
@@ -1309,5 +1278,11 @@ app.step(WorkflowStep(
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
+    USER_DIRECTORY.warm_in_background()
+    METRICS_LOGGER.start()
+    signal.signal(signal.SIGTERM, exit_on_sigterm)
     handler = SocketModeHandler(app, slack_app_token())
-    handler.start()
+    try:
+        handler.start()
+    finally:
+        handler.close()
@@ -0,0 +1,605 @@
+"""
+asyncio entry point of the bot: python -m updateme.slackbot.async_app
+
+The home tab, the status update preview and the message preview flows run as coroutines: Slack Web API calls and DB
+queries (through AsyncDao) are awaited, and independent ones run concurrently. The configuration screens and the
+workflow steps are rarely used, so the handlers of the sync app are reused for them on a bounded thread pool
+"""
+import asyncio
+import functools
+import itertools
+import logging
+import signal
+from typing import Callable, Optional, Tuple
+
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.workflows.step.async_step import AsyncWorkflowStep
+from slack_sdk.errors import SlackApiError
+from slack_sdk.models.metadata import Metadata
+from slack_sdk.web.async_client import AsyncWebClient
+
+import updateme.slackbot.__main__ as sync_bot
+from updateme.core.async_dao import get_async_dao
+from updateme.core.config import slack_bot_token, slack_app_token, get_listener_executor_config
+from updateme.core.dao import StatusUpdateCursor
+from updateme.core.model import Company, SlackUserPreferences, StatusUpdate, StatusUpdateSource, Team, Department, \
+    Project
+from updateme.core.utils import slack_channel_id_thread_ts_message_ts_from_status_update_link, \
+    encode_link_in_slack_message
+from updateme.slackbot.dispatcher import SlackApiDispatcher, channel_of_call, retry_after_of
+from updateme.slackbot.executor import BoundedListenerExecutor
+from updateme.slackbot.home_tab import home_view_hash
+from updateme.slackbot.listeners import async_ack_first, async_ack_immediately, stage
+from updateme.slackbot.messages import status_update_preview_message, status_update_from_message
+from updateme.slackbot.utils import get_or_create_slack_user_preferences, save_slack_user_preferences, \
+    get_or_create_company_by_body, get_or_create_company_by_event
+from updateme.slackbot.views import home_page_my_updates_view, home_page_configuration_departments_view, \
+    share_status_update_preview_view, retrieve_status_update_from_view, retrieve_private_metadata_from_view, \
+    COMPANY_UPDATES_FEED_CACHE, STATUS_UPDATE_MODAL_STATUS_UPDATE_TYPE_ACTION_ID, \
+    STATUS_UPDATE_MODAL_STATUS_UPDATE_TEAMS_ACTION_ID, STATUS_UPDATE_MODAL_STATUS_UPDATE_PROJECTS_ACTION_ID
+from updateme.slackbot.workflows.email import email_updates_wf_step_edit_handler, email_updates_wf_step_save_handler, \
+    email_updates_wf_step_execute_handler
+from updateme.slackbot.workflows.publish import publish_updates_wf_step_edit_handler, \
+    publish_updates_wf_step_save_handler, publish_updates_wf_step_execute_handler
+from updateme.slackbot.workflows.remider import reminder_wf_step_edit_handler, reminder_wf_step_save_handler, \
+    reminder_wf_step_execute_handler
+
+HOME_PAGE_FEED_PAGE_SIZE = sync_bot.HOME_PAGE_FEED_PAGE_SIZE
+
+# Listener arguments AsyncApp passes as coroutine functions, and sync handlers call as plain functions
+_AWAITABLE_ARGS = {"ack", "say", "respond", "configure", "update", "complete", "fail"}
+
+
+class AsyncThrottledWebClient(AsyncWebClient):
+    """
+    ThrottledWebClient for the asyncio app
+    """
+
+    def __init__(self, *args, dispatcher: SlackApiDispatcher, max_retries: int = 3, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dispatcher = dispatcher
+        self.max_retries = max_retries
+
+    def __deepcopy__(self, memo):
+        # See ThrottledWebClient.__deepcopy__()
+        return self
+
+    async def api_call(self, api_method: str, **kwargs):
+        for attempt in itertools.count():
+            ticket = await self.dispatcher.async_acquire(self.token, api_method, channel_of_call(kwargs))
+            try:
+                return await super().api_call(api_method, **kwargs)
+            except SlackApiError as e:
+                retry_after = retry_after_of(e)
+                if retry_after is None:
+                    raise
+                self.dispatcher.rate_limited(ticket, retry_after)
+                if attempt >= self.max_retries:
+                    raise
+            finally:
+                self.dispatcher.release(ticket)
+
+
+def async_throttled_client_middleware(client: AsyncThrottledWebClient) -> Callable:
+    """
+    throttled_client_middleware() for the asyncio app
+    """
+    async def middleware(context, next_):
+        context["client"] = client
+        return await next_()
+
+    return middleware
+
+
+async_app = AsyncApp(client=AsyncThrottledWebClient(
+    token=slack_bot_token(), dispatcher=sync_bot.SLACK_API_DISPATCHER,
+    max_retries=sync_bot.SLACK_API_DISPATCHER_CONFIG.max_retries
+))
+async_app.use(async_throttled_client_middleware(async_app.client))
+async_dao = get_async_dao()
+_executor_config = get_listener_executor_config()
+# Runs the blocking parts: handlers of the sync app, and the few calls that have no async counterpart
+THREAD_EXECUTOR = BoundedListenerExecutor(
+    "async_app_threads", max_workers=_executor_config.lazy_workers, max_queue_size=_executor_config.max_queue_size,
+    rejection_policy=_executor_config.rejection_policy)
+
+
+async def in_thread(fn: Callable, *args, **kwargs):
+    future = THREAD_EXECUTOR.submit(fn, *args, **kwargs)
+    if future.cancelled():
+        raise RuntimeError("The thread executor of the asyncio app is full")
+    return await asyncio.wrap_future(future)
+
+
+def bridged(listener: Callable) -> Callable:
+    """
+    Runs a listener of the sync app on THREAD_EXECUTOR. Its awaitable arguments (ack, configure and the like) are
+    handed over as blocking functions, which run on the event loop
+    """
+    @functools.wraps(listener)
+    async def bridge(**kwargs):
+        loop = asyncio.get_running_loop()
+        for name, value in kwargs.items():
+            if name in _AWAITABLE_ARGS:
+                kwargs[name] = _blocking(value, loop)
+        if "client" in kwargs:
+            kwargs["client"] = sync_bot.app.client
+        await in_thread(listener, **kwargs)
+
+    return bridge
+
+
+def _blocking(fn: Callable, loop: asyncio.AbstractEventLoop) -> Callable:
+    def call(*args, **kwargs):
+        return asyncio.run_coroutine_threadsafe(fn(*args, **kwargs), loop).result()
+
+    return call
+
+
+async def get_company_by_body(body) -> Company:
+    try:
+        slack_team_id = body["team"]["id"]
+    except KeyError:
+        slack_team_id = body["team_id"]
+    company = await async_dao.read_company_by_slack_team_id(slack_team_id)
+    # Companies are created once per workspace, under the lock of the sync app
+    return company or await in_thread(get_or_create_company_by_body, body)
+
+
+async def get_company_by_event(event) -> Optional[Company]:
+    try:
+        company = await async_dao.read_company_by_slack_team_id(event["view"]["team_id"])
+    except KeyError:
+        return None
+    return company or await in_thread(get_or_create_company_by_event, event)
+
+
+async def get_slack_user_preferences(user_id: str) -> SlackUserPreferences:
+    # In memory, unless the user hasn't been seen for a while
+    return await in_thread(get_or_create_slack_user_preferences, user_id)
+
+
+async def is_admin_user(user_id: str) -> bool:
+    user_info = await in_thread(sync_bot.get_user_info, user_id)
+    return user_info is not None and (user_info.is_admin or user_info.is_owner)
+
+
+async def my_updates_home_view(company_uuid: str, user_id: str, is_admin: bool,
+                               older_than: StatusUpdateCursor = None) -> dict:
+    with stage("query"):
+        (status_updates, older_updates_cursor), status_update_reactions = await asyncio.gather(
+            async_dao.read_status_updates_page(company_uuid=company_uuid, author_slack_user_id=user_id,
+                                               page_size=HOME_PAGE_FEED_PAGE_SIZE, older_than=older_than),
+            async_dao.read_status_update_reactions(company_uuid)
+        )
+    with stage("render"):
+        return home_page_my_updates_view(
+            status_updates=status_updates,
+            status_update_reactions=status_update_reactions,
+            is_admin=is_admin,
+            current_user_slack_id=user_id,
+            older_updates_cursor=older_updates_cursor
+        )
+
+
+async def company_updates_home_view(company_uuid: str, user_id: str, user_preferences: SlackUserPreferences,
+                                    is_admin: bool, older_than: StatusUpdateCursor = None) -> dict:
+    with stage("render"):
+        return await COMPANY_UPDATES_FEED_CACHE.async_view(
+            async_dao, company_uuid, current_user_slack_id=user_id, is_admin=is_admin,
+            page_size=HOME_PAGE_FEED_PAGE_SIZE, team=user_preferences.active_team_filter,
+            department=user_preferences.active_department_filter, project=user_preferences.active_project_filter,
+            older_than=older_than
+        )
+
+
+async def publish_home_view(client: AsyncWebClient, user_id: str, payload: dict, render: Callable, logger):
+    """
+    Renders (render is a coroutine function) and publishes the home tab, coalesced with the other refreshes of the user
+    """
+    try:
+        await sync_bot.HOME_TAB_REFRESHER.async_refresh(client, user_id, render, home_view_hash(payload))
+    except Exception as e:
+        logger.error(f"Error publishing home tab: {e}")
+
+
+async def retrieve_status_update_filters(company_uuid: str, body) -> \
+        Tuple[Optional[Team], Optional[Department], Optional[Project]]:
+    values = body["view"]["state"]["values"]["status_updates_filter_block"]
+    try:
+        team_or_department_id = values["home_page_select_team_filter_changed"]["selected_option"]["value"]
+    except KeyError:
+        team_or_department_id = None
+    try:
+        project_id = values["home_page_select_project_filter_changed"]["selected_option"]["value"]
+    except KeyError:
+        project_id = None
+
+    # A team filter value is either a team or a whole department
+    teams, department, projects = await asyncio.gather(
+        async_dao.read_teams_by_uuids(company_uuid, [team_or_department_id] if team_or_department_id else []),
+        async_dao.read_department(company_uuid, team_or_department_id) if team_or_department_id else _none(),
+        async_dao.read_projects_by_uuids(company_uuid, [project_id] if project_id else [])
+    )
+    team = next(iter(teams), None)
+    return team, department if team is None else None, next(iter(projects), None)
+
+
+async def _none():
+    return None
+
+
+async def status_update_preview_message_blocks(company_uuid: str, status_update: StatusUpdate) -> list:
+    status_update_types, teams, projects = await asyncio.gather(
+        async_dao.read_status_update_types(company_uuid),
+        async_dao.read_teams(company_uuid),
+        async_dao.read_projects(company_uuid)
+    )
+    return status_update_preview_message(status_update=status_update, status_update_types=status_update_types,
+                                         teams=teams, projects=projects)
+
+
+def status_update_preview_message_text(status_update: StatusUpdate) -> str:
+    prefix = ""
+    if status_update.projects:
+        prefix = ", ".join(project.name for project in status_update.projects) + ": "
+    elif status_update.teams:
+        prefix = ", ".join(team.name for team in status_update.teams) + ": "
+    return prefix + status_update.text
+
+
+@async_app.action(STATUS_UPDATE_MODAL_STATUS_UPDATE_TYPE_ACTION_ID)
+@async_app.action(STATUS_UPDATE_MODAL_STATUS_UPDATE_TEAMS_ACTION_ID)
+@async_app.action(STATUS_UPDATE_MODAL_STATUS_UPDATE_PROJECTS_ACTION_ID)
+async def status_update_modal_action_handler(ack):
+    await ack()
+
+
+@async_ack_first(async_app.event("app_home_opened"))
+async def home_page_open_handler(client: AsyncWebClient, event, logger):
+    user_id = event["user"]
+    with stage("resolve"):
+        user_preferences, is_admin, company = await asyncio.gather(
+            get_slack_user_preferences(user_id), is_admin_user(user_id), get_company_by_event(event))
+    if not company:
+        # The "Message" tab is opened
+        return
+
+    async def render():
+        if user_preferences.active_tab == "my_updates":
+            return await my_updates_home_view(company.uuid, user_id, is_admin)
+        if user_preferences.active_tab == "company_updates":
+            return await company_updates_home_view(company.uuid, user_id, user_preferences, is_admin)
+        with stage("render"):
+            return home_page_configuration_departments_view(
+                departments=await async_dao.read_departments(company_uuid=company.uuid)
+            )
+
+    await publish_home_view(client, user_id, event, render, logger)
+
+
+@async_ack_first(async_app.action("home_page_my_updates_button_clicked"))
+async def home_page_my_updates_button_click_handler(client: AsyncWebClient, body, logger):
+    logger.info(body)
+    user_id = body["user"]["id"]
+    with stage("resolve"):
+        user_preferences, is_admin, company = await asyncio.gather(
+            get_slack_user_preferences(user_id), is_admin_user(user_id), get_company_by_body(body))
+    user_preferences.active_tab = "my_updates"
+    save_slack_user_preferences(user_preferences)
+
+    await publish_home_view(
+        client, user_id, body, lambda: my_updates_home_view(company.uuid, user_id, is_admin), logger)
+
+
+@async_ack_first(async_app.action("home_page_company_updates_button_clicked"))
+async def home_page_company_updates_button_click_handler(client: AsyncWebClient, body, logger):
+    logger.info(body)
+    user_id = body["user"]["id"]
+    with stage("resolve"):
+        user_preferences, is_admin, company = await asyncio.gather(
+            get_slack_user_preferences(user_id), is_admin_user(user_id), get_company_by_body(body))
+    if user_preferences.active_tab != "company_updates":
+        user_preferences.active_tab = "company_updates"
+        save_slack_user_preferences(user_preferences)
+
+    await publish_home_view(
+        client, user_id, body, lambda: company_updates_home_view(company.uuid, user_id, user_preferences, is_admin),
+        logger)
+
+
+@async_ack_first(async_app.action("home_page_my_updates_load_older_clicked"))
+async def home_page_my_updates_load_older_click_handler(client: AsyncWebClient, body, logger):
+    logger.info(body)
+    user_id = body["user"]["id"]
+    with stage("resolve"):
+        is_admin, company = await asyncio.gather(is_admin_user(user_id), get_company_by_body(body))
+
+    older_than = StatusUpdateCursor.from_str(body["actions"][0]["value"])
+    await publish_home_view(
+        client, user_id, body, lambda: my_updates_home_view(company.uuid, user_id, is_admin, older_than=older_than),
+        logger)
+
+
+@async_ack_first(async_app.action("home_page_company_updates_load_older_clicked"))
+async def home_page_company_updates_load_older_click_handler(client: AsyncWebClient, body, logger):
+    logger.info(body)
+    user_id = body["user"]["id"]
+    with stage("resolve"):
+        user_preferences, is_admin, company = await asyncio.gather(
+            get_slack_user_preferences(user_id), is_admin_user(user_id), get_company_by_body(body))
+
+    older_than = StatusUpdateCursor.from_str(body["actions"][0]["value"])
+    await publish_home_view(client, user_id, body, lambda: company_updates_home_view(
+        company.uuid, user_id, user_preferences, is_admin, older_than=older_than), logger)
+
+
+@async_ack_first(async_app.action("home_page_select_team_filter_changed"))
+@async_ack_first(async_app.action("home_page_select_project_filter_changed"))
+async def home_page_select_filter_change_handler(client: AsyncWebClient, body, logger):
+    logger.info(body)
+    user_id = body["user"]["id"]
+    with stage("resolve"):
+        user_preferences, is_admin, company = await asyncio.gather(
+            get_slack_user_preferences(user_id), is_admin_user(user_id), get_company_by_body(body))
+        team, department, project = await retrieve_status_update_filters(company.uuid, body)
+    user_preferences.active_team_filter = team
+    user_preferences.active_department_filter = department
+    user_preferences.active_project_filter = project
+    save_slack_user_preferences(user_preferences)
+
+    await publish_home_view(
+        client, user_id, body, lambda: company_updates_home_view(company.uuid, user_id, user_preferences, is_admin),
+        logger)
+
+
+@async_ack_first(async_app.view("status_update_preview_button_clicked"))
+async def status_update_preview_button_click_handler(client: AsyncWebClient, body, logger):
+    user_id = body["user"]["id"]
+    with stage("resolve"):
+        status_update, company = await asyncio.gather(
+            in_thread(retrieve_status_update_from_view, body), get_company_by_body(body))
+        existing_status_update, user_info = await asyncio.gather(
+            async_dao.read_status_update(company_uuid=company.uuid, uuid=status_update.uuid),
+            in_thread(sync_bot.get_user_info, status_update.author_slack_user_id)
+        )
+
+    if user_info:
+        status_update.author_slack_user_name = user_info.name
+    if existing_status_update and existing_status_update.published:
+        existing_status_update.teams = status_update.teams
+        existing_status_update.projects = status_update.projects
+        existing_status_update.type = status_update.type
+        existing_status_update.link = status_update.link
+        existing_status_update.text = status_update.text
+        await async_dao.insert_status_update(existing_status_update)
+        is_admin = await is_admin_user(user_id)
+        await publish_home_view(client, user_id, body, lambda: my_updates_home_view(
+            company.uuid, status_update.author_slack_user_id, is_admin), logger)
+        return
+
+    await async_dao.insert_status_update(status_update)
+    try:
+        with stage("publish"):
+            await client.views_open(trigger_id=body["trigger_id"],
+                                    view=share_status_update_preview_view(update=status_update))
+    except Exception as e:
+        logger.error(f"Error publishing home tab: {e}")
+
+
+@async_ack_first(async_app.view("status_update_preview_share_button_clicked"))
+async def status_update_preview_share_button_click_handler(client: AsyncWebClient, body):
+    company = await get_company_by_body(body)
+    status_update_uuid = retrieve_private_metadata_from_view(body).status_update_uuid
+    await async_dao.publish_status_update(company_uuid=company.uuid, uuid=status_update_uuid)
+    status_update = await async_dao.read_status_update(company_uuid=company.uuid, uuid=status_update_uuid)
+    try:
+        channel_id, thread_ts, message_ts = slack_channel_id_thread_ts_message_ts_from_status_update_link(
+            status_update.link)
+    except TypeError:
+        channel_id, thread_ts, message_ts = None, None, None
+    if channel_id and message_ts:
+        text = f"A status update with a link to this " \
+               f"<{encode_link_in_slack_message(status_update.link)}|{'reply' if thread_ts else 'message'}> " \
+               f"was shared by <@{status_update.author_slack_user_id}>"
+        await client.chat_postMessage(channel=channel_id, text=text, thread_ts=thread_ts or message_ts)
+
+
+@async_ack_first(async_app.event("message"))
+async def message_event_handler(client: AsyncWebClient, body, logger):
+    with stage("resolve"):
+        company, status_update = await asyncio.gather(
+            get_company_by_body(body), in_thread(status_update_from_message, body))
+        user_info = await in_thread(sync_bot.get_user_info, status_update.author_slack_user_id)
+    if user_info:
+        status_update.author_slack_user_name = user_info.name
+    status_update.published = False
+
+    _, blocks = await asyncio.gather(
+        async_dao.insert_status_update(status_update),
+        status_update_preview_message_blocks(company.uuid, status_update)
+    )
+    with stage("publish"):
+        await client.chat_postMessage(
+            metadata=Metadata(event_type="my_type", event_payload={"status_update_uuid": status_update.uuid}),
+            text=status_update_preview_message_text(status_update),  # This text will be displayed in notifications
+            channel=body["event"]["channel"],
+            blocks=blocks,
+            unfurl_links=False
+        )
+    logger.info(body)
+
+
+async def update_status_update_preview_message(client: AsyncWebClient, body, logger):
+    logger.info(body)
+    status_update_uuid = body["message"]["metadata"]["event_payload"]["status_update_uuid"]
+    company = await get_company_by_body(body)
+
+    values = body["state"]["values"]
+    team_uuids = [team["value"] for team in values[
+        "status_update_preview_teams_list"]["status_update_message_preview_team_selected"]["selected_options"]]
+    project_uuids = [project["value"] for project in values[
+        "status_update_preview_projects_list"]["status_update_message_preview_project_selected"]["selected_options"]]
+    try:
+        status_update_type_uuid = values["status_update_preview_status_update_type"][
+            "status_update_message_preview_status_update_type_selected"]["selected_option"]["value"]
+    except TypeError:
+        status_update_type_uuid = None
+
+    if await async_dao.update_status_update(company.uuid, status_update_uuid,
+                                            status_update_type_uuid=status_update_type_uuid):
+        await asyncio.gather(
+            async_dao.replace_status_update_teams(company.uuid, status_update_uuid, team_uuids),
+            async_dao.replace_status_update_projects(company.uuid, status_update_uuid, project_uuids)
+        )
+        status_update = await async_dao.read_status_update(company_uuid=company.uuid, uuid=status_update_uuid)
+    else:
+        teams, projects, status_update_type = await asyncio.gather(
+            async_dao.read_teams_by_uuids(company.uuid, team_uuids),
+            async_dao.read_projects_by_uuids(company.uuid, project_uuids),
+            async_dao.read_status_update_type(company_uuid=company.uuid, uuid=status_update_type_uuid)
+            if status_update_type_uuid else _none()
+        )
+        status_update = StatusUpdate(
+            source=StatusUpdateSource.SLACK_MESSAGE,
+            text=body["message"]["text"],
+            published=False,
+            company=company,
+            teams=teams,
+            projects=projects,
+            type=status_update_type
+        )
+        await async_dao.insert_status_update(status_update)
+
+    blocks = await status_update_preview_message_blocks(company.uuid, status_update)
+    with stage("publish"):
+        await client.chat_update(
+            channel=body["channel"]["id"],
+            ts=body["message"]["ts"],
+            text=status_update_preview_message_text(status_update),
+            blocks=blocks
+        )
+
+
+@async_ack_first(async_app.action("status_update_message_preview_team_selected"))
+@async_ack_first(async_app.action("status_update_message_preview_project_selected"))
+@async_ack_first(async_app.action("status_update_message_preview_status_update_type_selected"))
+async def status_update_message_preview_select_handler(client: AsyncWebClient, body, logger):
+    await update_status_update_preview_message(client, body, logger)
+
+
+@async_ack_first(async_app.action("status_update_message_preview_publish_button_clicked"))
+async def status_update_message_preview_publish_button_click_handler(client: AsyncWebClient, body, logger):
+    company = await get_company_by_body(body)
+    status_update_uuid = body["message"]["metadata"]["event_payload"]["status_update_uuid"]
+    try:
+        link = body["state"]["values"]["status_update_preview_link"][
+            "status_update_message_preview_link_updated"]["value"]
+    except (KeyError, TypeError):
+        link = None
+    await async_dao.update_status_update(company.uuid, status_update_uuid, published=True, link=link)
+    await update_status_update_preview_message(client, body, logger)
+
+
+@async_ack_first(async_app.action("status_update_message_preview_cancel_button_clicked"))
+async def status_update_message_preview_cancel_button_click_handler(client: AsyncWebClient, body, logger):
+    company = await get_company_by_body(body)
+    status_update_uuid = body["message"]["metadata"]["event_payload"]["status_update_uuid"]
+    await async_dao.update_status_update(company.uuid, status_update_uuid, deleted=True)
+    await update_status_update_preview_message(client, body, logger)
+
+
+# Everything else runs the handlers of the sync app
+for register, listener in [
+    (async_app.shortcut("share_message_button_clicked_callback"),
+     sync_bot.share_message_button_clicked_callback_handler),
+    (async_app.action("my_updates_status_message_menu_button_clicked"),
+     sync_bot.my_updates_status_message_menu_button_clicked_handler),
+    (async_app.view("home_page_my_updates_delete_status_update_dialog_submitted"),
+     sync_bot.home_page_my_updates_delete_status_update_dialog_submitted_handler),
+    (async_app.action("company_updates_status_message_menu_button_clicked"),
+     sync_bot.company_updates_status_message_menu_button_clicked_handler),
+    (async_app.view("home_page_company_updates_delete_status_update_dialog_submitted"),
+     sync_bot.home_page_company_updates_delete_status_update_dialog_submitted_handler),
+    (async_app.action("home_page_configuration_button_clicked"),
+     sync_bot.home_page_configuration_button_clicked_handler),
+    (async_app.action("configuration_departments_button_clicked"),
+     sync_bot.configuration_departments_button_clicked_handler),
+    (async_app.action("configuration_teams_button_clicked"),
+     sync_bot.configuration_teams_button_clicked_handler),
+    (async_app.action("configuration_projects_button_clicked"),
+     sync_bot.home_page_configuration_projects_button_clicked_handler),
+    (async_app.action("configuration_status_types_button_clicked"),
+     sync_bot.configuration_status_types_button_clicked_handler),
+    (async_app.action("configuration_add_new_department_clicked"),
+     sync_bot.configuration_add_new_department_clicked_handler),
+    (async_app.view("home_page_configuration_new_department_dialog_submitted"),
+     sync_bot.home_page_configuration_new_department_dialog_submitted_handler),
+    (async_app.action("configuration_department_menu_clicked"),
+     sync_bot.configuration_department_menu_clicked_handler),
+    (async_app.view("home_page_configuration_delete_dialog_submitted"),
+     sync_bot.home_page_configuration_delete_dialog_submitted_handler),
+    (async_app.action("configuration_add_new_team_clicked"),
+     sync_bot.configuration_add_new_team_clicked_handler),
+    (async_app.view("home_page_configuration_new_team_dialog_submitted"),
+     sync_bot.home_page_configuration_new_team_dialog_submitted_handler),
+    (async_app.action("configuration_team_menu_clicked"),
+     sync_bot.configuration_team_menu_clicked_handler),
+    (async_app.view("home_page_configuration_delete_team_dialog_submitted"),
+     sync_bot.home_page_configuration_delete_team_dialog_submitted_handler),
+    (async_app.action("configuration_project_menu_clicked"),
+     sync_bot.configuration_project_menu_clicked_handler),
+    (async_app.action("configuration_add_new_project_clicked"),
+     sync_bot.configuration_add_new_project_clicked_handler),
+    (async_app.view("home_page_configuration_new_project_dialog_submitted"),
+     sync_bot.home_page_configuration_new_project_dialog_submitted_handler),
+    (async_app.view("home_page_configuration_delete_project_dialog_submitted"),
+     sync_bot.home_page_configuration_delete_project_dialog_submitted_handler),
+    (async_app.action("configuration_add_new_status_type_clicked"),
+     sync_bot.configuration_add_new_status_type_clicked_handler),
+    (async_app.action("configuration_status_type_menu_clicked"),
+     sync_bot.configuration_status_type_menu_clicked_handler),
+    (async_app.view("home_page_configuration_new_status_update_type_dialog_submitted"),
+     sync_bot.home_page_configuration_new_status_update_type_dialog_submitted_handler),
+    (async_app.view("home_page_configuration_delete_status_update_type_dialog_submitted"),
+     sync_bot.home_page_configuration_delete_status_update_type_dialog_submitted_handler),
+    (async_app.action("share_status_update_button_clicked"),
+     sync_bot.share_status_update_button_click_handler),
+    (async_app.action("status_update_preview_back_to_editing_clicked"),
+     sync_bot.status_update_preview_back_to_editing_click_handler),
+]:
+    register(ack=async_ack_immediately, lazy=[bridged(listener)])
+
+for callback_id, edit, save, execute in [
+    ("remind_to_share_updates",
+     reminder_wf_step_edit_handler, reminder_wf_step_save_handler, reminder_wf_step_execute_handler),
+    ("publish_status_updates_report",
+     publish_updates_wf_step_edit_handler, publish_updates_wf_step_save_handler,
+     publish_updates_wf_step_execute_handler),
+    ("email_status_updates_report",
+     email_updates_wf_step_edit_handler, email_updates_wf_step_save_handler, email_updates_wf_step_execute_handler),
+]:
+    async_app.step(AsyncWorkflowStep(callback_id=callback_id, edit=bridged(edit), save=bridged(save),
+                                     execute=bridged(execute)))
+
+
+async def main():
+    sync_bot.USER_DIRECTORY.warm_in_background()
+    sync_bot.METRICS_LOGGER.start()
+    handler = AsyncSocketModeHandler(async_app, slack_app_token())
+    stopped = asyncio.Event()
+    # Python's default action for SIGTERM (e.g. a container being stopped) skips atexit hooks
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set)
+    try:
+        await handler.connect_async()
+        await stopped.wait()
+    finally:
+        await handler.close_async()
+        await async_dao.dispose()
+        sync_bot.shutdown()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    asyncio.run(main())
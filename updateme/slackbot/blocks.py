@@ -37,6 +37,18 @@ def home_page_actions_block(selected: str = "my_updates", show_configuration: bo
     return ActionsBlock(elements=elements)
 
 
+def home_page_load_older_updates_block(action_id: str, cursor: str) -> ActionsBlock:
+    return ActionsBlock(
+        elements=[
+            ButtonElement(
+                text="Load older updates",
+                action_id=action_id,
+                value=cursor
+            )
+        ]
+    )
+
+
 def home_page_configuration_actions_block(selected: str = "departments") -> ActionsBlock:
     elements = [
         ButtonElement(
@@ -227,8 +239,19 @@ def status_update_preview_back_to_editing_block() -> ActionsBlock:
     )
 
 
+def status_update_block_id(status_update_uuid: str) -> str:
+    return "status_update_" + status_update_uuid
+
+
+def status_update_edit_options(status_update_uuid: str) -> List[Option]:
+    return [
+        Option(label="Edit...", value="edit_" + status_update_uuid),
+        Option(label="Delete...", value="delete_" + status_update_uuid)
+    ]
+
+
 def status_update_blocks(status_update: StatusUpdate, status_update_reactions: List[StatusUpdateReaction] = None,
-                         display_edit_buttons: bool = False, accessory_action_id: str = None) \
+                         display_edit_buttons: bool = False, accessory_action_id: str = None, block_id: str = None) \
         -> List[SectionBlock]:
     result = []
     title = ""
@@ -273,10 +296,7 @@ def status_update_blocks(status_update: StatusUpdate, status_update_reactions: L
                              for reaction in status_update_reactions])
 
     if display_edit_buttons:
-        menu_options.extend([
-            Option(label="Edit...", value="edit_" + status_update.uuid),
-            Option(label="Delete...", value="delete_" + status_update.uuid)
-        ])
+        menu_options.extend(status_update_edit_options(status_update.uuid))
 
     if accessory_action_id and menu_options:
         accessory = OverflowMenuElement(
@@ -287,6 +307,7 @@ def status_update_blocks(status_update: StatusUpdate, status_update_reactions: L
         accessory = None
 
     result.append(SectionBlock(
+        block_id=block_id,
         text=text_object,
         accessory=accessory
     ))
@@ -346,7 +367,8 @@ def status_update_list_blocks(status_updates: List[StatusUpdate],
                 status_update,
                 status_update_reactions,
                 display_edit_buttons=status_update.author_slack_user_id == current_user_slack_id,
-                accessory_action_id=accessory_action_id
+                accessory_action_id=accessory_action_id,
+                block_id=status_update_block_id(status_update.uuid)
             )
         )
         result.append(DividerBlock())
@@ -0,0 +1,281 @@
+import asyncio
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import Enum
+from threading import Condition
+from typing import Callable, Dict, Generator, List, Optional
+
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web import SlackResponse
+
+from updateme.core.metrics import metrics
+
+# Calls per minute Slack allows per method, workspace and app in each rate limit tier
+TIER_CALLS_PER_MINUTE = {1: 1, 2: 20, 3: 50, 4: 100}
+
+# Tiers of the methods the bot calls. The rest are assumed to be Tier 3
+METHOD_TIERS = {
+    "views.open": 4,
+    "views.publish": 4,
+    "views.push": 4,
+    "views.update": 4,
+    "users.info": 4,
+    "users.list": 2,
+    "chat.update": 3,
+    "chat.delete": 3,
+}
+
+# chat.postMessage has a tier of its own: about one message per second per channel
+POST_MESSAGE_CALLS_PER_MINUTE = 60
+
+# How often a waiting call of the asyncio app checks whether its turn has come
+_ASYNC_POLL_INTERVAL = 0.05
+
+
+class CallPriority(Enum):
+    # Somebody is looking at the screen, waiting for it to change
+    INTERACTIVE = 1
+    DEFAULT = 2
+    # Messages sent on behalf of workflows and other jobs
+    BULK = 3
+
+
+METHOD_PRIORITIES = {
+    "views.open": CallPriority.INTERACTIVE,
+    "views.publish": CallPriority.INTERACTIVE,
+    "views.push": CallPriority.INTERACTIVE,
+    "views.update": CallPriority.INTERACTIVE,
+    "chat.postMessage": CallPriority.BULK,
+}
+
+_call_priority: ContextVar[Optional[CallPriority]] = ContextVar("call_priority", default=None)
+
+
+@contextmanager
+def call_priority(priority: CallPriority) -> Generator[None, None, None]:
+    """
+    Overrides the priority of the Slack API calls made inside the block (see METHOD_PRIORITIES for the defaults)
+    """
+    token = _call_priority.set(priority)
+    try:
+        yield
+    finally:
+        _call_priority.reset(token)
+
+
+class _Bucket:
+    """
+    Token bucket of a method (of a channel, for chat.postMessage), holding up to ten seconds worth of calls
+    """
+
+    def __init__(self, calls_per_minute: int):
+        self.rate = calls_per_minute / 60
+        self.capacity = max(1.0, calls_per_minute / 6)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def ready_in(self, now: float) -> float:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return max(self.blocked_until - now, (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0, 0.0)
+
+
+class _Workspace:
+    def __init__(self):
+        self.buckets: Dict[str, _Bucket] = dict()
+        self.waiting: List["_Ticket"] = []
+        self.in_flight = 0
+
+
+class _Ticket:
+    _sequence = itertools.count()
+
+    def __init__(self, workspace: _Workspace, bucket: _Bucket, method: str, priority: CallPriority):
+        self.workspace = workspace
+        self.bucket = bucket
+        self.method = method
+        self.order = (priority.value, next(self._sequence))
+        self.created = time.perf_counter()
+
+
+class SlackApiDispatcher:
+    """
+    Meters Slack Web API calls the way Slack rate limits them: per workspace and method, at the rate of the method's
+    tier. A call that is over the limit, or over max_concurrent_calls of its workspace, waits, and waiting calls go out
+    in priority order, so views a user is waiting for don't queue up behind bulk messages.
+
+    A call rejected with HTTP 429 holds back the calls of its method until the Retry-After has passed.
+
+    Reports slack.api.in_flight, slack.api.waiting, and per method slack.api.<method>.wait, .throttled and .rate_limited
+    """
+
+    def __init__(self, max_concurrent_calls: int):
+        self._max_concurrent_calls = max_concurrent_calls
+        self._condition = Condition()
+        self._workspaces: Dict[str, _Workspace] = dict()
+        self._in_flight = metrics.gauge("slack.api.in_flight")
+        self._waiting = metrics.gauge("slack.api.waiting")
+
+    def acquire(self, workspace: str, method: str, channel: Optional[str] = None) -> _Ticket:
+        with self._condition:
+            ticket = self._enqueue(workspace, method, channel)
+            try:
+                delay = self._try_dispatch(ticket)
+                if delay != 0:
+                    metrics.counter(f"slack.api.{method}.throttled").inc()
+                while delay != 0:
+                    self._condition.wait(delay)
+                    delay = self._try_dispatch(ticket)
+            finally:
+                self._dequeue(ticket)
+        metrics.timer(f"slack.api.{method}.wait").observe(time.perf_counter() - ticket.created)
+        return ticket
+
+    async def async_acquire(self, workspace: str, method: str, channel: Optional[str] = None) -> _Ticket:
+        """
+        acquire() for the asyncio app. It doesn't block the event loop, and polls instead of waiting to be notified
+        """
+        with self._condition:
+            ticket = self._enqueue(workspace, method, channel)
+        try:
+            with self._condition:
+                delay = self._try_dispatch(ticket)
+            if delay != 0:
+                metrics.counter(f"slack.api.{method}.throttled").inc()
+            while delay != 0:
+                await asyncio.sleep(_ASYNC_POLL_INTERVAL if delay is None else delay)
+                with self._condition:
+                    delay = self._try_dispatch(ticket)
+        finally:
+            with self._condition:
+                self._dequeue(ticket)
+        metrics.timer(f"slack.api.{method}.wait").observe(time.perf_counter() - ticket.created)
+        return ticket
+
+    def release(self, ticket: _Ticket):
+        with self._condition:
+            ticket.workspace.in_flight -= 1
+            self._in_flight.dec()
+            self._condition.notify_all()
+
+    def rate_limited(self, ticket: _Ticket, retry_after: float):
+        metrics.counter(f"slack.api.{ticket.method}.rate_limited").inc()
+        logging.warning(f"Slack rate limited {ticket.method}, holding its calls back for {retry_after}s")
+        with self._condition:
+            ticket.bucket.tokens = 0
+            ticket.bucket.blocked_until = max(ticket.bucket.blocked_until, time.monotonic() + retry_after)
+
+    def _enqueue(self, workspace_id: str, method: str, channel: Optional[str]) -> _Ticket:
+        workspace = self._workspaces.setdefault(workspace_id, _Workspace())
+        if method == "chat.postMessage":
+            bucket_key, calls_per_minute = f"{method}:{channel}", POST_MESSAGE_CALLS_PER_MINUTE
+        else:
+            bucket_key, calls_per_minute = method, TIER_CALLS_PER_MINUTE[METHOD_TIERS.get(method, 3)]
+        bucket = workspace.buckets.get(bucket_key)
+        if bucket is None:
+            bucket = workspace.buckets[bucket_key] = _Bucket(calls_per_minute)
+        priority = _call_priority.get() or METHOD_PRIORITIES.get(method, CallPriority.DEFAULT)
+        ticket = _Ticket(workspace, bucket, method, priority)
+        workspace.waiting.append(ticket)
+        self._waiting.inc()
+        return ticket
+
+    def _dequeue(self, ticket: _Ticket):
+        if ticket in ticket.workspace.waiting:
+            ticket.workspace.waiting.remove(ticket)
+            self._waiting.dec()
+            self._condition.notify_all()
+
+    def _try_dispatch(self, ticket: _Ticket) -> Optional[float]:
+        """
+        Dispatches the call if its turn has come. Otherwise returns the seconds to wait for the bucket to refill, or
+        None if it's waiting for calls ahead of it
+        """
+        now = time.monotonic()
+        workspace = ticket.workspace
+        delay = ticket.bucket.ready_in(now)
+        for other in workspace.waiting:
+            # Calls of higher priority go first, as long as they can go at all
+            if other.order < ticket.order and (other.bucket is ticket.bucket or other.bucket.ready_in(now) == 0):
+                return None
+        if workspace.in_flight >= self._max_concurrent_calls:
+            return None
+        if delay > 0:
+            return delay
+        ticket.bucket.tokens -= 1
+        workspace.in_flight += 1
+        self._in_flight.inc()
+        self._dequeue(ticket)
+        return 0
+
+
+class ThrottledWebClient(WebClient):
+    """
+    WebClient whose calls go through a SlackApiDispatcher. Calls rejected with HTTP 429 are retried, up to max_retries
+    times, once their Retry-After has passed
+    """
+
+    def __init__(self, *args, dispatcher: SlackApiDispatcher, max_retries: int = 3, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dispatcher = dispatcher
+        self.max_retries = max_retries
+
+    def __deepcopy__(self, memo):
+        # Bolt deep-copies requests, their client included, for lazy listeners. The client holds no per-request state,
+        # and a copy would come with a dispatcher of its own
+        return self
+
+    def api_call(self, api_method: str, **kwargs) -> SlackResponse:
+        for attempt in itertools.count():
+            ticket = self.dispatcher.acquire(self.token, api_method, channel_of_call(kwargs))
+            try:
+                return super().api_call(api_method, **kwargs)
+            except SlackApiError as e:
+                retry_after = retry_after_of(e)
+                if retry_after is None:
+                    raise
+                self.dispatcher.rate_limited(ticket, retry_after)
+                if attempt >= self.max_retries:
+                    raise
+            finally:
+                self.dispatcher.release(ticket)
+
+
+def throttled_client_middleware(client: ThrottledWebClient) -> Callable:
+    """
+    Global Bolt middleware which hands the client to listeners. Bolt builds a plain WebClient for every request, whose
+    calls would go around the dispatcher
+    """
+    def middleware(context, next_):
+        context["client"] = client
+        return next_()
+
+    return middleware
+
+
+def channel_of_call(api_call_kwargs: dict) -> Optional[str]:
+    for name in ("json", "data", "params"):
+        channel = (api_call_kwargs.get(name) or {}).get("channel")
+        if channel:
+            return channel
+    return None
+
+
+def retry_after_of(e: SlackApiError) -> Optional[float]:
+    """
+    Seconds Slack asks to wait before calling the method again, or None if the call wasn't rate limited
+    """
+    if getattr(e.response, "status_code", None) != 429:
+        return None
+    for name, value in (e.response.headers or {}).items():
+        if name.lower() == "retry-after":
+            try:
+                return float(value[0] if isinstance(value, list) else value)
+            except (TypeError, ValueError):
+                break
+    return 1.0
@@ -0,0 +1,79 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from threading import BoundedSemaphore
+
+from updateme.core import dao
+from updateme.core.config import RejectionPolicy
+from updateme.core.metrics import metrics
+
+
+class DaoSessionScopedExecutor(ThreadPoolExecutor):
+    """
+    Listener executor for the Bolt app. Bolt runs listeners (and lazy listeners) on its executor threads after all
+    global middleware has already returned, so this is the place where a request begins and ends: every submitted task
+    runs inside its own DAO session scope, and the Session is thrown away as soon as the listener finishes
+    """
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        return super().submit(self._run_in_session_scope, fn, *args, **kwargs)
+
+    @staticmethod
+    def _run_in_session_scope(fn, *args, **kwargs):
+        with dao.session_scope():
+            return fn(*args, **kwargs)
+
+
+class BoundedListenerExecutor(DaoSessionScopedExecutor):
+    """
+    DaoSessionScopedExecutor that holds at most max_workers + max_queue_size tasks. What happens to the ones above that
+    is up to the rejection policy: by default the submitting thread waits, as only work nobody has acked yet may be
+    shed. Reports executor.<name>.queue_depth, .wait, .run and .rejected
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue_size: int,
+                 rejection_policy: RejectionPolicy = RejectionPolicy.BLOCK):
+        super().__init__(max_workers=max_workers, thread_name_prefix=name)
+        self._name = name
+        self._rejection_policy = rejection_policy
+        self._slots = BoundedSemaphore(max_workers + max_queue_size)
+        self._queue_depth = metrics.gauge(f"executor.{name}.queue_depth")
+        self._wait = metrics.timer(f"executor.{name}.wait")
+        self._run = metrics.timer(f"executor.{name}.run")
+        self._rejected = metrics.counter(f"executor.{name}.rejected")
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        if not self._slots.acquire(blocking=self._rejection_policy == RejectionPolicy.BLOCK):
+            self._rejected.inc()
+            if self._rejection_policy == RejectionPolicy.CALLER_RUNS:
+                return self._run_in_caller(fn, *args, **kwargs)
+            logging.warning(f"Executor {self._name} is full, dropping {getattr(fn, '__qualname__', fn)}")
+            future = Future()
+            future.cancel()
+            return future
+
+        self._queue_depth.inc()
+        try:
+            return super().submit(self._run_instrumented, time.perf_counter(), fn, *args, **kwargs)
+        except Exception:
+            self._queue_depth.dec()
+            self._slots.release()
+            raise
+
+    def _run_instrumented(self, submitted_at: float, fn, /, *args, **kwargs):
+        self._queue_depth.dec()
+        self._wait.observe(time.perf_counter() - submitted_at)
+        try:
+            with self._run.time():
+                return fn(*args, **kwargs)
+        finally:
+            self._slots.release()
+
+    def _run_in_caller(self, fn, /, *args, **kwargs) -> Future:
+        future = Future()
+        try:
+            with self._run.time():
+                future.set_result(self._run_in_session_scope(fn, *args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
@@ -0,0 +1,207 @@
+import asyncio
+import logging
+from concurrent.futures import Future
+from threading import Lock
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from cachetools import TTLCache
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+
+from updateme.core import dao
+from updateme.core.metrics import metrics
+from updateme.slackbot.listeners import stage
+
+
+def home_view_hash(payload: Optional[dict]) -> Optional[str]:
+    """
+    Hash of the home tab an interaction (or an app_home_opened event) comes from
+    """
+    view = (payload or {}).get("view") or {}
+    return view.get("hash") if view.get("type") == "home" else None
+
+
+class HomeTabRefresher:
+    """
+    Publishes home tabs one at a time per user. A refresh asked for while another one of the same user is running is
+    merged with it: the running one renders and publishes the latest view it was given once more, and only the latest,
+    so a burst of clicks costs at most two renders and publishes, and they land in order. Callers merged into a running
+    refresh return right away instead of holding a listener thread; the Future they get fails only if the view that
+    replaced theirs does.
+
+    Every publish carries the hash of the view it replaces, so Slack rejects it if somebody else (e.g. another replica)
+    has published in the meantime. A rejected view is rendered once more from the current state and published over
+    """
+
+    def __init__(self, max_users: int = 10_000, hash_ttl: int = 24 * 60 * 60):
+        self._lock = Lock()
+        # User id -> latest refresh asked for
+        self._pending: Dict[str, _Refresh] = dict()
+        self._in_flight = set()
+        # User id -> hash of the home tab last published (or seen)
+        self._hashes: TTLCache = TTLCache(maxsize=max_users, ttl=hash_ttl)
+        self._refreshes = metrics.counter("home_tab.refreshes")
+        self._coalesced = metrics.counter("home_tab.coalesced")
+        self._hash_conflicts = metrics.counter("home_tab.hash_conflicts")
+
+    def refresh(self, client: WebClient, user_id: str, render: Callable[[], Any], view_hash: str = None) -> Future:
+        """
+        Renders and publishes the home tab of the user, or leaves it to the refresh already running for them. Returns a
+        Future settled once the view that replaced this one is published, or failed to be: done already if the caller
+        ran the refresh itself, pending otherwise. A failed render is logged here, nobody has to wait for the Future
+        """
+        refresh = _Refresh(client, render)
+        if self._enqueue(user_id, refresh, view_hash):
+            while (next_ := self._next(user_id)) is not None:
+                try:
+                    published = self._run(user_id, next_)
+                except Exception as e:
+                    self._failed(user_id, next_, e)
+                except BaseException as e:
+                    next_.fail(e)
+                    self._abandon(user_id, e)
+                    raise
+                else:
+                    if published:
+                        next_.succeed()
+        return refresh.done
+
+    async def async_refresh(self, client, user_id: str, render: Callable[[], Awaitable[Any]],
+                            view_hash: str = None) -> Future:
+        """
+        refresh() for the asyncio app: render is a coroutine function and client an AsyncWebClient
+        """
+        refresh = _Refresh(client, render, asyncio.get_running_loop())
+        if self._enqueue(user_id, refresh, view_hash):
+            while (next_ := self._next(user_id)) is not None:
+                try:
+                    if next_.loop is refresh.loop:
+                        published = await self._async_run(user_id, next_)
+                    else:
+                        # Asked for by the Bolt app (or another event loop)
+                        published = await asyncio.to_thread(self._run, user_id, next_)
+                except Exception as e:
+                    self._failed(user_id, next_, e)
+                except BaseException as e:
+                    next_.fail(e)
+                    self._abandon(user_id, e)
+                    raise
+                else:
+                    if published:
+                        next_.succeed()
+        return refresh.done
+
+    def _run(self, user_id: str, refresh: "_Refresh") -> bool:
+        """
+        Publishes the view, returns False if it has to be rendered again
+        """
+        if refresh.loop is not None:
+            return asyncio.run_coroutine_threadsafe(self._async_run(user_id, refresh), refresh.loop).result()
+        # Reads memoized by an earlier render of this request may be outdated by now
+        dao.clear_request_memo()
+        view = refresh.render()
+        try:
+            with stage("publish"):
+                response = refresh.client.views_publish(user_id=user_id, view=view, hash=refresh.view_hash)
+        except SlackApiError as e:
+            return self._on_conflict(user_id, e, refresh)
+        self._published(user_id, response)
+        return True
+
+    async def _async_run(self, user_id: str, refresh: "_Refresh") -> bool:
+        view = await refresh.render()
+        try:
+            with stage("publish"):
+                response = await refresh.client.views_publish(user_id=user_id, view=view, hash=refresh.view_hash)
+        except SlackApiError as e:
+            return self._on_conflict(user_id, e, refresh)
+        self._published(user_id, response)
+        return True
+
+    def _enqueue(self, user_id: str, refresh: "_Refresh", view_hash: Optional[str]) -> bool:
+        """
+        Returns whether the caller has to run the refresh itself
+        """
+        self._refreshes.inc()
+        with self._lock:
+            if view_hash and user_id not in self._hashes:
+                self._hashes[user_id] = view_hash
+            superseded = self._pending.get(user_id)
+            if superseded is not None:
+                # The newer view covers the callers of the one it replaces
+                refresh.waiters.extend(superseded.waiters)
+            self._pending[user_id] = refresh
+            if user_id in self._in_flight:
+                self._coalesced.inc()
+                return False
+            self._in_flight.add(user_id)
+            return True
+
+    def _next(self, user_id: str) -> Optional["_Refresh"]:
+        with self._lock:
+            refresh = self._pending.pop(user_id, None)
+            if refresh is None:
+                self._in_flight.discard(user_id)
+                return None
+            refresh.view_hash = None if refresh.retry else self._hashes.get(user_id)
+            return refresh
+
+    def _on_conflict(self, user_id: str, e: SlackApiError, refresh: "_Refresh") -> bool:
+        if e.response.get("error") != "hash_conflict":
+            raise e
+        self._hash_conflicts.inc()
+        with self._lock:
+            self._hashes.pop(user_id, None)
+            if refresh.retry:
+                # Published without the hash, so somebody else's view landed first anyway
+                return True
+            pending = self._pending.get(user_id)
+            if pending is not None:
+                # The newer view is going to be published without the hash
+                pending.waiters.extend(refresh.waiters)
+            else:
+                refresh.retry = True
+                self._pending[user_id] = refresh
+        logging.info(f"Home tab of {user_id} was published by somebody else, rendering it again")
+        return False
+
+    def _published(self, user_id: str, response):
+        view_hash = ((response or {}).get("view") or {}).get("hash")
+        with self._lock:
+            if view_hash:
+                self._hashes[user_id] = view_hash
+            else:
+                self._hashes.pop(user_id, None)
+
+    @staticmethod
+    def _failed(user_id: str, refresh: "_Refresh", e: Exception):
+        logging.error(f"Can not publish the home tab of {user_id}: {e}")
+        refresh.fail(e)
+
+    def _abandon(self, user_id: str, e: BaseException):
+        # Nobody is left to run the refreshes still queued, so their callers must not wait for them
+        with self._lock:
+            pending = self._pending.pop(user_id, None)
+            self._in_flight.discard(user_id)
+        if pending is not None:
+            pending.fail(e)
+
+
+class _Refresh:
+    def __init__(self, client, render: Callable, loop: asyncio.AbstractEventLoop = None):
+        self.client = client
+        self.render = render
+        self.loop = loop
+        self.view_hash: Optional[str] = None
+        self.retry = False
+        self.done = Future()
+        # Callers whose refresh is published by this one, itself included
+        self.waiters: List[Future] = [self.done]
+
+    def succeed(self):
+        for waiter in self.waiters:
+            waiter.set_result(None)
+
+    def fail(self, e: BaseException):
+        for waiter in self.waiters:
+            waiter.set_exception(e)
@@ -0,0 +1,83 @@
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Generator, Optional
+
+from updateme.core.metrics import metrics
+
+# Name of the running listener. A context variable rather than a thread local, so that concurrent coroutines of the
+# asyncio app don't time their stages under each other's names
+_current_listener: ContextVar[Optional[str]] = ContextVar("current_listener", default=None)
+
+
+def ack_immediately(ack):
+    ack()
+
+
+async def async_ack_immediately(ack):
+    await ack()
+
+
+def ack_first(register: Callable) -> Callable:
+    """
+    Registers the decorated function as a Bolt lazy listener behind an ack-only listener:
+
+        @ack_first(app.action("some_action_id"))
+        def some_action_handler(body, logger):
+            ...
+
+    Slack gets its acknowledgement as soon as an executor thread picks the request up, and queries, rendering and Slack
+    calls run afterwards on the lazy listener executor, timed as slack.listener.<name> (see stage())
+    """
+    def decorator(listener: Callable) -> Callable:
+        register(ack=ack_immediately, lazy=[_timed(listener)])
+        return listener
+
+    return decorator
+
+
+def async_ack_first(register: Callable) -> Callable:
+    """
+    ack_first() for AsyncApp listeners, which are coroutine functions
+    """
+    def decorator(listener: Callable) -> Callable:
+        register(ack=async_ack_immediately, lazy=[_async_timed(listener)])
+        return listener
+
+    return decorator
+
+
+@contextmanager
+def stage(name: str) -> Generator[None, None, None]:
+    """
+    Times a stage of the running listener as slack.listener.<listener name>.<stage name>
+    """
+    listener = _current_listener.get() or "unknown"
+    with metrics.timer(f"slack.listener.{listener}.{name}").time():
+        yield
+
+
+def _timed(listener: Callable) -> Callable:
+    @functools.wraps(listener)
+    def wrapper(*args, **kwargs):
+        token = _current_listener.set(listener.__name__)
+        try:
+            with metrics.timer(f"slack.listener.{listener.__name__}").time():
+                return listener(*args, **kwargs)
+        finally:
+            _current_listener.reset(token)
+
+    return wrapper
+
+
+def _async_timed(listener: Callable) -> Callable:
+    @functools.wraps(listener)
+    async def wrapper(*args, **kwargs):
+        token = _current_listener.set(listener.__name__)
+        try:
+            with metrics.timer(f"slack.listener.{listener.__name__}").time():
+                return await listener(*args, **kwargs)
+        finally:
+            _current_listener.reset(token)
+
+    return wrapper
@@ -17,10 +17,9 @@ def status_update_from_message(body) -> StatusUpdate:
         images = [file for file in files if file["filetype"] in ("jpg", "png", "gif")]
     else:
         images = []
-    try:
-        company = dao.read_companies(slack_team_id=body["team_id"])[0]
-    except IndexError:
-        raise IndexError(f"Can not find company with slack_team_id = {body['team_id']}") from None
+    company = dao.read_company_by_slack_team_id(body["team_id"])
+    if company is None:
+        raise IndexError(f"Can not find company with slack_team_id = {body['team_id']}")
     return StatusUpdate(
         text=text,
         company=company,
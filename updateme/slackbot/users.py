@@ -0,0 +1,229 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+from slack_sdk import WebClient
+
+from updateme.core.cache import CacheBackend, InProcessCacheBackend
+from updateme.core.metrics import metrics
+from updateme.core.model import SlackUserInfo
+
+
+def slack_user_info(user: dict) -> Optional[SlackUserInfo]:
+    profile = user["profile"]
+
+    name = None
+
+    try:
+        name = profile["display_name"]
+    except (KeyError, TypeError):
+        try:
+            name = profile["real_name"]
+        except (KeyError, TypeError):
+            pass
+
+    if name is None:
+        return None
+
+    return SlackUserInfo(
+        name=name,
+        is_admin=user.get("is_admin", False),
+        is_owner=user.get("is_owner", False)
+    )
+
+
+class SlackUserDirectory:
+    """
+    Slack user id -> SlackUserInfo, kept off the latency path of handlers:
+
+    - warm() loads the whole workspace with paginated users.list calls
+    - entries are saved to a local JSON file, so they survive restarts
+    - concurrent misses for the same user share one users.info call
+    - entries older than the TTL are still served, while a background users.info call refreshes them
+    - entries are shared through the cache backend, so replicas don't each call Slack for the same users
+    """
+
+    # Saving is skipped if the file was saved less than this many seconds ago (warm() and exit always save)
+    SAVE_INTERVAL = 60
+    USERS_LIST_PAGE_SIZE = 200
+    # Shared entries outlive the TTL: a stale entry is still served while it's refreshed
+    BACKEND_TTL = 24 * 60 * 60
+
+    def __init__(self, client: WebClient, file: Optional[str] = None, ttl: int = 60 * 60, max_workers: int = 2,
+                 backend: CacheBackend = None):
+        self._client = client
+        self._file = file
+        self._ttl = ttl
+        self._backend = backend or InProcessCacheBackend()
+        self._lock = Lock()
+        # user id -> (info, time it was fetched at)
+        self._entries: Dict[str, Tuple[Optional[SlackUserInfo], float]] = dict()
+        self._in_flight: Dict[str, Future] = dict()
+        self._saved_at = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="slack-user-directory")
+        self._hits = metrics.counter("slack_user_directory.hits")
+        self._stale_hits = metrics.counter("slack_user_directory.stale_hits")
+        self._misses = metrics.counter("slack_user_directory.misses")
+        self._coalesced = metrics.counter("slack_user_directory.coalesced")
+        self._errors = metrics.counter("slack_user_directory.errors")
+        self._users_info_timer = metrics.timer("slack_user_directory.users_info")
+        self._load()
+
+    def get(self, user_id: str) -> Optional[SlackUserInfo]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                info, fetched_at = entry
+                if time.time() - fetched_at > self._ttl:
+                    self._stale_hits.inc()
+                    if user_id not in self._in_flight:
+                        self._refresh_in_background(user_id)
+                else:
+                    self._hits.inc()
+                return info
+
+            future = self._in_flight.get(user_id)
+            fetch = future is None
+            if fetch:
+                self._misses.inc()
+                self._in_flight[user_id] = future = Future()
+            else:
+                self._coalesced.inc()
+
+        if fetch:
+            self._fetch(user_id, future)
+        return future.result()
+
+    def warm(self):
+        """
+        Loads all users of the workspace. Blocks for a while on large workspaces, see warm_in_background()
+        """
+        cursor = None
+        fetched_at = time.time()
+        entries = dict()
+        while True:
+            response = self._client.users_list(limit=self.USERS_LIST_PAGE_SIZE, cursor=cursor)
+            for user in response.data.get("members", []):
+                entries[user["id"]] = (slack_user_info(user), fetched_at)
+            cursor = (response.data.get("response_metadata") or {}).get("next_cursor")
+            if not cursor:
+                break
+        with self._lock:
+            self._entries.update(entries)
+        self._backend.set_many({self._backend_key(user_id): entry for user_id, entry in entries.items()},
+                               self.BACKEND_TTL)
+        self.save()
+
+    def warm_in_background(self) -> Future:
+        def warm():
+            try:
+                self.warm()
+            except Exception as e:
+                self._errors.inc()
+                logging.error(f"Can not load Slack users: {e}")
+
+        return self._executor.submit(warm)
+
+    def save(self):
+        if self._file is None:
+            return
+        with self._lock:
+            entries = {
+                user_id: {"info": asdict(info) if info is not None else None, "fetched_at": fetched_at}
+                for user_id, (info, fetched_at) in self._entries.items()
+            }
+            self._saved_at = time.time()
+        os.makedirs(os.path.dirname(os.path.abspath(self._file)), exist_ok=True)
+        tmp_file = f"{self._file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp_file, self._file)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.save()
+
+    def _load(self):
+        if self._file is None or not os.path.exists(self._file):
+            return
+        try:
+            with open(self._file) as f:
+                entries = json.load(f)
+            self._entries = {
+                user_id: (SlackUserInfo(**entry["info"]) if entry["info"] is not None else None, entry["fetched_at"])
+                for user_id, entry in entries.items()
+            }
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            logging.error(f"Can not load Slack users from {self._file}: {e}")
+
+    @staticmethod
+    def _backend_key(user_id: str) -> str:
+        return f"slack_user:{user_id}"
+
+    def _users_info(self, user_id: str) -> Tuple[Optional[SlackUserInfo], float]:
+        # Another replica may have fetched the user already
+        entry = self._backend.get(self._backend_key(user_id))
+        if entry is not None and time.time() - entry[1] <= self._ttl:
+            return entry
+        with self._users_info_timer.time():
+            entry = (slack_user_info(self._client.users_info(user=user_id).data["user"]), time.time())
+        self._backend.set(self._backend_key(user_id), entry, self.BACKEND_TTL)
+        return entry
+
+    def _fetch(self, user_id: str, future: Future):
+        try:
+            info, fetched_at = self._users_info(user_id)
+        except Exception as e:
+            self._errors.inc()
+            future.set_exception(e)
+        else:
+            with self._lock:
+                self._entries[user_id] = (info, fetched_at)
+                save = time.time() - self._saved_at > self.SAVE_INTERVAL
+            future.set_result(info)
+            if save:
+                try:
+                    self._executor.submit(self._save_quietly)
+                except RuntimeError:
+                    # Shut down, which saves anyway
+                    pass
+        finally:
+            with self._lock:
+                self._in_flight.pop(user_id, None)
+
+    def _refresh_in_background(self, user_id: str):
+        """
+        Called with _lock held
+        """
+        future = Future()
+        try:
+            task = self._executor.submit(self._refresh, user_id, future)
+        except RuntimeError as e:
+            # Shut down: the stale entry is served as it is
+            future.set_exception(e)
+            return
+        self._in_flight[user_id] = future
+        # Cancelled by shutdown() before it ran, the refresh must not stay in flight forever
+        task.add_done_callback(lambda task_: task_.cancelled() and self._abandon(user_id, future))
+
+    def _abandon(self, user_id: str, future: Future):
+        with self._lock:
+            if self._in_flight.get(user_id) is future:
+                del self._in_flight[user_id]
+        future.cancel()
+
+    def _refresh(self, user_id: str, future: Future):
+        self._fetch(user_id, future)
+        if future.exception() is not None:
+            logging.error(f"Can not refresh Slack user {user_id}: {future.exception()}")
+
+    def _save_quietly(self):
+        try:
+            self.save()
+        except OSError as e:
+            logging.error(f"Can not save Slack users to {self._file}: {e}")
@@ -5,13 +5,25 @@ from typing import List, Callable, Optional
 from slack_sdk.models.blocks import OptionGroup, Option
 
 from updateme.core import dao
-from updateme.core.dao import create_initial_data
+from updateme.core.cache import WriteBehindCache
+from updateme.core.config import get_preferences_flush_interval
+from updateme.core.dao import create_initial_data, copy_slack_user_preferences
 from updateme.core.model import SlackUserPreferences, Team, Company
 from updateme.core.utils import join_strings_with_commas
 
 
 CREATE_COMPANY_LOCK = Lock()
 
+# Tab and filter clicks change preferences all the time: keep them in memory and write them back in batches
+SLACK_USER_PREFERENCES_CACHE = WriteBehindCache(
+    "slack_user_preferences",
+    key=lambda user_preferences: user_preferences.user_id,
+    load=dao.read_slack_user_preferences,
+    store=dao.insert_many_slack_user_preferences,
+    copy=copy_slack_user_preferences,
+    flush_interval=get_preferences_flush_interval(),
+)
+
 
 def escape_string(s: str) -> str:
     return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
@@ -30,54 +42,60 @@ def join_names_with_commas(names: List[str], bold: bool = False) -> str:
 
 
 def get_or_create_slack_user_preferences(user_id: str) -> SlackUserPreferences:
-    user_preferences = dao.read_slack_user_preferences(user_id)
+    # A copy of the cached preferences: change it, then hand it to save_slack_user_preferences()
+    user_preferences = SLACK_USER_PREFERENCES_CACHE.get(user_id)
     if user_preferences is None:
         user_preferences = SlackUserPreferences(user_id, "company_updates")
-        dao.insert_slack_user_preferences(user_preferences)
+        SLACK_USER_PREFERENCES_CACHE.put(user_preferences)
 
     return user_preferences
 
 
+def save_slack_user_preferences(user_preferences: SlackUserPreferences):
+    SLACK_USER_PREFERENCES_CACHE.put(user_preferences)
+
+
 def get_or_create_company_by_body(body) -> Company:
     try:
         slack_team_id = body["team"]["id"]
     except KeyError:
         slack_team_id = body["team_id"]
-    companies = dao.read_companies(slack_team_id=slack_team_id)
-    try:
-        return companies[0]
-    except IndexError:
-        with CREATE_COMPANY_LOCK:
-            try:
-                return dao.read_companies(slack_team_id=body["team"]["id"])[0]
-            except IndexError:
-                company = Company(slack_team_id=body["team"]["id"], name=body["team"]["domain"])
-                dao.insert_company(company)
-                create_initial_data(company)
-                if not company.name and body["team"]["domain"]:
-                    # It could be that the company was created in the get_or_create_company_by_event function, where
-                    # we didn't know the company name
-                    company.name = body["team"]["domain"]
-                return company
+    company = dao.read_company_by_slack_team_id(slack_team_id)
+    if company is not None:
+        return company
+
+    with CREATE_COMPANY_LOCK:
+        # Not through the cache: a company created by another process may still be cached as missing
+        try:
+            return dao.read_companies(slack_team_id=slack_team_id)[0]
+        except IndexError:
+            company = Company(slack_team_id=body["team"]["id"], name=body["team"]["domain"])
+            dao.insert_company(company)
+            create_initial_data(company)
+            if not company.name and body["team"]["domain"]:
+                # It could be that the company was created in the get_or_create_company_by_event function, where
+                # we didn't know the company name
+                company.name = body["team"]["domain"]
+            return company
 
 
 def get_or_create_company_by_event(event) -> Optional[Company]:
     try:
-        companies = dao.read_companies(slack_team_id=event["view"]["team_id"])
+        company = dao.read_company_by_slack_team_id(event["view"]["team_id"])
     except KeyError:
         return None
 
-    try:
-        return companies[0]
-    except IndexError:
-        with CREATE_COMPANY_LOCK:
-            try:
-                return dao.read_companies(slack_team_id=event["view"]["team_id"])[0]
-            except IndexError:
-                company = Company(slack_team_id=event["view"]["team_id"], name="")
-                # dao.insert_company(Company(slack_team_id=event["view"]["team_id"], name=""))
-                create_initial_data(company)
-                return company
+    if company is not None:
+        return company
+
+    with CREATE_COMPANY_LOCK:
+        try:
+            return dao.read_companies(slack_team_id=event["view"]["team_id"])[0]
+        except IndexError:
+            company = Company(slack_team_id=event["view"]["team_id"], name="")
+            dao.insert_company(company)
+            create_initial_data(company)
+            return company
 
 
 def teams_selector_option_groups(teams: List[Team], add_department_as_team: bool = False,
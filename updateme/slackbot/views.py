@@ -1,6 +1,11 @@
+import asyncio
 import json
 from collections import defaultdict
-from typing import Tuple, Optional, List
+from dataclasses import dataclass
+from threading import Lock
+from typing import Tuple, Optional, List, Dict
+
+from cachetools import TTLCache
 
 from slack_sdk.models.blocks import DividerBlock, SectionBlock, ButtonElement, ActionsBlock, OverflowMenuElement, \
     Option, HeaderBlock, InputBlock, PlainTextInputElement, StaticSelectElement
@@ -10,8 +15,12 @@ from updateme.slackbot.blocks import status_update_type_block, status_update_tea
     status_update_projects_block, status_update_text_block, \
     status_update_preview_back_to_editing_block, status_update_list_blocks, home_page_actions_block, \
     home_page_status_update_filters, status_update_blocks, status_update_link_block, \
-    home_page_configuration_actions_block
+    home_page_configuration_actions_block, home_page_load_older_updates_block, status_update_block_id, \
+    status_update_edit_options
 from updateme.core import dao
+from updateme.core.async_dao import AsyncDao
+from updateme.core.dao import StatusUpdateCursor
+from updateme.core.metrics import metrics
 from updateme.core.model import StatusUpdate, Project, Team, StatusUpdateSource, Department, StatusUpdateType, \
     StatusUpdateReaction
 from updateme.slackbot.utils import es, get_or_create_company_by_body
@@ -31,6 +40,8 @@ STATUS_UPDATE_MODAL_STATUS_UPDATE_LINK_ACTION_ID = "status_update_modal__status_
 STATUS_UPDATE_TEXT_BLOCK = "status_update_text_block"
 STATUS_UPDATE_MODAL_STATUS_UPDATE_TEXT_ACTION_ID = "status_update_modal__status_update_text_action_id"
 
+COMPANY_UPDATES_MENU_ACTION_ID = "company_updates_status_message_menu_button_clicked"
+
 
 class PrivateMetadata:
     def __init__(self, status_update_uuid: str = None):
@@ -74,15 +85,14 @@ def retrieve_status_update_from_view(body) -> StatusUpdate:
     selected_teams = values[STATUS_UPDATE_TEAMS_BLOCK][STATUS_UPDATE_MODAL_STATUS_UPDATE_TEAMS_ACTION_ID][
         "selected_options"]
     if selected_teams is not None:
-        teams = [dao.read_team(company_uuid=company_uuid, uuid=selected_team["value"])
-                 for selected_team in selected_teams]
+        teams = dao.read_teams_by_uuids(company_uuid, [selected_team["value"] for selected_team in selected_teams])
 
     projects = []
     selected_projects = values[STATUS_UPDATE_PROJECTS_BLOCK][STATUS_UPDATE_MODAL_STATUS_UPDATE_PROJECTS_ACTION_ID][
         "selected_options"]
     if selected_projects is not None:
-        projects = [dao.read_project(company_uuid=company_uuid, uuid=selected_project["value"])
-                    for selected_project in selected_projects]
+        projects = dao.read_projects_by_uuids(company_uuid,
+                                              [selected_project["value"] for selected_project in selected_projects])
 
     try:
         link = values[STATUS_UPDATE_LINK_BLOCK][
@@ -95,9 +105,8 @@ def retrieve_status_update_from_view(body) -> StatusUpdate:
         kwargs["uuid"] = private_metadata.status_update_uuid
 
     slack_team_id = body["team"]["id"]
-    try:
-        company = dao.read_companies(slack_team_id=slack_team_id)[0]
-    except IndexError:
+    company = dao.read_company_by_slack_team_id(slack_team_id)
+    if company is None:
         raise IndexError(f"Can not find company with slack_team_id = {slack_team_id}")
 
     return StatusUpdate(
@@ -122,7 +131,7 @@ def retrieve_status_update_filters_from_view(body) -> Tuple[Optional[Team], Opti
 
     try:
         team_or_department_id = values["home_page_select_team_filter_changed"]["selected_option"]["value"]
-        team = dao.read_team(company_uuid=company_uuid, uuid=team_or_department_id)
+        team = next(iter(dao.read_teams_by_uuids(company_uuid, [team_or_department_id])), None)
         if team is None:
             department = dao.read_department(company_uuid=company_uuid, uuid=team_or_department_id)
     except KeyError:
@@ -130,7 +139,7 @@ def retrieve_status_update_filters_from_view(body) -> Tuple[Optional[Team], Opti
 
     try:
         project_id = values["home_page_select_project_filter_changed"]["selected_option"]["value"]
-        project = dao.read_project(company_uuid=company_uuid, uuid=project_id)
+        project = next(iter(dao.read_projects_by_uuids(company_uuid, [project_id])), None)
     except KeyError:
         pass
 
@@ -189,7 +198,15 @@ def share_status_update_preview_view(update: StatusUpdate) -> View:
 
 
 def home_page_my_updates_view(status_updates: List[StatusUpdate], status_update_reactions: List[StatusUpdateReaction],
-                              is_admin: bool = False, current_user_slack_id: str = None):
+                              is_admin: bool = False, current_user_slack_id: str = None,
+                              older_updates_cursor: StatusUpdateCursor = None):
+    load_older_updates_blocks = []
+    if older_updates_cursor:
+        load_older_updates_blocks.append(home_page_load_older_updates_block(
+            action_id="home_page_my_updates_load_older_clicked",
+            cursor=older_updates_cursor.as_str()
+        ))
+
     return View(
         type="home",
         title="Welcome to Chirik Bot!",
@@ -199,7 +216,8 @@ def home_page_my_updates_view(status_updates: List[StatusUpdate], status_update_
             *status_update_list_blocks(status_updates,
                                        status_update_reactions,
                                        current_user_slack_id=current_user_slack_id,
-                                       accessory_action_id="my_updates_status_message_menu_button_clicked")
+                                       accessory_action_id="my_updates_status_message_menu_button_clicked"),
+            *load_older_updates_blocks
         ]
     )
 
@@ -225,29 +243,180 @@ def home_page_company_updates_view(status_updates: List[StatusUpdate],
                                    status_update_reactions: List[StatusUpdateReaction], teams: List[Team],
                                    projects: List[Project], team: Team = None, department: Department = None,
                                    project: Project = None,
-                                   is_admin: bool = False, current_user_slack_id: str = None):
+                                   is_admin: bool = False, current_user_slack_id: str = None,
+                                   older_updates_cursor: StatusUpdateCursor = None):
     return View(
         type="home",
         title="Welcome to Chirik Bot!",
         blocks=[
             home_page_actions_block(selected="company_updates", show_configuration=is_admin),
-            DividerBlock(),
-            home_page_status_update_filters(
-                teams=teams,
-                projects=projects,
-                active_team=team,
-                active_department=department,
-                active_project=project
-            ),
-            DividerBlock(),
-            *status_update_list_blocks(status_updates,
-                                       status_update_reactions,
-                                       current_user_slack_id=current_user_slack_id,
-                                       accessory_action_id="company_updates_status_message_menu_button_clicked")
+            *_home_page_company_updates_feed_blocks(status_updates, status_update_reactions, teams, projects, team,
+                                                    department, project, current_user_slack_id, older_updates_cursor)
         ]
     )
 
 
+def _home_page_company_updates_feed_blocks(status_updates: List[StatusUpdate],
+                                           status_update_reactions: List[StatusUpdateReaction], teams: List[Team],
+                                           projects: List[Project], team: Optional[Team],
+                                           department: Optional[Department], project: Optional[Project],
+                                           current_user_slack_id: Optional[str],
+                                           older_updates_cursor: Optional[StatusUpdateCursor]) -> list:
+    load_older_updates_blocks = []
+    if older_updates_cursor:
+        load_older_updates_blocks.append(home_page_load_older_updates_block(
+            action_id="home_page_company_updates_load_older_clicked",
+            cursor=older_updates_cursor.as_str()
+        ))
+
+    return [
+        DividerBlock(),
+        home_page_status_update_filters(
+            teams=teams,
+            projects=projects,
+            active_team=team,
+            active_department=department,
+            active_project=project
+        ),
+        DividerBlock(),
+        *status_update_list_blocks(status_updates,
+                                   status_update_reactions,
+                                   current_user_slack_id=current_user_slack_id,
+                                   accessory_action_id=COMPANY_UPDATES_MENU_ACTION_ID),
+        *load_older_updates_blocks
+    ]
+
+
+@dataclass(frozen=True)
+class _RenderedFeed:
+    blocks: List[dict]
+    # Block id -> (author Slack user id, status update uuid) of every status update on the page
+    authors: Dict[str, Tuple[str, str]]
+
+
+class CompanyUpdatesFeedCache:
+    """
+    Rendered pages of company feeds, shared by everyone looking at the same page with the same filter. Pages are keyed
+    by the company feed generation (see Dao.read_feed_generation()), so publishing, editing or deleting a status update
+    makes them unreachable, and hits skip the database altogether. Per-user parts (the actions block and the edit
+    buttons of the user's own status updates) are added to a copy of the page for every user
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: int = 10 * 60):
+        self._lock = Lock()
+        self._feeds: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._hits = metrics.counter("cache.company_updates_feed.hits")
+        self._misses = metrics.counter("cache.company_updates_feed.misses")
+
+    def view(self, company_uuid: str, current_user_slack_id: str, is_admin: bool, page_size: int,
+             team: Team = None, department: Department = None, project: Project = None,
+             older_than: StatusUpdateCursor = None) -> dict:
+        key = self._key(company_uuid, dao.read_feed_generation(company_uuid), page_size, team, department, project,
+                        older_than)
+        feed = self._get(key)
+        if feed is None:
+            status_updates, older_updates_cursor = dao.read_status_updates_page(
+                company_uuid=company_uuid, page_size=page_size, older_than=older_than,
+                **self._filters(team, department, project))
+            feed = self._put(key, self._render(
+                status_updates, dao.read_status_update_reactions(company_uuid), dao.read_teams(company_uuid),
+                dao.read_projects(company_uuid), team, department, project, older_updates_cursor))
+        return self._personalized(feed, current_user_slack_id, is_admin)
+
+    async def async_view(self, async_dao: AsyncDao, company_uuid: str, current_user_slack_id: str, is_admin: bool,
+                         page_size: int, team: Team = None, department: Department = None, project: Project = None,
+                         older_than: StatusUpdateCursor = None) -> dict:
+        """
+        view() on an AsyncDao: on a miss the page and the taxonomy are queried concurrently
+        """
+        key = self._key(company_uuid, async_dao.read_feed_generation(company_uuid), page_size, team, department,
+                        project, older_than)
+        feed = self._get(key)
+        if feed is None:
+            (status_updates, older_updates_cursor), status_update_reactions, teams, projects = await asyncio.gather(
+                async_dao.read_status_updates_page(company_uuid=company_uuid, page_size=page_size,
+                                                   older_than=older_than, **self._filters(team, department, project)),
+                async_dao.read_status_update_reactions(company_uuid),
+                async_dao.read_teams(company_uuid),
+                async_dao.read_projects(company_uuid)
+            )
+            feed = self._put(key, self._render(status_updates, status_update_reactions, teams, projects, team,
+                                               department, project, older_updates_cursor))
+        return self._personalized(feed, current_user_slack_id, is_admin)
+
+    @staticmethod
+    def _key(company_uuid: str, feed_generation: int, page_size: int, team: Optional[Team],
+             department: Optional[Department], project: Optional[Project],
+             older_than: Optional[StatusUpdateCursor]) -> tuple:
+        return (company_uuid, feed_generation, team.uuid if team else None, department.uuid if department else None,
+                project.uuid if project else None, older_than.as_str() if older_than else None, page_size)
+
+    def _get(self, key: tuple) -> Optional[_RenderedFeed]:
+        with self._lock:
+            feed = self._feeds.get(key)
+        if feed is not None:
+            self._hits.inc()
+        else:
+            self._misses.inc()
+        return feed
+
+    def _put(self, key: tuple, feed: _RenderedFeed) -> _RenderedFeed:
+        with self._lock:
+            self._feeds[key] = feed
+        return feed
+
+    @staticmethod
+    def _filters(team: Optional[Team], department: Optional[Department], project: Optional[Project]) -> dict:
+        kwargs = {}
+        if project:
+            kwargs["from_projects"] = [project.uuid]
+        if team:
+            kwargs["from_teams"] = [team.uuid]
+        if department:
+            kwargs["from_departments"] = [department.uuid]
+        return kwargs
+
+    @staticmethod
+    def _render(status_updates: List[StatusUpdate], status_update_reactions: List[StatusUpdateReaction],
+                teams: List[Team], projects: List[Project], team: Optional[Team], department: Optional[Department],
+                project: Optional[Project], older_updates_cursor: Optional[StatusUpdateCursor]) -> _RenderedFeed:
+        blocks = _home_page_company_updates_feed_blocks(
+            status_updates, status_update_reactions, teams, projects, team, department, project, None,
+            older_updates_cursor)
+        return _RenderedFeed(
+            blocks=[block.to_dict() for block in blocks],
+            authors={status_update_block_id(su.uuid): (su.author_slack_user_id, su.uuid) for su in status_updates}
+        )
+
+    def _personalized(self, feed: _RenderedFeed, current_user_slack_id: str, is_admin: bool) -> dict:
+        view = View(
+            type="home",
+            title="Welcome to Chirik Bot!",
+            blocks=[home_page_actions_block(selected="company_updates", show_configuration=is_admin)]
+        ).to_dict()
+        view["blocks"].extend(self._with_edit_buttons(feed, current_user_slack_id))
+        return view
+
+    @staticmethod
+    def _with_edit_buttons(feed: _RenderedFeed, current_user_slack_id: str) -> List[dict]:
+        blocks = list(feed.blocks)
+        for i, block in enumerate(blocks):
+            author_slack_user_id, status_update_uuid = feed.authors.get(block.get("block_id"), (None, None))
+            if not current_user_slack_id or author_slack_user_id != current_user_slack_id:
+                continue
+            edit_options = [option.to_dict() for option in status_update_edit_options(status_update_uuid)]
+            accessory = block.get("accessory")
+            if accessory:
+                accessory = {**accessory, "options": accessory["options"] + edit_options}
+            else:
+                accessory = {"type": "overflow", "action_id": COMPANY_UPDATES_MENU_ACTION_ID, "options": edit_options}
+            blocks[i] = {**block, "accessory": accessory}
+        return blocks
+
+
+COMPANY_UPDATES_FEED_CACHE = CompanyUpdatesFeedCache()
+
+
 def home_page_company_updates_delete_status_update_view(status_update_uuid: str, status_update_text: str):
     return View(
         type="modal",
@@ -0,0 +1,111 @@
+import asyncio
+import string
+
+from random import choices
+
+import pytest
+from sqlalchemy import event, inspect
+
+from updateme.core.dao import create_initial_data
+from updateme.core.model import Company, Project, StatusUpdate, StatusUpdateSource
+
+pytest.importorskip("aiosqlite")
+
+from updateme.core.async_dao import AsyncSQLiteDao
+
+
+def test_async_dao_shares_mappings_and_queries():
+    async def run():
+        async_dao = AsyncSQLiteDao()
+        await async_dao.create_all()
+        try:
+            company = Company("test_company_" + "".join(choices(string.ascii_letters, k=16)),
+                              slack_team_id="test_slack_team_id_" + "".join(choices(string.ascii_letters, k=16)))
+            await async_dao.insert_company(company)
+            create_initial_data(company)
+
+            teams = await async_dao.read_teams(company.uuid)
+            assert teams and all(team.department.name for team in teams)
+
+            status_updates = [
+                StatusUpdate(source=StatusUpdateSource.SLACK_DIALOG, text=f"Some Text {i}", published=True,
+                             company=company, teams=teams[:2])
+                for i in range(3)
+            ]
+            await asyncio.gather(*(async_dao.insert_status_update(status_update) for status_update in status_updates))
+
+            result = await async_dao.read_status_updates(company.uuid, from_teams=[teams[0].uuid])
+            assert sorted(su.uuid for su in result) == sorted(su.uuid for su in status_updates)
+            assert all(len(su.teams) == 2 for su in result)
+
+            assert await async_dao.publish_status_update(company.uuid, status_updates[0].uuid) is True
+            await async_dao.delete_status_update(company.uuid, status_updates[1].uuid)
+            assert len(await async_dao.read_status_updates(company.uuid)) == 2
+        finally:
+            await async_dao.dispose()
+
+    asyncio.run(run())
+
+
+def test_async_dao_invalidates_caches_after_commit():
+    async def run():
+        async_dao = AsyncSQLiteDao()
+        await async_dao.create_all()
+        events = []
+        event.listen(async_dao._engine.sync_engine, "commit", lambda *args: events.append("commit"))
+        invalidate, bump = async_dao._taxonomy_cache.invalidate, async_dao._feed_generations.bump
+        async_dao._taxonomy_cache.invalidate = lambda key: events.append("invalidate") or invalidate(key)
+        async_dao._feed_generations.bump = lambda key: events.append("bump") or bump(key)
+        try:
+            company = Company("test_company_" + "".join(choices(string.ascii_letters, k=16)),
+                              slack_team_id="test_slack_team_id_" + "".join(choices(string.ascii_letters, k=16)))
+            await async_dao.insert_company(company)
+            events.clear()
+            await async_dao.insert_project(Project("test_project", company=company))
+            assert events == ["commit", "invalidate"]
+
+            events.clear()
+            generation = async_dao.read_feed_generation(company.uuid)
+            await async_dao.insert_status_update(
+                StatusUpdate(source=StatusUpdateSource.SLACK_DIALOG, text="Some Text", company=company))
+            assert events == ["commit", "bump"]
+            assert async_dao.read_feed_generation(company.uuid) == generation + 1
+        finally:
+            await async_dao.dispose()
+
+    asyncio.run(run())
+
+
+def test_async_dao_caches_detached_objects():
+    async def run():
+        async_dao = AsyncSQLiteDao()
+        await async_dao.create_all()
+        sessions = []
+
+        def checked(get):
+            def checked_get(*args):
+                *args, load = args
+
+                def checked_load():
+                    loaded = load()
+                    sessions.extend(inspect(obj).session for obj in (loaded if isinstance(loaded, list) else [loaded]))
+                    return loaded
+
+                return get(*args, checked_load)
+
+            return checked_get
+
+        async_dao._taxonomy_cache.get = checked(async_dao._taxonomy_cache.get)
+        async_dao._company_cache.get = checked(async_dao._company_cache.get)
+        try:
+            company = Company("test_company_" + "".join(choices(string.ascii_letters, k=16)),
+                              slack_team_id="test_slack_team_id_" + "".join(choices(string.ascii_letters, k=16)))
+            await async_dao.insert_company(company)
+            await async_dao.insert_project(Project("test_project", company=company))
+            assert await async_dao.read_projects(company.uuid)
+            assert await async_dao.read_company_by_slack_team_id(company.slack_team_id)
+            assert sessions == [None, None]
+        finally:
+            await async_dao.dispose()
+
+    asyncio.run(run())
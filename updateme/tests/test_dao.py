@@ -1,16 +1,31 @@
+import fakeredis
+import json
+import logging
 import pytest
 import string
+import time
 
+from datetime import datetime, timedelta
 from random import choices
+from threading import Thread
+
+from sqlalchemy import create_engine, text, event, inspect, select
 
 from updateme.core import dao
-from updateme.core.model import Project, Team, StatusUpdate, StatusUpdateSource, Department, Company
+from updateme.core.cache import WriteBehindCache, InProcessCacheBackend, TaxonomyCache, ResolutionCache, \
+    RedisCacheBackend
+from updateme.core.dao import InstrumentedQueuePool, StatusUpdateCursor, SQLiteDao, create_initial_data, \
+    copy_slack_user_preferences
+from updateme.core.config import INITIAL_TEAM_NAMES, INITIAL_STATUS_UPDATE_TYPES
+from updateme.core.metrics import MetricsLogger, MetricsRegistry, metrics
+from updateme.core.model import Project, Team, StatusUpdate, StatusUpdateSource, Department, Company, StatusUpdateType, \
+    StatusUpdateImage, SlackUserPreferences
 
 
 @pytest.fixture
 def non_existing_project(existing_company) -> Project:
     project = Project("test_project_" + "".join(choices(string.ascii_letters, k=16)), company=existing_company)
-    for p_ in dao.read_projects():
+    for p_ in dao.read_projects(company_uuid=existing_company.uuid):
         if p_.uuid == project.uuid:
             raise AssertionError("Can not create non-existing project")
     yield project
@@ -19,7 +34,7 @@ def non_existing_project(existing_company) -> Project:
 @pytest.fixture
 def existing_project(non_existing_project) -> Project:
     dao.insert_project(non_existing_project)
-    for p_ in dao.read_projects():
+    for p_ in dao.read_projects(company_uuid=non_existing_project.company.uuid):
         if p_.uuid == non_existing_project.uuid:
             break
     else:
@@ -59,7 +74,7 @@ def existing_company(non_existing_company) -> Company:
 @pytest.fixture
 def non_existing_department(existing_company) -> Team:
     department = Department("test_department_" + "".join(choices(string.ascii_letters, k=16)), company=existing_company)
-    for d_ in dao.read_departments():
+    for d_ in dao.read_departments(company_uuid=existing_company.uuid):
         if d_.uuid == department.uuid:
             raise AssertionError("Can not create non-existing department")
     yield department
@@ -68,7 +83,7 @@ def non_existing_department(existing_company) -> Team:
 @pytest.fixture
 def existing_department(non_existing_department) -> Department:
     dao.insert_department(non_existing_department)
-    for d_ in dao.read_departments():
+    for d_ in dao.read_departments(company_uuid=non_existing_department.company.uuid):
         if d_.uuid == non_existing_department.uuid:
             break
     else:
@@ -79,7 +94,7 @@ def existing_department(non_existing_department) -> Department:
 @pytest.fixture
 def non_existing_team(existing_department) -> Team:
     team = Team("test_team_" + "".join(choices(string.ascii_letters, k=16)), department=existing_department)
-    for t_ in dao.read_teams():
+    for t_ in dao.read_teams(company_uuid=existing_department.company.uuid):
         if t_.uuid == team.uuid:
             raise AssertionError("Can not create non-existing team")
     yield team
@@ -88,7 +103,7 @@ def non_existing_team(existing_department) -> Team:
 @pytest.fixture
 def existing_team(non_existing_team) -> Team:
     dao.insert_team(non_existing_team)
-    for t_ in dao.read_teams():
+    for t_ in dao.read_teams(company_uuid=non_existing_team.department.company.uuid):
         if t_.uuid == non_existing_team.uuid:
             break
     else:
@@ -96,25 +111,575 @@ def existing_team(non_existing_team) -> Team:
     yield non_existing_team
 
 
+@pytest.fixture
+def existing_status_update_type(existing_company) -> StatusUpdateType:
+    status_update_type = StatusUpdateType("test_type_" + "".join(choices(string.ascii_letters, k=16)),
+                                          company=existing_company)
+    dao.insert_status_update_type(status_update_type)
+    yield status_update_type
+
+
 def test_project_insertion(non_existing_project):
     dao.insert_project(non_existing_project)
-    assert non_existing_project.uuid in sorted([p_.uuid for p_ in dao.read_projects()])
+    assert non_existing_project.uuid in sorted([p_.uuid for p_ in dao.read_projects(
+        company_uuid=non_existing_project.company.uuid)])
 
 
 def test_team_insertion(non_existing_team):
     dao.insert_team(non_existing_team)
-    assert non_existing_team.uuid in sorted([t_.uuid for t_ in dao.read_teams()])
+    assert non_existing_team.uuid in sorted([t_.uuid for t_ in dao.read_teams(
+        company_uuid=non_existing_team.department.company.uuid)])
 
 
-def test_status_update_insertion(existing_company):
+def test_status_update_insertion(existing_company, existing_status_update_type):
     status_update = StatusUpdate(
         source=StatusUpdateSource.SLACK_DIALOG,
         text="Some Text",
-        type=dao.read_status_update_types()[0],
+        type=dao.read_status_update_types(company_uuid=existing_company.uuid)[0],
         company=existing_company
     )
     dao.insert_status_update(status_update)
-    assert status_update.uuid not in [su.uuid for su in dao.read_status_updates()]
-    assert status_update.uuid not in [su.uuid for su in dao.read_status_updates(published=True)]
-    assert status_update.uuid in [su.uuid for su in dao.read_status_updates(published=None)]
-    assert status_update.uuid in [su.uuid for su in dao.read_status_updates(published=False)]
+    company_uuid = existing_company.uuid
+    assert status_update.uuid not in [su.uuid for su in dao.read_status_updates(company_uuid)]
+    assert status_update.uuid not in [su.uuid for su in dao.read_status_updates(company_uuid, published=True)]
+    assert status_update.uuid in [su.uuid for su in dao.read_status_updates(company_uuid, published=None)]
+    assert status_update.uuid in [su.uuid for su in dao.read_status_updates(company_uuid, published=False)]
+
+
+def test_status_update_feed_query_count_does_not_depend_on_feed_size(existing_company, existing_team,
+                                                                      existing_project, existing_status_update_type):
+    def count_queries(n: int) -> int:
+        for i in range(n):
+            dao.insert_status_update(StatusUpdate(
+                source=StatusUpdateSource.SLACK_DIALOG,
+                text=f"Some Text {i}",
+                type=existing_status_update_type,
+                teams=[existing_team],
+                projects=[existing_project],
+                images=[StatusUpdateImage(url="https://example.com/image.png", filename="image.png")],
+                published=True,
+                company=existing_company
+            ))
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(dao._engine, "before_cursor_execute", listener)
+        try:
+            with dao.session_scope():
+                for status_update in dao.read_status_updates(existing_company.uuid):
+                    _ = status_update.company.name, status_update.type.name, [t.name for t in status_update.teams], \
+                        [p.name for p in status_update.projects], [i.url for i in status_update.images]
+        finally:
+            event.remove(dao._engine, "before_cursor_execute", listener)
+        return len(statements)
+
+    assert count_queries(2) == count_queries(10)
+
+
+def test_session_scope_is_per_thread_and_per_request(existing_company):
+    with dao.session_scope():
+        company = dao.read_company(existing_company.uuid)
+        assert dao.read_company(existing_company.uuid) is company
+
+        other_thread_result = []
+        thread = Thread(target=lambda: other_thread_result.append(dao.read_company(existing_company.uuid)))
+        thread.start()
+        thread.join()
+        assert other_thread_result[0] is not company
+        assert other_thread_result[0].uuid == company.uuid
+
+    with dao.session_scope():
+        assert dao.read_company(existing_company.uuid) is not company
+
+
+def test_reads_are_memoized_within_a_request(existing_company):
+    status_update = StatusUpdate(source=StatusUpdateSource.SLACK_DIALOG, text="Some Text", published=True,
+                                 company=existing_company)
+    dao.insert_status_update(status_update)
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(dao._engine, "before_cursor_execute", listener)
+    try:
+        with dao.session_scope():
+            dao.read_status_update(existing_company.uuid, status_update.uuid)
+            dao.read_status_updates(existing_company.uuid, last_n=5).clear()
+            reads = len(statements)
+            assert dao.read_status_update(existing_company.uuid, status_update.uuid).text == "Some Text"
+            assert status_update.uuid in [s.uuid for s in dao.read_status_updates(existing_company.uuid, last_n=5)]
+            assert len(statements) == reads
+
+            dao.update_status_update(existing_company.uuid, status_update.uuid, text="Other Text")
+            assert dao.read_status_update(existing_company.uuid, status_update.uuid).text == "Other Text"
+            assert len(statements) > reads + 1
+
+        reads = len(statements)
+        dao.read_company(existing_company.uuid)
+        dao.read_company(existing_company.uuid)
+        assert len(statements) == reads + 2
+    finally:
+        event.remove(dao._engine, "before_cursor_execute", listener)
+
+
+def test_instrumented_queue_pool_reports_checkouts():
+    engine = create_engine("sqlite://", poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0)
+    checkouts_before = metrics.timer("db.pool.checkout").count
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        assert metrics.gauge("db.pool.waiting").value == 0
+    assert metrics.timer("db.pool.checkout").count == checkouts_before + 1
+
+
+def test_metrics_logger_logs_a_snapshot_after_running_the_collectors(caplog):
+    registry = MetricsRegistry()
+    registry.counter("requests").inc(2)
+    metrics_logger = MetricsLogger(registry, interval=60,
+                                   collectors=[lambda: registry.gauge("db.pool.size").set(5), dao.report_pool_status])
+    with caplog.at_level(logging.INFO, logger="updateme.metrics"):
+        metrics_logger.report()
+    message = caplog.records[-1].getMessage()
+    assert message.startswith("metrics ")
+    snapshot = json.loads(message[len("metrics "):])
+    assert snapshot["requests"] == 2
+    assert snapshot["db.pool.size"] == {"value": 5, "max": 5}
+
+
+def test_sqlite_performance_engine_pools_tuned_wal_connections(monkeypatch):
+    if not isinstance(dao, SQLiteDao):
+        pytest.skip("SQLite only")
+    monkeypatch.setenv("UPDATE_ME_SQLITE_BUSY_TIMEOUT", "1234")
+    engine = dao._create_performance_engine()
+    try:
+        assert isinstance(engine.pool, InstrumentedQueuePool)
+        with engine.connect() as connection:
+            assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            # NORMAL
+            assert connection.execute(text("PRAGMA synchronous")).scalar() == 1
+            assert connection.execute(text("PRAGMA busy_timeout")).scalar() == 1234
+    finally:
+        engine.dispose()
+
+
+def test_ensure_indexes_restores_missing_and_invalid_indexes_of_an_existing_schema(monkeypatch):
+    def index_names():
+        return {index["name"] for index in inspect(dao._engine).get_indexes("status_updates")}
+
+    with dao._engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_status_updates_feed"))
+    assert "ix_status_updates_feed" not in index_names()
+    dao.ensure_indexes()
+    assert {"ix_status_updates_feed", "ix_status_updates_author_feed"} <= index_names()
+
+    dropped = []
+    drop_index = dao._drop_index
+    monkeypatch.setattr(dao, "_invalid_indexes",
+                        lambda table: {"ix_status_updates_feed"} if table.name == "status_updates" else set())
+    monkeypatch.setattr(dao, "_drop_index", lambda table, name: dropped.append(name) or drop_index(table, name))
+    dao.ensure_indexes()
+    assert dropped == ["ix_status_updates_feed"]
+    assert "ix_status_updates_feed" in index_names()
+
+
+def test_status_updates_keyset_pagination(existing_company):
+    created_at = datetime.utcnow()
+    status_updates = [StatusUpdate(source=StatusUpdateSource.SLACK_DIALOG, text=f"Some Text {i}", published=True,
+                                   company=existing_company, created_at=created_at - timedelta(minutes=i // 2))
+                      for i in range(7)]
+    for status_update in status_updates:
+        dao.insert_status_update(status_update)
+
+    pages, cursor = [], None
+    while True:
+        page, cursor = dao.read_status_updates_page(existing_company.uuid, page_size=3, older_than=cursor)
+        pages.append([su.uuid for su in page])
+        if cursor is None:
+            break
+        cursor = StatusUpdateCursor.from_str(cursor.as_str())
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    expected = sorted(status_updates, key=lambda su: (su.created_at, su.uuid), reverse=True)
+    assert sum(pages, []) == [su.uuid for su in expected]
+
+
+def test_status_updates_team_and_department_filters_return_each_update_once(existing_company, existing_department,
+                                                                             existing_project):
+    teams = [Team("test_team_" + "".join(choices(string.ascii_letters, k=16)), existing_department) for _ in range(3)]
+    for team in teams:
+        dao.insert_team(team)
+    matching = StatusUpdate(source=StatusUpdateSource.SLACK_DIALOG, text="Some Text", published=True,
+                            company=existing_company, teams=teams, projects=[existing_project])
+    other = StatusUpdate(source=StatusUpdateSource.SLACK_DIALOG, text="Some Text", published=True,
+                         company=existing_company, teams=teams[:1])
+    dao.insert_status_update(matching)
+    dao.insert_status_update(other)
+
+    team_uuids = [team.uuid for team in teams]
+    result = dao.read_status_updates(existing_company.uuid, from_teams=team_uuids,
+                                     from_departments=[existing_department.uuid], from_projects=[existing_project.uuid])
+    assert [su.uuid for su in result] == [matching.uuid]
+
+    result = dao.read_status_updates(existing_company.uuid, from_teams=team_uuids)
+    assert sorted(su.uuid for su in result) == sorted([matching.uuid, other.uuid])
+
+
+
+def test_insert_many_and_soft_delete_many(existing_company, existing_project, existing_status_update_type):
+    department = Department("test_department_" + "".join(choices(string.ascii_letters, k=16)), existing_company)
+    teams = [Team(f"test_team_{i}", department) for i in range(3)]
+    status_update = StatusUpdate(source=StatusUpdateSource.SLACK_DIALOG, text="Some Text", published=True,
+                                 company=existing_company, type=existing_status_update_type, teams=teams,
+                                 projects=[existing_project], images=[StatusUpdateImage("https://image", "image.png")])
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(dao._engine, "before_cursor_execute", listener)
+    try:
+        dao.insert_many([department, *teams, status_update])
+    finally:
+        event.remove(dao._engine, "before_cursor_execute", listener)
+    # departments, teams, status_updates, status_update_images and the two association tables
+    assert len([statement for statement in statements if statement.startswith("INSERT")]) == 6
+
+    with dao.session_scope():
+        inserted = dao.read_status_update(existing_company.uuid, status_update.uuid)
+        assert inserted.type.uuid == existing_status_update_type.uuid
+        assert sorted(t.uuid for t in inserted.teams) == sorted(t.uuid for t in teams)
+        assert [p.uuid for p in inserted.projects] == [existing_project.uuid]
+        assert [i.url for i in inserted.images] == ["https://image"]
+
+    dao.soft_delete_many(Team, "some_other_company_uuid", [teams[0].uuid])
+    dao.soft_delete_many(Team, existing_company.uuid, [teams[1].uuid, teams[2].uuid])
+    assert [t.uuid for t in dao.read_teams(existing_company.uuid, department_uuid=department.uuid)] == [teams[0].uuid]
+
+
+def test_insert_many_moves_draft_pointers(existing_company):
+    author_slack_user_id = "test_user_" + "".join(choices(string.ascii_letters, k=16))
+    now = datetime.utcnow()
+    newer, older = [
+        StatusUpdate(source=StatusUpdateSource.SLACK_MESSAGE, text=f"Draft {i}", company=existing_company,
+                     author_slack_user_id=author_slack_user_id, created_at=now - timedelta(minutes=i))
+        for i in range(2)
+    ]
+    published = StatusUpdate(source=StatusUpdateSource.SLACK_DIALOG, text="Published", company=existing_company,
+                             author_slack_user_id=author_slack_user_id, published=True, created_at=now)
+    dao.insert_many([newer, older, published])
+
+    drafts = dao._schema.slack_user_drafts_table
+    with dao._engine.connect() as connection:
+        pointers = connection.execute(select(drafts.c.source, drafts.c.status_update_uuid)
+                                      .where(drafts.c.author_slack_user_id == author_slack_user_id)).all()
+    assert pointers == [(StatusUpdateSource.SLACK_MESSAGE, newer.uuid)]
+
+
+def test_create_initial_data_is_idempotent(non_existing_company):
+    dao.insert_company(non_existing_company)
+    for _ in range(2):
+        create_initial_data(non_existing_company)
+
+    departments = dao.read_departments(company_uuid=non_existing_company.uuid)
+    assert sorted(d.name for d in departments) == sorted(INITIAL_TEAM_NAMES)
+    teams = dao.read_teams(company_uuid=non_existing_company.uuid)
+    assert len(teams) == sum(len(team_names) for team_names in INITIAL_TEAM_NAMES.values())
+    status_update_types = dao.read_status_update_types(company_uuid=non_existing_company.uuid)
+    assert sorted(t.name for t in status_update_types) == sorted(INITIAL_STATUS_UPDATE_TYPES)
+
+
+def test_read_last_unpublished_status_update(existing_company):
+    author_slack_user_id = "test_author_" + "".join(choices(string.ascii_letters, k=16))
+    created_at = datetime.utcnow()
+    drafts = [StatusUpdate(source=StatusUpdateSource.SLACK_DIALOG, text=f"Draft {i}", published=False,
+                           company=existing_company, author_slack_user_id=author_slack_user_id,
+                           created_at=created_at - timedelta(minutes=i))
+              for i in range(5)]
+    for draft in reversed(drafts):
+        dao.insert_status_update(draft)
+    dao.insert_status_update(StatusUpdate(source=StatusUpdateSource.SLACK_DIALOG, text="Too old", published=False,
+                                          company=existing_company, author_slack_user_id=author_slack_user_id,
+                                          created_at=created_at - timedelta(days=3)))
+
+    def read_last_unpublished_status_update():
+        return dao.read_last_unpublished_status_update(existing_company.uuid, author_slack_user_id,
+                                                       source=StatusUpdateSource.SLACK_DIALOG)
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(dao._engine, "before_cursor_execute", listener)
+    try:
+        assert read_last_unpublished_status_update().uuid == drafts[0].uuid
+    finally:
+        event.remove(dao._engine, "before_cursor_execute", listener)
+    # One lookup through the draft pointer, the rest are the relationship loads
+    status_update_queries = [statement for statement in statements if statement.startswith("SELECT status_updates.uuid")]
+    assert len(status_update_queries) == 1 and "slack_user_drafts" in status_update_queries[0]
+
+    dao.publish_status_update(existing_company.uuid, drafts[0].uuid)
+    assert read_last_unpublished_status_update().uuid == drafts[1].uuid
+    dao.delete_status_update(existing_company.uuid, drafts[1].uuid)
+    assert read_last_unpublished_status_update().uuid == drafts[2].uuid
+    assert dao.read_last_unpublished_status_update(existing_company.uuid, author_slack_user_id).uuid == drafts[2].uuid
+    assert dao.read_last_unpublished_status_update(existing_company.uuid, author_slack_user_id,
+                                                   source=StatusUpdateSource.SLACK_MESSAGE) is None
+
+
+def test_targeted_status_update_changes(existing_company, existing_team, existing_project,
+                                        existing_status_update_type):
+    status_update = StatusUpdate(source=StatusUpdateSource.SLACK_MESSAGE, text="Some Text", company=existing_company)
+    dao.insert_status_update(status_update)
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(dao._engine, "before_cursor_execute", listener)
+    try:
+        assert dao.update_status_update(existing_company.uuid, status_update.uuid,
+                                        status_update_type_uuid=existing_status_update_type.uuid, link="https://link")
+    finally:
+        event.remove(dao._engine, "before_cursor_execute", listener)
+    assert len(statements) == 1
+
+    assert not dao.update_status_update("some_other_company_uuid", status_update.uuid, published=True)
+    dao.replace_status_update_teams(existing_company.uuid, status_update.uuid, [existing_team.uuid, "unknown"])
+    dao.replace_status_update_projects(existing_company.uuid, status_update.uuid, [existing_project.uuid])
+    dao.replace_status_update_projects("some_other_company_uuid", status_update.uuid, [])
+    assert dao.publish_status_update(existing_company.uuid, status_update.uuid)
+
+    with dao.session_scope():
+        updated = dao.read_status_update(existing_company.uuid, status_update.uuid)
+        assert updated.published and updated.link == "https://link"
+        assert updated.type.uuid == existing_status_update_type.uuid
+        assert [t.uuid for t in updated.teams] == [existing_team.uuid]
+        assert [p.uuid for p in updated.projects] == [existing_project.uuid]
+
+    with pytest.raises(ValueError):
+        dao.update_status_update(existing_company.uuid, status_update.uuid, type=None)
+
+
+def test_slack_user_preferences_upsert(existing_team, existing_project):
+    user_id = "test_user_" + "".join(choices(string.ascii_letters, k=16))
+    dao.insert_slack_user_preferences(SlackUserPreferences(user_id=user_id, active_team_filter=existing_team))
+
+    user_preferences = dao.read_slack_user_preferences(user_id)
+    user_preferences.active_tab = "company_updates"
+    user_preferences.active_team_filter = None
+    user_preferences.active_project_filter = dao.read_project(existing_project.company.uuid, existing_project.uuid)
+    dao.insert_slack_user_preferences(user_preferences)
+
+    with dao.session_scope():
+        user_preferences = dao.read_slack_user_preferences(user_id)
+        assert user_preferences.active_tab == "company_updates"
+        assert user_preferences.active_team_filter is None
+        assert user_preferences.active_project_filter.uuid == existing_project.uuid
+
+
+def test_slack_user_preferences_write_behind(existing_team):
+    cache = WriteBehindCache("test_slack_user_preferences", key=lambda p: p.user_id,
+                             load=dao.read_slack_user_preferences, store=dao.insert_many_slack_user_preferences,
+                             flush_interval=60 * 60)
+    user_ids = ["test_user_" + "".join(choices(string.ascii_letters, k=16)) for _ in range(3)]
+    for user_id in user_ids:
+        assert cache.get(user_id) is None
+        cache.put(SlackUserPreferences(user_id=user_id, active_tab="my_updates", active_team_filter=existing_team))
+    assert all(dao.read_slack_user_preferences(user_id) is None for user_id in user_ids)
+    assert cache.get(user_ids[0]).active_tab == "my_updates"
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(dao._engine, "before_cursor_execute", listener)
+    try:
+        cache.flush()
+    finally:
+        event.remove(dao._engine, "before_cursor_execute", listener)
+    assert len(statements) == 1
+    for user_id in user_ids:
+        assert dao.read_slack_user_preferences(user_id).active_team_filter.uuid == existing_team.uuid
+
+
+def test_slack_user_preferences_cache_hands_out_detached_copies(existing_team):
+    cache = WriteBehindCache("test_slack_user_preferences_copies", key=lambda p: p.user_id,
+                             load=dao.read_slack_user_preferences, store=dao.insert_many_slack_user_preferences,
+                             copy=copy_slack_user_preferences, flush_interval=60 * 60)
+    user_id = "test_user_" + "".join(choices(string.ascii_letters, k=16))
+    with dao.session_scope():
+        team = dao.read_team(existing_team.department.company.uuid, existing_team.uuid)
+        assert inspect(team).session is not None
+        user_preferences = SlackUserPreferences(user_id=user_id, active_tab="my_updates", active_team_filter=team)
+        cache.put(user_preferences)
+        user_preferences.active_tab = "configuration"
+        cached = cache.get(user_id)
+        assert cached.active_tab == "my_updates"
+        assert inspect(cached.active_team_filter).session is None
+        assert inspect(cached.active_team_filter.department).session is None
+
+        cached.active_tab = "company_updates"
+        assert cache.get(user_id).active_tab == "my_updates"
+        cache.put(cached)
+    assert cache.get(user_id).active_tab == "company_updates"
+
+
+def test_selections_are_resolved_with_one_query_each(existing_company, existing_department, existing_project):
+    teams = [Team("test_team_" + "".join(choices(string.ascii_letters, k=16)), existing_department) for _ in range(3)]
+    dao.insert_many(teams)
+    other_company = Company("test_company_" + "".join(choices(string.ascii_letters, k=16)),
+                            slack_team_id="test_slack_team_id_" + "".join(choices(string.ascii_letters, k=16)))
+    other_project = Project("test_project_" + "".join(choices(string.ascii_letters, k=16)), company=other_company)
+    dao.insert_many([other_company, other_project])
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(dao._engine, "before_cursor_execute", listener)
+    try:
+        with dao.session_scope():
+            selected_teams = dao.read_teams_by_uuids(existing_company.uuid,
+                                                     [teams[2].uuid, "unknown", teams[0].uuid])
+            selected_projects = dao.read_projects_by_uuids(existing_company.uuid,
+                                                           [other_project.uuid, existing_project.uuid])
+            assert [t.department.company.uuid for t in selected_teams] == [existing_company.uuid] * 2
+            assert [p.company.uuid for p in selected_projects] == [existing_company.uuid]
+    finally:
+        event.remove(dao._engine, "before_cursor_execute", listener)
+    assert len(statements) == 2
+    assert [t.uuid for t in selected_teams] == [teams[2].uuid, teams[0].uuid]
+    assert [p.uuid for p in selected_projects] == [existing_project.uuid]
+
+
+def test_taxonomy_is_cached_until_written(existing_company, existing_department, existing_team):
+    def read_taxonomy():
+        return dao.read_departments(existing_company.uuid), dao.read_teams(existing_company.uuid), \
+            dao.read_projects(existing_company.uuid), dao.read_status_update_types(existing_company.uuid), \
+            dao.read_status_update_reactions(existing_company.uuid)
+
+    read_taxonomy()
+    hits, misses = metrics.counter("cache.taxonomy.hits").value, metrics.counter("cache.taxonomy.misses").value
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(dao._engine, "before_cursor_execute", listener)
+    try:
+        departments, teams, *_ = read_taxonomy()
+        assert dao.read_teams(existing_company.uuid, department_uuid=existing_department.uuid)[0].department.name \
+               == existing_department.name
+    finally:
+        event.remove(dao._engine, "before_cursor_execute", listener)
+    assert statements == []
+    assert metrics.counter("cache.taxonomy.hits").value == hits + 6
+    assert metrics.counter("cache.taxonomy.misses").value == misses
+    assert [t.uuid for t in teams] == [existing_team.uuid]
+
+    new_team = Team("test_team_" + "".join(choices(string.ascii_letters, k=16)), existing_department)
+    dao.insert_team(new_team)
+    assert sorted(t.uuid for t in dao.read_teams(existing_company.uuid)) == sorted([existing_team.uuid, new_team.uuid])
+    dao.delete_department(existing_company.uuid, existing_department.uuid)
+    assert dao.read_teams(existing_company.uuid) == []
+
+
+def test_taxonomy_renames_are_saved(existing_company, existing_department, existing_team, existing_project,
+                                    existing_status_update_type):
+    dao.read_departments(existing_company.uuid), dao.read_teams(existing_company.uuid)
+    dao.read_projects(existing_company.uuid), dao.read_status_update_types(existing_company.uuid)
+    # The way the configuration dialogs rename things: read, change, write back, all in one request
+    with dao.session_scope():
+        department = dao.read_department(existing_company.uuid, existing_department.uuid)
+        department.name = "renamed department"
+        dao.insert_department(department)
+        team = dao.read_team(existing_company.uuid, existing_team.uuid)
+        team.name = "renamed team"
+        dao.insert_team(team)
+        project = dao.read_project(existing_company.uuid, existing_project.uuid)
+        project.name = "renamed project"
+        dao.insert_project(project)
+        status_update_type = dao.read_status_update_type(existing_company.uuid, existing_status_update_type.uuid)
+        status_update_type.name = "renamed type"
+        dao.insert_status_update_type(status_update_type)
+
+    with dao.session_scope():
+        assert dao.read_department(existing_company.uuid, existing_department.uuid).name == "renamed department"
+        assert dao.read_team(existing_company.uuid, existing_team.uuid).name == "renamed team"
+    assert [d.name for d in dao.read_departments(existing_company.uuid)] == ["renamed department"]
+    assert [t.name for t in dao.read_teams(existing_company.uuid)] == ["renamed team"]
+    assert [p.name for p in dao.read_projects(existing_company.uuid)] == ["renamed project"]
+    assert "renamed type" in [t.name for t in dao.read_status_update_types(existing_company.uuid)]
+
+
+def test_company_resolution_is_cached(non_existing_company):
+    slack_team_id = non_existing_company.slack_team_id
+    assert dao.read_company_by_slack_team_id(slack_team_id) is None
+    negative_hits = metrics.counter("cache.company.negative_hits").value
+    assert dao.read_company_by_slack_team_id(slack_team_id) is None
+    assert metrics.counter("cache.company.negative_hits").value == negative_hits + 1
+
+    dao.insert_company(non_existing_company)
+    assert dao.read_company_by_slack_team_id(slack_team_id).uuid == non_existing_company.uuid
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(dao._engine, "before_cursor_execute", listener)
+    try:
+        company = dao.read_company_by_slack_team_id(slack_team_id)
+    finally:
+        event.remove(dao._engine, "before_cursor_execute", listener)
+    assert statements == []
+    assert company.uuid == non_existing_company.uuid
+
+
+def test_caches_on_a_shared_backend_share_values_and_invalidations():
+    backend = InProcessCacheBackend()
+    replicas = [TaxonomyCache(backend=backend), TaxonomyCache(backend=backend)]
+    loads = []
+
+    def load():
+        loads.append(1)
+        return ["snapshot"]
+
+    assert replicas[0].get("company", "teams", load) == ("snapshot",)
+    assert replicas[1].get("company", "teams", load) == ("snapshot",)
+    assert len(loads) == 1
+
+    replicas[1].invalidate("company")
+    assert replicas[0].generation("company") == replicas[1].generation("company") == 1
+    assert replicas[0].get("company", "teams", load) == ("snapshot",)
+    assert len(loads) == 2
+
+
+def test_redis_backend_shares_values_and_invalidations_between_replicas():
+    server = fakeredis.FakeServer()
+    replicas = [ResolutionCache("test_company", backend=RedisCacheBackend(client=fakeredis.FakeRedis(server=server)))
+                for _ in range(2)]
+    assert replicas[0].get("T1", lambda: "company") == "company"
+    assert replicas[1].get("T1", lambda: None) == "company"
+
+    replicas[0].invalidate("T1")
+    deadline = time.monotonic() + 5
+    while replicas[1].get("T1", lambda: "renamed company") != "renamed company":
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_redis_backend_survives_an_unreachable_server_and_subscribes_once_it_is_back():
+    server = fakeredis.FakeServer()
+    server.connected = False
+    errors = metrics.counter("cache.redis.errors").value
+    backends = [RedisCacheBackend(client=fakeredis.FakeRedis(server=server), reconnect_interval=0.05) for _ in range(2)]
+    replicas = [ResolutionCache("test_company_reconnect", backend=backend) for backend in backends]
+    assert metrics.counter("cache.redis.errors").value > errors
+    assert replicas[1].get("T1", lambda: "company") == "company"
+
+    server.connected = True
+    deadline = time.monotonic() + 5
+    while any(backend._pubsub is None for backend in backends):
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    replicas[0].invalidate("T1")
+    while replicas[1].get("T1", lambda: "renamed company") != "renamed company":
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+    # The connection drops: the listener notices, counts it and subscribes again
+    server.connected = False
+    errors = metrics.counter("cache.redis.errors").value
+    while metrics.counter("cache.redis.errors").value == errors:
+        assert time.monotonic() < deadline + 5
+        time.sleep(0.05)
+    server.connected = True
+    assert replicas[1].get("T2", lambda: "company") == "company"
+    while replicas[1].get("T2", lambda: "renamed company") != "renamed company":
+        assert time.monotonic() < deadline + 5
+        replicas[0].invalidate("T2")
+        time.sleep(0.05)
@@ -0,0 +1,93 @@
+import time
+from threading import Event, Thread
+
+from slack_bolt import App, BoltRequest
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web import SlackResponse
+
+from updateme.core.metrics import metrics
+from updateme.slackbot.dispatcher import SlackApiDispatcher, ThrottledWebClient, throttled_client_middleware
+from updateme.slackbot.listeners import ack_first
+
+
+def test_waiting_calls_go_out_in_priority_order():
+    dispatcher = SlackApiDispatcher(max_concurrent_calls=1)
+    ticket = dispatcher.acquire("T1", "users.info")
+    dispatched = []
+
+    def call(method, **kwargs):
+        acquired = dispatcher.acquire("T1", method, **kwargs)
+        dispatched.append(method)
+        dispatcher.release(acquired)
+
+    threads = [Thread(target=call, args=("chat.postMessage",), kwargs={"channel": "C1"}),
+               Thread(target=call, args=("views.publish",))]
+    waiting = metrics.gauge("slack.api.waiting").value
+    for thread in threads:
+        thread.start()
+        waiting += 1
+        while metrics.gauge("slack.api.waiting").value < waiting:
+            time.sleep(0.01)
+    dispatcher.release(ticket)
+    for thread in threads:
+        thread.join(5)
+
+    assert dispatched == ["views.publish", "chat.postMessage"]
+
+
+def test_rate_limited_calls_are_retried_after_retry_after(monkeypatch):
+    calls = []
+
+    def api_call(self, api_method, **kwargs):
+        calls.append(time.monotonic())
+        response = SlackResponse(client=self, http_verb="POST", api_url=api_method, req_args={},
+                                 data={"ok": len(calls) > 1, "error": "ratelimited"},
+                                 headers={"Retry-After": "0.2"}, status_code=200 if len(calls) > 1 else 429)
+        return response.validate()
+
+    monkeypatch.setattr(WebClient, "api_call", api_call)
+    client = ThrottledWebClient(token="xoxb-test", dispatcher=SlackApiDispatcher(max_concurrent_calls=1))
+    rate_limited = metrics.counter("slack.api.views.publish.rate_limited").value
+
+    assert client.views_publish(user_id="U1", view={"type": "home", "blocks": []})["ok"]
+    assert len(calls) == 2 and calls[1] - calls[0] >= 0.2
+    assert metrics.counter("slack.api.views.publish.rate_limited").value == rate_limited + 1
+
+    client.max_retries = 0
+    calls.clear()
+    try:
+        client.views_publish(user_id="U1", view={"type": "home", "blocks": []})
+        assert False, "SlackApiError expected"
+    except SlackApiError:
+        assert len(calls) == 1
+
+
+def test_listeners_of_the_bolt_app_call_through_the_dispatcher(monkeypatch):
+    def api_call(self, api_method, **kwargs):
+        return SlackResponse(client=self, http_verb="POST", api_url=api_method, req_args={}, data={"ok": True},
+                             headers={}, status_code=200)
+
+    monkeypatch.setattr(WebClient, "api_call", api_call)
+    dispatcher = SlackApiDispatcher(max_concurrent_calls=1)
+    acquired = []
+    acquire = dispatcher.acquire
+    monkeypatch.setattr(dispatcher, "acquire",
+                        lambda *args, **kwargs: acquired.append(args) or acquire(*args, **kwargs))
+    app = App(client=ThrottledWebClient(token="xoxb-test", dispatcher=dispatcher), token_verification_enabled=False,
+              request_verification_enabled=False)
+    app.use(throttled_client_middleware(app.client))
+    published = Event()
+
+    @ack_first(app.action("some_action_id"))
+    def handler(client, body):
+        client.views_publish(user_id=body["user"]["id"], view={"type": "home", "blocks": []})
+        published.set()
+
+    response = app.dispatch(BoltRequest(mode="socket_mode", body={
+        "type": "block_actions", "team": {"id": "T1"}, "user": {"id": "U1"}, "api_app_id": "A1",
+        "actions": [{"action_id": "some_action_id", "block_id": "b", "type": "button", "value": "v"}],
+    }))
+    assert response.status == 200
+    assert published.wait(5)
+    assert acquired == [("xoxb-test", "views.publish", None)]
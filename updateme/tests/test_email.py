@@ -1,4 +1,5 @@
-from updateme.email.utils import fix_slack_markdown_links
+from updateme.core.metrics import metrics
+from updateme.email.utils import fix_slack_markdown_links, slack_markdown_to_html
 
 
 def test_fix_slack_markdown_links():
@@ -11,3 +12,14 @@ def test_fix_slack_markdown_links():
         assert fix_slack_markdown_links(slack_markdown_url) == expected_fixed_markdown_url
 
 
+def test_slack_markdown_to_html_is_memoized():
+    text = "*Shipped* <https://www.google.com/|the thing>"
+    html = slack_markdown_to_html(text)
+    assert html == '<em>Shipped</em> <a href="https://www.google.com/">the thing</a>'
+
+    hits = metrics.counter("cache.slack_markdown_to_html.hits").value
+    assert slack_markdown_to_html(text) == html
+    assert metrics.counter("cache.slack_markdown_to_html.hits").value == hits + 1
+    # The reused Markdown instance must not leak state (e.g. reference links) between conversions
+    assert slack_markdown_to_html("[a][ref]\n\n[ref]: https://example.com") == '<a href="https://example.com">a</a>'
+    assert slack_markdown_to_html("[a][ref]") == "[a][ref]"
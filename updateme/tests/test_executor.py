@@ -0,0 +1,44 @@
+from threading import Event, Thread, current_thread
+
+from updateme.core.config import RejectionPolicy
+from updateme.core.metrics import metrics
+from updateme.slackbot.executor import BoundedListenerExecutor
+
+
+def test_bounded_listener_executor_sheds_or_runs_in_caller_when_full():
+    release = Event()
+    executor = BoundedListenerExecutor("test_shed", max_workers=1, max_queue_size=1,
+                                       rejection_policy=RejectionPolicy.SHED)
+    running = executor.submit(release.wait)
+    queued = executor.submit(lambda: "queued")
+    rejected = executor.submit(lambda: "rejected")
+    assert rejected.cancelled()
+    assert metrics.counter("executor.test_shed.rejected").value == 1
+    release.set()
+    assert running.result(timeout=5) and queued.result(timeout=5) == "queued"
+    executor.shutdown()
+    assert metrics.gauge("executor.test_shed.queue_depth").value == 0
+    assert metrics.timer("executor.test_shed.run").count == 2
+
+    release.clear()
+    executor = BoundedListenerExecutor("test_caller_runs", max_workers=1, max_queue_size=0,
+                                       rejection_policy=RejectionPolicy.CALLER_RUNS)
+    executor.submit(release.wait)
+    assert executor.submit(lambda: current_thread().name).result() == current_thread().name
+    release.set()
+    executor.shutdown()
+
+
+def test_bounded_listener_executor_blocks_by_default_when_full():
+    release = Event()
+    executor = BoundedListenerExecutor("test_block", max_workers=1, max_queue_size=0)
+    executor.submit(release.wait)
+    submitted = []
+    submitter = Thread(target=lambda: submitted.append(executor.submit(lambda: "blocked")))
+    submitter.start()
+    submitter.join(0.1)
+    assert submitter.is_alive() and not submitted
+    release.set()
+    submitter.join(5)
+    assert submitted[0].result(timeout=5) == "blocked"
+    executor.shutdown()
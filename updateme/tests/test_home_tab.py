@@ -0,0 +1,127 @@
+import asyncio
+from threading import Event, Thread
+
+from slack_sdk.errors import SlackApiError
+
+from updateme.slackbot.home_tab import HomeTabRefresher
+
+
+class FakeClient:
+    def __init__(self):
+        self.published = []
+        self.conflicts = 0
+
+    def views_publish(self, user_id, view, hash=None):
+        if self.conflicts:
+            self.conflicts -= 1
+            raise SlackApiError("hash_conflict", {"ok": False, "error": "hash_conflict"})
+        self.published.append((user_id, view, hash))
+        return {"ok": True, "view": {"hash": f"hash-{len(self.published)}"}}
+
+
+class FakeAsyncClient(FakeClient):
+    async def views_publish(self, user_id, view, hash=None):
+        return super().views_publish(user_id, view, hash)
+
+
+def start_refresh(refresher, client, render, futures):
+    thread = Thread(target=lambda: futures.append(refresher.refresh(client, "U1", render)))
+    thread.start()
+    return thread
+
+
+def test_refreshes_of_a_user_are_coalesced_and_carry_the_view_hash():
+    refresher = HomeTabRefresher()
+    client = FakeClient()
+    rendering, release = Event(), Event()
+
+    def first():
+        rendering.set()
+        release.wait(5)
+        return "first"
+
+    thread = Thread(target=refresher.refresh, args=(client, "U1", first, "opened"))
+    thread.start()
+    assert rendering.wait(5)
+    rendered = []
+    for view in ("second", "third"):
+        refresher.refresh(client, "U1", lambda view=view: rendered.append(view) or view)
+    release.set()
+    thread.join(5)
+
+    assert rendered == ["third"]
+    assert client.published == [("U1", "first", "opened"), ("U1", "third", "hash-1")]
+
+    client.conflicts = 1
+    refresher.refresh(client, "U1", lambda: "fourth")
+    assert client.published[-1] == ("U1", "fourth", None)
+
+
+def test_a_coalesced_caller_returns_without_waiting_for_the_publish():
+    refresher = HomeTabRefresher()
+    client = FakeClient()
+    rendering, release = Event(), Event()
+
+    def first():
+        rendering.set()
+        release.wait(5)
+        return "first"
+
+    futures = []
+    thread = start_refresh(refresher, client, first, futures)
+    assert rendering.wait(5)
+    # Runs on this very thread while the first render is still going on
+    future = refresher.refresh(client, "U1", lambda: "second")
+    assert not future.done()
+    release.set()
+    thread.join(5)
+
+    assert future.result(5) is None
+    assert futures[0].done()
+    assert client.published == [("U1", "first", None), ("U1", "second", "hash-1")]
+
+
+def test_a_failed_render_fails_only_the_refreshes_waiting_for_it():
+    refresher = HomeTabRefresher()
+    client = FakeClient()
+    rendering, release = Event(), Event()
+
+    def first():
+        rendering.set()
+        release.wait(5)
+        raise ValueError("first")
+
+    futures = []
+    thread = start_refresh(refresher, client, first, futures)
+    assert rendering.wait(5)
+    second = refresher.refresh(client, "U1", lambda: "second")
+    release.set()
+    thread.join(5)
+
+    assert str(futures[0].exception(5)) == "first"
+    assert second.result(5) is None
+    assert client.published == [("U1", "second", None)]
+
+
+def test_sync_and_async_refreshes_of_a_user_are_coalesced():
+    refresher = HomeTabRefresher()
+    client, async_client = FakeClient(), FakeAsyncClient()
+
+    async def run():
+        rendering, release = asyncio.Event(), Event()
+
+        async def first():
+            rendering.set()
+            await asyncio.to_thread(release.wait, 5)
+            return "first"
+
+        task = asyncio.create_task(refresher.async_refresh(async_client, "U1", first))
+        await rendering.wait()
+        third = refresher.refresh(client, "U1", lambda: "third")
+        release.set()
+        await task
+        return third
+
+    assert asyncio.run(run()).result(5) is None
+    assert async_client.published == [("U1", "first", None)]
+    assert client.published == [("U1", "third", "hash-1")]
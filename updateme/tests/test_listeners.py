@@ -0,0 +1,22 @@
+from updateme.core.metrics import metrics
+from updateme.slackbot.listeners import ack_first, stage
+
+
+def test_ack_first_registers_a_timed_lazy_listener():
+    registered = {}
+
+    @ack_first(lambda **kwargs: registered.update(kwargs))
+    def some_handler(body, logger):
+        with stage("render"):
+            return body
+
+    acks = []
+    registered["ack"](lambda: acks.append(True))
+    assert acks == [True]
+
+    lazy, = registered["lazy"]
+    assert lazy.__name__ == "some_handler"
+    count = metrics.timer("slack.listener.some_handler.render").count
+    assert lazy(body={"a": 1}, logger=None) == {"a": 1}
+    assert metrics.timer("slack.listener.some_handler.render").count == count + 1
+    assert metrics.timer("slack.listener.some_handler").count >= 1
@@ -0,0 +1,75 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+from types import SimpleNamespace
+
+from updateme.slackbot.users import SlackUserDirectory
+
+
+class FakeSlackClient:
+    def __init__(self, users):
+        self.users = users
+        self.users_info_calls = 0
+        self.release = Event()
+        self.release.set()
+
+    def users_list(self, limit, cursor=None):
+        start = int(cursor or 0)
+        members = self.users[start:start + limit]
+        next_cursor = str(start + limit) if start + limit < len(self.users) else ""
+        return SimpleNamespace(data={"members": members, "response_metadata": {"next_cursor": next_cursor}})
+
+    def users_info(self, user):
+        self.users_info_calls += 1
+        self.release.wait()
+        return SimpleNamespace(data={"user": next(u for u in self.users if u["id"] == user)})
+
+
+def _user(i, is_admin=False):
+    return {"id": f"U{i}", "profile": {"display_name": f"User {i}"}, "is_admin": is_admin, "is_owner": False}
+
+
+def test_warm_persist_and_single_flight(tmp_path):
+    client = FakeSlackClient([_user(i) for i in range(5)])
+    file = os.path.join(tmp_path, "slack_users.json")
+    directory = SlackUserDirectory(client, file)
+    directory.USERS_LIST_PAGE_SIZE = 2
+    directory.warm()
+    assert directory.get("U3").name == "User 3"
+    assert client.users_info_calls == 0
+    directory.shutdown()
+
+    client.users.append(_user(5, is_admin=True))
+    client.release.clear()
+    directory = SlackUserDirectory(client, file)
+    assert directory.get("U4").name == "User 4"
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(directory.get, "U5") for _ in range(4)]
+        time.sleep(0.1)
+        client.release.set()
+        assert all(future.result().is_admin for future in futures)
+    assert client.users_info_calls == 1
+    directory.shutdown()
+
+
+def test_stale_entries_are_served_while_refreshed(tmp_path):
+    client = FakeSlackClient([_user(1)])
+    directory = SlackUserDirectory(client, ttl=0)
+    directory.warm()
+    client.users[0] = {**_user(1), "profile": {"display_name": "Renamed"}}
+    assert directory.get("U1").name == "User 1"
+    directory._executor.shutdown(wait=True)
+    assert client.users_info_calls == 1
+    assert directory._entries["U1"][0].name == "Renamed"
+
+
+def test_stale_entries_are_served_after_shutdown(tmp_path):
+    client = FakeSlackClient([_user(1)])
+    directory = SlackUserDirectory(client, ttl=0)
+    directory.warm()
+    directory.shutdown()
+    assert directory.get("U1").name == "User 1"
+    assert directory.get("U1").name == "User 1"
+    assert not directory._in_flight
+    assert client.users_info_calls == 0
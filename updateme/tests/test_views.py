@@ -0,0 +1,73 @@
+import asyncio
+import string
+from random import choices
+
+import pytest
+from sqlalchemy import event
+
+from updateme.core import dao
+from updateme.core.model import Company, StatusUpdate, StatusUpdateSource
+from updateme.slackbot.blocks import status_update_block_id
+from updateme.slackbot.views import CompanyUpdatesFeedCache
+
+
+def _menu_values(view: dict, status_update: StatusUpdate) -> list:
+    block = next(b for b in view["blocks"] if b.get("block_id") == status_update_block_id(status_update.uuid))
+    return [option["value"] for option in block.get("accessory", {}).get("options", [])]
+
+
+def test_company_updates_feed_is_rendered_once_per_generation():
+    company = Company("test_company_" + "".join(choices(string.ascii_letters, k=16)),
+                      slack_team_id="test_slack_team_id_" + "".join(choices(string.ascii_letters, k=16)))
+    dao.insert_company(company)
+    status_updates = [
+        StatusUpdate(source=StatusUpdateSource.SLACK_DIALOG, text=f"Some Text {i}", published=True, company=company,
+                     author_slack_user_id=f"U{i}")
+        for i in range(2)
+    ]
+    for status_update in status_updates:
+        dao.insert_status_update(status_update)
+
+    cache = CompanyUpdatesFeedCache()
+    view = cache.view(company.uuid, current_user_slack_id="U0", is_admin=False, page_size=20)
+    assert _menu_values(view, status_updates[0]) == ["edit_" + status_updates[0].uuid,
+                                                     "delete_" + status_updates[0].uuid]
+    assert _menu_values(view, status_updates[1]) == []
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(dao._engine, "before_cursor_execute", listener)
+    try:
+        view = cache.view(company.uuid, current_user_slack_id="U1", is_admin=True, page_size=20)
+    finally:
+        event.remove(dao._engine, "before_cursor_execute", listener)
+    assert statements == []
+    assert _menu_values(view, status_updates[0]) == []
+    assert _menu_values(view, status_updates[1]) == ["edit_" + status_updates[1].uuid,
+                                                     "delete_" + status_updates[1].uuid]
+
+    dao.delete_status_update(company.uuid, status_updates[0].uuid)
+    view = cache.view(company.uuid, current_user_slack_id="U1", is_admin=True, page_size=20)
+    assert not any(b.get("block_id") == status_update_block_id(status_updates[0].uuid) for b in view["blocks"])
+
+
+def test_company_updates_feed_renders_the_same_on_async_dao():
+    pytest.importorskip("aiosqlite")
+    from updateme.core.async_dao import AsyncSQLiteDao
+
+    company = Company("test_company_" + "".join(choices(string.ascii_letters, k=16)),
+                      slack_team_id="test_slack_team_id_" + "".join(choices(string.ascii_letters, k=16)))
+    dao.insert_company(company)
+    dao.insert_status_update(StatusUpdate(source=StatusUpdateSource.SLACK_DIALOG, text="Some Text", published=True,
+                                          company=company, author_slack_user_id="U0"))
+
+    async def async_view():
+        async_dao = AsyncSQLiteDao()
+        try:
+            return await CompanyUpdatesFeedCache().async_view(async_dao, company.uuid, current_user_slack_id="U0",
+                                                              is_admin=False, page_size=20)
+        finally:
+            await async_dao.dispose()
+
+    view = CompanyUpdatesFeedCache().view(company.uuid, current_user_slack_id="U0", is_admin=False, page_size=20)
+    assert asyncio.run(async_view()) == view